@@ -0,0 +1,139 @@
+"""training series: one row per recurrence plus exceptions
+
+Revision ID: 3f6a2c1d8e47
+Revises: 9755c9ebfca5
+Create Date: 2025-09-20 10:12:41.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a2c1d8e47'
+down_revision: Union[str, Sequence[str], None] = '9755c9ebfca5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'training_series',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('tipo', sa.String(), nullable=False),
+        sa.Column('descrizione', sa.String(), nullable=True),
+        sa.Column('orario', sa.String(), nullable=True),
+        sa.Column('weekdays', sa.String(length=20), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('until', sa.Date(), nullable=False),
+        sa.Column('barca_id', sa.Integer(), sa.ForeignKey('barche.id'), nullable=True),
+    )
+    op.create_index('idx_training_series_window', 'training_series', ['start_date', 'until'], unique=False)
+    op.create_table(
+        'training_series_categoria',
+        sa.Column('series_id', sa.Integer(), sa.ForeignKey('training_series.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('categoria_id', sa.Integer(), sa.ForeignKey('categorie.id'), primary_key=True),
+    )
+    op.create_table(
+        'training_series_coach',
+        sa.Column('series_id', sa.Integer(), sa.ForeignKey('training_series.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+    )
+    op.create_table(
+        'training_series_exceptions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('series_id', sa.Integer(), sa.ForeignKey('training_series.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('data', sa.Date(), nullable=False),
+        sa.Column('allenamento_id', sa.Integer(), sa.ForeignKey('allenamenti.id', ondelete='SET NULL'), nullable=True),
+        sa.UniqueConstraint('series_id', 'data', name='uq_training_series_exception'),
+    )
+    op.create_index('ix_training_series_exceptions_series_id', 'training_series_exceptions', ['series_id'], unique=False)
+    with op.batch_alter_table('allenamenti') as batch_op:
+        batch_op.add_column(sa.Column('series_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_allenamenti_series_id', ['series_id'], unique=False)
+        batch_op.create_foreign_key(
+            'fk_allenamenti_series_id', 'training_series', ['series_id'], ['id'], ondelete='SET NULL'
+        )
+
+    # Le vecchie ricorrenze "weekly" (riga master + repeat_until) diventano serie;
+    # la riga master resta come override della propria data.
+    bind = op.get_bind()
+    masters = bind.execute(
+        sa.text(
+            "SELECT id, tipo, descrizione, orario, time_start, time_end, data, repeat_until, barca_id, coach_id "
+            "FROM allenamenti WHERE recurrence = 'weekly' AND repeat_until IS NOT NULL"
+        )
+    ).mappings().all()
+    for m in masters:
+        data = m['data']
+        if isinstance(data, str):  # SQLite restituisce le date come testo
+            data = date.fromisoformat(data)
+        orario = m['orario']
+        if not orario and m['time_start'] and m['time_end']:
+            orario = f"{str(m['time_start'])[:5]}-{str(m['time_end'])[:5]}"
+        series_id = bind.execute(
+            sa.text(
+                "INSERT INTO training_series (tipo, descrizione, orario, weekdays, start_date, until, barca_id) "
+                "VALUES (:tipo, :descrizione, :orario, :weekdays, :start_date, :until, :barca_id) RETURNING id"
+            ),
+            {
+                'tipo': m['tipo'],
+                'descrizione': m['descrizione'],
+                'orario': orario,
+                'weekdays': str(data.weekday()),
+                'start_date': m['data'],
+                'until': m['repeat_until'],
+                'barca_id': m['barca_id'],
+            },
+        ).scalar_one()
+        bind.execute(
+            sa.text(
+                "INSERT INTO training_series_categoria (series_id, categoria_id) "
+                "SELECT :series_id, categoria_id FROM allenamento_categoria_association WHERE allenamento_id = :id"
+            ),
+            {'series_id': series_id, 'id': m['id']},
+        )
+        if m['coach_id']:
+            bind.execute(
+                sa.text("INSERT INTO training_series_coach (series_id, user_id) VALUES (:series_id, :user_id)"),
+                {'series_id': series_id, 'user_id': m['coach_id']},
+            )
+        bind.execute(
+            sa.text(
+                "INSERT INTO training_series_exceptions (series_id, data, allenamento_id) "
+                "VALUES (:series_id, :data, :id)"
+            ),
+            {'series_id': series_id, 'data': m['data'], 'id': m['id']},
+        )
+        bind.execute(
+            sa.text("UPDATE allenamenti SET series_id = :series_id, recurrence_id = :rid WHERE id = :id"),
+            {'series_id': series_id, 'rid': f"series-{series_id}", 'id': m['id']},
+        )
+
+    with op.batch_alter_table('allenamenti') as batch_op:
+        batch_op.drop_column('repeat_until')
+        batch_op.drop_column('recurrence')
+
+
+def downgrade() -> None:
+    """Downgrade schema.
+
+    Le serie non vengono riconvertite: le occorrenze non materializzate
+    vanno perse.
+    """
+    with op.batch_alter_table('allenamenti') as batch_op:
+        batch_op.add_column(sa.Column('recurrence', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('repeat_until', sa.Date(), nullable=True))
+        batch_op.drop_constraint('fk_allenamenti_series_id', type_='foreignkey')
+        batch_op.drop_index('ix_allenamenti_series_id')
+        batch_op.drop_column('series_id')
+    op.drop_index('ix_training_series_exceptions_series_id', table_name='training_series_exceptions')
+    op.drop_table('training_series_exceptions')
+    op.drop_table('training_series_coach')
+    op.drop_table('training_series_categoria')
+    op.drop_index('idx_training_series_window', table_name='training_series')
+    op.drop_table('training_series')
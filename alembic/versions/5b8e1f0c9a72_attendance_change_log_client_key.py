@@ -0,0 +1,26 @@
+"""Add client idempotency key to attendance change logs
+
+Revision ID: 5b8e1f0c9a72
+Revises: 3f6a2c1d8e47
+Create Date: 2025-09-24 18:40:02.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e1f0c9a72'
+down_revision: Union[str, Sequence[str], None] = '3f6a2c1d8e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    with op.batch_alter_table('attendance_change_logs') as batch_op:
+        batch_op.add_column(sa.Column('client_key', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_attendance_change_logs_client_key', ['client_key'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('attendance_change_logs') as batch_op:
+        batch_op.drop_constraint('uq_attendance_change_logs_client_key', type_='unique')
+        batch_op.drop_column('client_key')
@@ -0,0 +1,26 @@
+"""Add app_meta table for the seed version marker
+
+Revision ID: 7c2d4e6f8a13
+Revises: 5b8e1f0c9a72
+Create Date: 2025-09-26 09:12:44.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d4e6f8a13'
+down_revision: Union[str, Sequence[str], None] = '5b8e1f0c9a72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'app_meta',
+        sa.Column('key', sa.String(length=64), primary_key=True),
+        sa.Column('value', sa.String(length=255), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('app_meta')
@@ -0,0 +1,30 @@
+"""Add cache_versions table for cross-worker cache invalidation
+
+Revision ID: 8d4f1a2b3c65
+Revises: 7c2d4e6f8a13
+Create Date: 2025-09-28 11:05:31.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4f1a2b3c65'
+down_revision: Union[str, Sequence[str], None] = '7c2d4e6f8a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ENTITIES = ('allenamenti', 'attivita', 'categorie', 'presenze', 'turni', 'utenti')
+
+
+def upgrade() -> None:
+    table = op.create_table(
+        'cache_versions',
+        sa.Column('entity', sa.String(length=32), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+    )
+    op.bulk_insert(table, [{'entity': e, 'version': 0} for e in ENTITIES])
+
+
+def downgrade() -> None:
+    op.drop_table('cache_versions')
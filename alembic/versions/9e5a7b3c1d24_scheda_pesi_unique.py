@@ -0,0 +1,35 @@
+"""Unique (atleta, esercizio) on schede_pesi for bulk upserts
+
+Revision ID: 9e5a7b3c1d24
+Revises: 8d4f1a2b3c65
+Create Date: 2025-09-30 16:21:09.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9e5a7b3c1d24'
+down_revision: Union[str, Sequence[str], None] = '8d4f1a2b3c65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    # tiene solo la riga più recente per ogni coppia atleta/esercizio
+    op.execute(
+        """
+        DELETE FROM schede_pesi
+        WHERE id NOT IN (
+            SELECT max_id FROM (
+                SELECT MAX(id) AS max_id FROM schede_pesi GROUP BY atleta_id, esercizio_id
+            ) AS keep
+        )
+        """
+    )
+    with op.batch_alter_table('schede_pesi') as batch_op:
+        batch_op.create_unique_constraint('uq_scheda_pesi_atleta_esercizio', ['atleta_id', 'esercizio_id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('schede_pesi') as batch_op:
+        batch_op.drop_constraint('uq_scheda_pesi_atleta_esercizio', type_='unique')
@@ -0,0 +1,41 @@
+"""massimali_storico: history of weight maxima for season deltas
+
+Revision ID: a1c3e5f7b9d0
+Revises: 9e5a7b3c1d24
+Create Date: 2025-10-02 10:44:17.000000
+"""
+from datetime import date
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d0'
+down_revision: Union[str, Sequence[str], None] = '9e5a7b3c1d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'massimali_storico',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('atleta_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('esercizio_id', sa.Integer(), sa.ForeignKey('esercizi_pesi.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('massimale', sa.Float(), nullable=False),
+        sa.Column('recorded_at', sa.Date(), nullable=False),
+        sa.UniqueConstraint('atleta_id', 'esercizio_id', 'recorded_at', name='uq_massimale_storico_giorno'),
+    )
+    # i massimali attuali diventano il primo punto dello storico
+    op.execute(
+        sa.text(
+            "INSERT INTO massimali_storico (atleta_id, esercizio_id, massimale, recorded_at) "
+            "SELECT atleta_id, esercizio_id, massimale, :today FROM schede_pesi WHERE massimale IS NOT NULL"
+        ).bindparams(today=date.today())
+    )
+    cache_versions = sa.table('cache_versions', sa.column('entity', sa.String), sa.column('version', sa.Integer))
+    op.bulk_insert(cache_versions, [{'entity': 'pesi', 'version': 0}, {'entity': 'misurazioni', 'version': 0}])
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM cache_versions WHERE entity IN ('pesi', 'misurazioni')")
+    op.drop_table('massimali_storico')
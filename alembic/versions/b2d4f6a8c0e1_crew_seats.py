@@ -0,0 +1,50 @@
+"""crew_seats: one row per occupied seat instead of nine columns on equipaggi
+
+Revision ID: b2d4f6a8c0e1
+Revises: a1c3e5f7b9d0
+Create Date: 2025-10-03 09:12:40.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c0e1'
+down_revision: Union[str, Sequence[str], None] = 'a1c3e5f7b9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+POSTI = ('capovoga', 'secondo', 'terzo', 'quarto', 'quinto', 'sesto', 'settimo', 'prodiere', 'timoniere')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'crew_seats',
+        sa.Column('equipaggio_id', sa.Integer(), sa.ForeignKey('equipaggi.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('posto', sa.String(length=20), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+    )
+    op.create_index('ix_crew_seats_user_posto', 'crew_seats', ['user_id', 'posto'])
+    for posto in POSTI:
+        op.execute(
+            f"INSERT INTO crew_seats (equipaggio_id, posto, user_id) "
+            f"SELECT id, '{posto}', {posto}_id FROM equipaggi WHERE {posto}_id IS NOT NULL"
+        )
+    with op.batch_alter_table('equipaggi') as batch_op:
+        for posto in POSTI:
+            batch_op.drop_column(f'{posto}_id')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('equipaggi') as batch_op:
+        for posto in POSTI:
+            batch_op.add_column(sa.Column(f'{posto}_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(f'fk_equipaggi_{posto}_id_users', 'users', [f'{posto}_id'], ['id'])
+    for posto in POSTI:
+        op.execute(
+            f"UPDATE equipaggi SET {posto}_id = ("
+            f"SELECT user_id FROM crew_seats "
+            f"WHERE crew_seats.equipaggio_id = equipaggi.id AND crew_seats.posto = '{posto}')"
+        )
+    op.drop_index('ix_crew_seats_user_posto', table_name='crew_seats')
+    op.drop_table('crew_seats')
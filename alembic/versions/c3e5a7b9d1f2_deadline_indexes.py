@@ -0,0 +1,39 @@
+"""Indexes on every expiry date for range scans over all deadlines
+
+Revision ID: c3e5a7b9d1f2
+Revises: b2d4f6a8c0e1
+Create Date: 2025-10-04 11:02:37.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b9d1f2'
+down_revision: Union[str, Sequence[str], None] = 'b2d4f6a8c0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ('ix_furgoni_scadenza_bollo', 'furgoni', 'scadenza_bollo'),
+    ('ix_furgoni_scadenza_revisione', 'furgoni', 'scadenza_revisione'),
+    ('ix_furgoni_scadenza_rca', 'furgoni', 'scadenza_rca'),
+    ('ix_furgoni_scadenza_infortuni_conducente', 'furgoni', 'scadenza_infortuni_conducente'),
+    ('ix_gommoni_scadenza_rca', 'gommoni', 'scadenza_rca'),
+    ('ix_gommoni_scadenza_manutenzione', 'gommoni', 'scadenza_manutenzione'),
+    ('ix_users_certificate_expiration', 'users', 'certificate_expiration'),
+    ('ix_user_qualifications_expiry', 'user_qualifications', 'expiry_date'),
+)
+
+
+def upgrade() -> None:
+    for name, table, column in INDEXES:
+        op.create_index(name, table, [column])
+    cache_versions = sa.table('cache_versions', sa.column('entity', sa.String), sa.column('version', sa.Integer))
+    op.bulk_insert(cache_versions, [{'entity': 'mezzi', 'version': 0}])
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM cache_versions WHERE entity = 'mezzi'")
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,22 @@
+"""Index gommone_ore by dinghy and date for engine-hours aggregates
+
+Revision ID: d4f6b8c0e2a3
+Revises: c3e5a7b9d1f2
+Create Date: 2025-10-05 15:40:03.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8c0e2a3'
+down_revision: Union[str, Sequence[str], None] = 'c3e5a7b9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_index('ix_gommone_ore_gommone_data', 'gommone_ore', ['gommone_id', 'data_utilizzo'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_gommone_ore_gommone_data', table_name='gommone_ore')
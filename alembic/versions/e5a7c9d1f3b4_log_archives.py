@@ -0,0 +1,35 @@
+"""Add log_archives and index attendance change logs by date
+
+Revision ID: e5a7c9d1f3b4
+Revises: d4f6b8c0e2a3
+Create Date: 2025-10-06 09:12:44.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f3b4'
+down_revision: Union[str, Sequence[str], None] = 'd4f6b8c0e2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'log_archives',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('kind', sa.String(length=32), nullable=False),
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('rows', sa.Integer(), nullable=False),
+        sa.Column('checksum', sa.String(length=64), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.UniqueConstraint('kind', 'month', name='uq_log_archive_kind_month'),
+    )
+    op.create_index('ix_attendance_change_logs_created_at', 'attendance_change_logs', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attendance_change_logs_created_at', table_name='attendance_change_logs')
+    op.drop_table('log_archives')
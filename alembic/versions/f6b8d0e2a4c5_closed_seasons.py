@@ -0,0 +1,32 @@
+"""Add closed_seasons registry for season partitioning
+
+Revision ID: f6b8d0e2a4c5
+Revises: e5a7c9d1f3b4
+Create Date: 2025-10-08 10:21:17.000000
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0e2a4c5'
+down_revision: Union[str, Sequence[str], None] = 'e5a7c9d1f3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # lo schema storico e le sue partizioni si creano alla prima chiusura di stagione
+    op.create_table(
+        'closed_seasons',
+        sa.Column('season', sa.Integer(), primary_key=True),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=False),
+        sa.Column('trainings', sa.Integer(), nullable=False),
+        sa.Column('attendances', sa.Integer(), nullable=False),
+        sa.Column('closed_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('closed_seasons')
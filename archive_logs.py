@@ -0,0 +1,33 @@
+# File: archive_logs.py
+# Descrizione: sposta i log di presenze e gli audit delle attività più vecchi della
+# retention in file compressi (vedi services/log_archive.py). Da eseguire
+# periodicamente, ad esempio ogni notte da cron.
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from services import log_archive
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archivia i log più vecchi di N mesi.")
+    parser.add_argument("--months", type=int, default=log_archive.RETENTION_MONTHS)
+    parser.add_argument("--kind", action="append", choices=sorted(log_archive.KINDS))
+    parser.add_argument("--dry-run", action="store_true", help="conta le righe senza spostarle")
+    parser.add_argument("--verify", action="store_true", help="ricontrolla i checksum degli archivi")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if args.verify:
+            errors = log_archive.verify(db)
+            for error in errors:
+                print(error)
+            sys.exit(1 if errors else 0)
+        results = log_archive.archive(
+            db, months=args.months, kinds=args.kind or tuple(log_archive.KINDS), dry_run=args.dry_run
+        )
+        for r in results:
+            print(f"{r.kind} {r.month}: {r.rows} righe" + (f" -> {r.path}" if r.path else ""))
+        print(f"{sum(r.rows for r in results)} righe {'da archiviare' if args.dry_run else 'archiviate'}")
@@ -0,0 +1,13 @@
+# File: build_static.py
+# Descrizione: genera gli asset statici con fingerprint e le varianti compresse
+# (static/build/ + manifest). Da eseguire ad ogni deploy, prima di avviare l'app.
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.static_assets import BUILD_DIR, STATIC_DIR, build_assets
+
+if __name__ == "__main__":
+    assets = build_assets()
+    print(f"{len(assets)} asset scritti in {os.path.join(STATIC_DIR, BUILD_DIR)}")
@@ -0,0 +1,30 @@
+# File: close_season.py
+# Descrizione: chiude una stagione sportiva conclusa spostandone allenamenti e
+# presenze nelle tabelle storiche (vedi services/seasons.py). Da eseguire una
+# volta a stagione, dopo il 31 agosto.
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from services import seasons
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sposta una stagione chiusa nello storico.")
+    parser.add_argument("season", type=int, help="anno di inizio della stagione (es. 2023 per 2023/24)")
+    parser.add_argument("--dry-run", action="store_true", help="conta le righe senza spostarle")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        try:
+            result = seasons.close_season(db, args.season, dry_run=args.dry_run)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        action = "da spostare" if args.dry_run else "spostati"
+        print(
+            f"Stagione {result.season} ({result.start_date} - {result.end_date}): "
+            f"{result.trainings} allenamenti e {result.attendances} presenze {action}"
+        )
@@ -1,7 +1,7 @@
 # File: database.py
 import os
 import logging
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.exc import OperationalError
 from fastapi import HTTPException, status
@@ -39,6 +39,28 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
 )
 
+
+
+def _history_database(url) -> str:
+    """File SQLite delle stagioni chiuse: ``SEASON_ARCHIVE_DB`` o ``<db>_storico<ext>``."""
+    override = os.environ.get("SEASON_ARCHIVE_DB")
+    if override:
+        return override
+    if not url.database or url.database == ":memory:":
+        return ":memory:"
+    root, ext = os.path.splitext(url.database)
+    return f"{root}_storico{ext or '.db'}"
+
+
+if engine.dialect.name == "sqlite":
+    HISTORY_DATABASE = _history_database(engine.url)
+
+    @event.listens_for(engine, "connect")
+    def _attach_history(dbapi_connection, connection_record):
+        # schema "storico" di models.storico: su PostgreSQL è uno schema vero
+        dbapi_connection.execute("ATTACH DATABASE ? AS storico", (HISTORY_DATABASE,))
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
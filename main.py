@@ -2,11 +2,17 @@
 # Descrizione: File principale dell'applicazione. Inizializza FastAPI, configura middleware,
 # template, file statici, eventi di startup e include i router modulari.
 
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import logging
 import logging.config
 from contextlib import asynccontextmanager
-from datetime import date
+
+import anyio
+from sqlalchemy import text
 try:  # pragma: no cover - fallback if python-dotenv is missing
     from dotenv import load_dotenv
 except ModuleNotFoundError:  # pragma: no cover
@@ -16,10 +22,8 @@ except ModuleNotFoundError:  # pragma: no cover
 load_dotenv()
 
 from fastapi import FastAPI, Request, HTTPException, status
-from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.exceptions import RequestValidationError
 from starlette.middleware.sessions import SessionMiddleware
@@ -27,8 +31,17 @@ from starlette.middleware.sessions import SessionMiddleware
 # Importa i moduli del progetto
 from models import *
 import security
-from database import engine, Base, SessionLocal
-from utils import get_color_for_type, render
+from database import SessionLocal, engine
+from utils import render
+from utils.render import precompile_templates
+from utils.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    MetricsMiddleware,
+    instrument_engine,
+    render_metrics,
+)
+from utils.responses import CompressionMiddleware, FastJSONResponse
+from utils.static_assets import AssetStaticFiles, service_worker_script
 from routers import (
     authentication,
     users,
@@ -44,7 +57,10 @@ from routers import (
     activities,
     api_activities,
 )
-from seed import seed_categories, seed_turni, seed_default_allenamenti, seed_mezzi
+from services.member_import import shutdown_hash_pool
+from services.cache_versions import versions as cache_versions
+from services.seasons import SeasonClosedError
+from services.startup import SchemaOutdatedError, phase, prepare_database, startup_mode
 
 # Configurazione del logging tramite dictConfig
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
@@ -72,77 +88,54 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestione del ciclo di vita dell'applicazione."""
-    logger.info("Avvio dell'applicazione in corso...")
+    logger.info(f"Avvio dell'applicazione in corso (modalità {startup_mode()})...")
+    timings = {"import moduli": time.perf_counter() - _IMPORT_STARTED}
+    if os.environ.get("TEMPLATES_PRECOMPILE") == "1":
+        with phase("template", timings):
+            logger.info(f"Template precompilati: {precompile_templates()}")
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Verifica tabelle completata.")
+        timings.update(prepare_database(SessionLocal))
+    except SchemaOutdatedError:
+        raise
     except Exception as e:  # pragma: no cover
         logger.error(f"Impossibile connettersi al database all'avvio: {e}")
         yield
         return
-
-    db = SessionLocal()
-    try:
-        if db.query(Role).count() == 0:
-            logger.info("Popolamento dei ruoli...")
-            db.add_all([
-                Role(name='atleta'),
-                Role(name='allenatore'),
-                Role(name='istruttore'),
-                Role(name='admin')
-            ])
-            db.commit()
-
-        seed_categories(db)
-        seed_turni(db)
-        seed_default_allenamenti(db)
-        seed_mezzi(db)
-        seed_turni(db)
-        seed_default_allenamenti(db)
-        seed_mezzi(db)
-
-        admin_username = os.environ.get("ADMIN_USERNAME", "admin")
-        admin_password = os.environ.get("ADMIN_PASSWORD")
-        if admin_password and not db.query(User).filter(User.username == admin_username).first():
-            logger.info(f"Creazione utente admin '{admin_username}'...")
-            admin_role = db.query(Role).filter_by(name='admin').one()
-            allenatore_role = db.query(Role).filter_by(name='allenatore').one()
-            admin_user = User(
-                username=admin_username,
-                hashed_password=security.get_password_hash(admin_password),
-                first_name="Admin",
-                last_name="User",
-                email=os.environ.get("ADMIN_EMAIL", "admin@example.com"),
-                date_of_birth=date(1990, 1, 1),
-                roles=[admin_role, allenatore_role]
-            )
-            db.add(admin_user)
-            db.commit()
-            logger.info(f"Utente admin '{admin_username}' creato.")
-    except Exception as e:
-        logger.warning(
-            f"Errore durante il popolamento dei dati di base all'avvio: {e}"
-        )
-        db.rollback()
-    finally:
-        db.close()
+    if cache_versions.start_listener():
+        logger.info("Invalidazione cache: LISTEN/NOTIFY attivo")
+    logger.info(
+        "Avvio completato in %.1f ms (%s)",
+        sum(timings.values()) * 1000,
+        ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items()),
+    )
 
     yield
+    cache_versions.stop_listener()
+    shutdown_hash_pool()
+    security.shutdown_verify_pool()
 
 
 # Creazione dell'istanza FastAPI
-app = FastAPI(title="Gestionale Canottieri", lifespan=lifespan)
+app = FastAPI(
+    title="Gestionale Canottieri",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 # Configurazione del middleware per le sessioni
 SECRET_KEY = os.environ.get("SECRET_KEY")
 if not SECRET_KEY:
     raise RuntimeError("SECRET_KEY environment variable is required")
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+# gzip/brotli per JSON, HTML, CSV e ICS sopra 1 KB (gli asset precompressi passano invariati)
+app.add_middleware(CompressionMiddleware)
+# latenza per route e richieste in corso, esposte su /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
 
-# Configurazione dei template Jinja2 e dei file statici
-templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates.env.globals['get_color_for_type'] = get_color_for_type
+# File statici (i template Jinja2 sono condivisi in utils.render);
+# gli asset con fingerprint si generano con `python build_static.py`
+app.mount("/static", AssetStaticFiles(directory="static"), name="static")
 
 
 def is_api_request(request: Request) -> bool:
@@ -177,6 +170,34 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+HEALTH_DB_TIMEOUT = float(os.environ.get("HEALTH_DB_TIMEOUT", "2"))
+
+
+def _ping_database() -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: il worker è pronto solo se il database risponde entro il timeout."""
+    try:
+        with anyio.fail_after(HEALTH_DB_TIMEOUT):
+            await anyio.to_thread.run_sync(_ping_database, cancellable=True)
+    except TimeoutError:
+        return JSONResponse({"status": "error", "database": "timeout"}, status_code=503)
+    except Exception as e:
+        logger.warning(f"Health check del database fallito: {e}")
+        return JSONResponse({"status": "error", "database": "unavailable"}, status_code=503)
+    return {"status": "ok", "database": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Metriche del worker in formato Prometheus."""
+    return Response(render_metrics(engine), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/__version__")
 async def version() -> dict:
     return {"version": os.environ.get("GIT_COMMIT", "unknown")}
@@ -198,6 +219,11 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
 
 
+@app.exception_handler(SeasonClosedError)
+async def season_closed_exception_handler(request: Request, exc: SeasonClosedError):
+    return JSONResponse({"detail": str(exc)}, status_code=status.HTTP_409_CONFLICT)
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     if is_api_request(request):
@@ -240,6 +266,11 @@ async def manifest():
 
 @app.get('/sw.js')
 async def service_worker():
-    return FileResponse('static/sw.js', media_type='application/javascript')
+    # sempre rivalidato: è così che il browser scopre un nuovo deploy
+    return Response(
+        service_worker_script(),
+        media_type='application/javascript',
+        headers={'Cache-Control': 'no-cache', 'Service-Worker-Allowed': '/'},
+    )
 
 
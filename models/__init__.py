@@ -9,3 +9,8 @@ from .activities import (
     ActivityType, QualificationType, Activity, UserQualification,
     ActivityRequirement, ActivityAssignment, ActivityAudit
 )
+
+# Import delle tabelle delle stagioni chiuse
+from .storico import (
+    HISTORY_SCHEMA, history_metadata, StoricoAllenamento, StoricoAttendance
+)
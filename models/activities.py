@@ -126,6 +126,7 @@ class UserQualification(Base):
     __table_args__ = (
         Index("ix_user_qualifications_user", "user_id"),
         Index("ix_user_qualifications_qualification", "qualification_type_id"),
+        Index("ix_user_qualifications_expiry", "expiry_date"),
     )
 
 
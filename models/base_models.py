@@ -21,7 +21,7 @@ from sqlalchemy import (
     Enum,
     DateTime,
 )
-from sqlalchemy.orm import relationship, object_session, backref
+from sqlalchemy.orm import attribute_keyed_dict, relationship, object_session, backref
 from sqlalchemy.orm.attributes import flag_modified
 from database import Base
 
@@ -57,6 +57,18 @@ allenamento_coach_association = Table(
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True)
 )
 
+training_series_categoria = Table(
+    'training_series_categoria', Base.metadata,
+    Column('series_id', Integer, ForeignKey('training_series.id', ondelete="CASCADE"), primary_key=True),
+    Column('categoria_id', Integer, ForeignKey('categorie.id'), primary_key=True)
+)
+
+training_series_coach = Table(
+    'training_series_coach', Base.metadata,
+    Column('series_id', Integer, ForeignKey('training_series.id', ondelete="CASCADE"), primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True)
+)
+
 
 # --- MODELLI DELLE TABELLE PRINCIPALI ---
 
@@ -89,7 +101,7 @@ class User(Base):
     tax_code = Column(String, unique=True)
     enrollment_year = Column(Integer)
     membership_date = Column(Date)
-    certificate_expiration = Column(Date)
+    certificate_expiration = Column(Date, index=True)
     address = Column(String)
     manual_category = Column(String, nullable=True)
     calendar_token = Column(String(64), unique=True, index=True, nullable=True)
@@ -236,72 +248,134 @@ class Barca(Base):
         return posti_map.get(self.tipo, {})
 
 
+# posti di un equipaggio, dalla poppa alla prua
+POSTI_EQUIPAGGIO = (
+    "capovoga", "secondo", "terzo", "quarto", "quinto", "sesto", "settimo", "prodiere", "timoniere",
+)
+
+
+class CrewSeat(Base):
+    """Un atleta in un posto di un equipaggio (una riga per posto occupato)."""
+    __tablename__ = "crew_seats"
+    equipaggio_id = Column(Integer, ForeignKey("equipaggi.id", ondelete="CASCADE"), primary_key=True)
+    posto = Column(String(20), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    equipaggio = relationship("Equipaggio", back_populates="seats")
+    user = relationship("User", lazy="joined")
+
+    __table_args__ = (
+        # "in quali equipaggi è l'atleta X" e "in quale posto"
+        Index("ix_crew_seats_user_posto", "user_id", "posto"),
+    )
+
+
+class _SeatUserId:
+    """``Equipaggio.<posto>_id``: legge e scrive la riga di ``crew_seats`` del posto."""
+
+    def __init__(self, posto: str):
+        self.posto = posto
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        seat = obj.seats.get(self.posto)
+        return seat.user_id if seat else None
+
+    def __set__(self, obj, user_id) -> None:
+        seat = obj.seats.get(self.posto)
+        if user_id is None:
+            obj.seats.pop(self.posto, None)
+        elif seat is None or seat.user_id != user_id:
+            # la riga sostituita diventa un UPDATE al flush (stessa chiave primaria)
+            obj.seats[self.posto] = CrewSeat(posto=self.posto, user_id=user_id)
+
+
+class _SeatUser:
+    """``Equipaggio.<posto>``: l'atleta seduto nel posto, o ``None``."""
+
+    def __init__(self, posto: str):
+        self.posto = posto
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        seat = obj.seats.get(self.posto)
+        return seat.user if seat else None
+
+
 class Equipaggio(Base):
     __tablename__ = "equipaggi"
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String(100), nullable=False)
     barca_id = Column(Integer, ForeignKey("barche.id"), nullable=False)
-    capovoga_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    secondo_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    terzo_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    quarto_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    quinto_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    sesto_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    settimo_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    prodiere_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    timoniere_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     note = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
     
     # Relazioni
     barca = relationship("Barca", back_populates="equipaggi")
-    capovoga = relationship("User", foreign_keys=[capovoga_id])
-    secondo = relationship("User", foreign_keys=[secondo_id])
-    terzo = relationship("User", foreign_keys=[terzo_id])
-    quarto = relationship("User", foreign_keys=[quarto_id])
-    quinto = relationship("User", foreign_keys=[quinto_id])
-    sesto = relationship("User", foreign_keys=[sesto_id])
-    settimo = relationship("User", foreign_keys=[settimo_id])
-    prodiere = relationship("User", foreign_keys=[prodiere_id])
-    timoniere = relationship("User", foreign_keys=[timoniere_id])
+    seats = relationship(
+        "CrewSeat",
+        back_populates="equipaggio",
+        collection_class=attribute_keyed_dict("posto"),
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+
+    # accesso per posto, come con le vecchie colonne capovoga_id ... timoniere_id
+    capovoga_id = _SeatUserId("capovoga")
+    secondo_id = _SeatUserId("secondo")
+    terzo_id = _SeatUserId("terzo")
+    quarto_id = _SeatUserId("quarto")
+    quinto_id = _SeatUserId("quinto")
+    sesto_id = _SeatUserId("sesto")
+    settimo_id = _SeatUserId("settimo")
+    prodiere_id = _SeatUserId("prodiere")
+    timoniere_id = _SeatUserId("timoniere")
+    capovoga = _SeatUser("capovoga")
+    secondo = _SeatUser("secondo")
+    terzo = _SeatUser("terzo")
+    quarto = _SeatUser("quarto")
+    quinto = _SeatUser("quinto")
+    sesto = _SeatUser("sesto")
+    settimo = _SeatUser("settimo")
+    prodiere = _SeatUser("prodiere")
+    timoniere = _SeatUser("timoniere")
 
     def get_atleti_assegnati(self) -> dict:
         """Restituisce un dizionario con tutti gli atleti assegnati ai vari posti"""
-        atleti = {}
-        if self.capovoga:
-            atleti['capovoga'] = self.capovoga
-        if self.secondo:
-            atleti['secondo'] = self.secondo
-        if self.terzo:
-            atleti['terzo'] = self.terzo
-        if self.quarto:
-            atleti['quarto'] = self.quarto
-        if self.quinto:
-            atleti['quinto'] = self.quinto
-        if self.sesto:
-            atleti['sesto'] = self.sesto
-        if self.settimo:
-            atleti['settimo'] = self.settimo
-        if self.prodiere:
-            atleti['prodiere'] = self.prodiere
-        if self.timoniere:
-            atleti['timoniere'] = self.timoniere
-        return atleti
+        return {
+            posto: self.seats[posto].user
+            for posto in POSTI_EQUIPAGGIO
+            if posto in self.seats and self.seats[posto].user
+        }
 
     def get_posti_occupati(self) -> dict:
         """Restituisce un dizionario con i posti occupati e i relativi atleti"""
-        return {
-            'capovoga': self.capovoga_id,
-            'secondo': self.secondo_id,
-            'terzo': self.terzo_id,
-            'quarto': self.quarto_id,
-            'quinto': self.quinto_id,
-            'sesto': self.sesto_id,
-            'settimo': self.settimo_id,
-            'prodiere': self.prodiere_id,
-            'timoniere': self.timoniere_id
-        }
+        return {posto: getattr(self, f"{posto}_id") for posto in POSTI_EQUIPAGGIO}
+
+
+def _scadenze_colorate(mezzo, voci) -> List[Tuple[str, date, str, str, str, str]]:
+    """(nome, data, colore, identificativo, frazionamento, assicuratore) delle scadenze impostate."""
+    today = date.today()
+    scadenze = []
+    for nome, campo in voci:
+        giorno = getattr(mezzo, campo)
+        if not giorno:
+            continue
+        giorni = (giorno - today).days
+        if giorni > 365:
+            colore = "bg-success"
+        elif giorni > 90:
+            colore = "bg-warning text-dark"
+        else:
+            colore = "bg-danger"
+        scadenze.append((nome, giorno, colore,
+                         getattr(mezzo, f"{campo}_identificativo") or "",
+                         getattr(mezzo, f"{campo}_frazionamento") or "",
+                         getattr(mezzo, f"{campo}_assicuratore") or ""))
+    return scadenze
 
 
 class Furgone(Base):
@@ -315,28 +389,36 @@ class Furgone(Base):
     stato = Column(Enum("libero", "manutenzione", "fuori_uso", "trasferta", name="stato_furgone"), default="libero")
     
     # Scadenze con nuovi campi
-    scadenza_bollo = Column(Date, nullable=True)
+    scadenza_bollo = Column(Date, nullable=True, index=True)
     scadenza_bollo_identificativo = Column(String, nullable=True)
     scadenza_bollo_frazionamento = Column(Enum("mensile", "semestrale", "annuale", name="frazionamento"), nullable=True)
     scadenza_bollo_assicuratore = Column(String, nullable=True)
     
-    scadenza_revisione = Column(Date, nullable=True)
+    scadenza_revisione = Column(Date, nullable=True, index=True)
     scadenza_revisione_identificativo = Column(String, nullable=True)
     scadenza_revisione_frazionamento = Column(Enum("mensile", "semestrale", "annuale", name="frazionamento"), nullable=True)
     scadenza_revisione_assicuratore = Column(String, nullable=True)
     
-    scadenza_rca = Column(Date, nullable=True)
+    scadenza_rca = Column(Date, nullable=True, index=True)
     scadenza_rca_identificativo = Column(String, nullable=True)
     scadenza_rca_frazionamento = Column(Enum("mensile", "semestrale", "annuale", name="frazionamento"), nullable=True)
     scadenza_rca_assicuratore = Column(String, nullable=True)
     
-    scadenza_infortuni_conducente = Column(Date, nullable=True)
+    scadenza_infortuni_conducente = Column(Date, nullable=True, index=True)
     scadenza_infortuni_conducente_identificativo = Column(String, nullable=True)
     scadenza_infortuni_conducente_frazionamento = Column(Enum("mensile", "semestrale", "annuale", name="frazionamento"), nullable=True)
     scadenza_infortuni_conducente_assicuratore = Column(String, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # (etichetta, colonna data): le colonne accessorie hanno i suffissi _identificativo ecc.
+    SCADENZE = (
+        ("Bollo", "scadenza_bollo"),
+        ("Revisione", "scadenza_revisione"),
+        ("RCA", "scadenza_rca"),
+        ("Infortuni conducente", "scadenza_infortuni_conducente"),
+    )
     
     @property
     def status_info(self) -> Tuple[str, str]:
@@ -352,63 +434,7 @@ class Furgone(Base):
     @property
     def scadenze(self) -> List[Tuple[str, date, str, str, str, str]]:
         """Restituisce lista di (nome, data, colore, identificativo, frazionamento, assicuratore)"""
-        from datetime import date
-        today = date.today()
-        scadenze = []
-        
-        if self.scadenza_bollo:
-            giorni = (self.scadenza_bollo - today).days
-            if giorni > 365:
-                colore = "bg-success"
-            elif giorni > 90:
-                colore = "bg-warning text-dark"
-            else:
-                colore = "bg-danger"
-            scadenze.append(("Bollo", self.scadenza_bollo, colore, 
-                           self.scadenza_bollo_identificativo or "", 
-                           self.scadenza_bollo_frazionamento or "", 
-                           self.scadenza_bollo_assicuratore or ""))
-        
-        if self.scadenza_revisione:
-            giorni = (self.scadenza_revisione - today).days
-            if giorni > 365:
-                colore = "bg-success"
-            elif giorni > 90:
-                colore = "bg-warning text-dark"
-            else:
-                colore = "bg-danger"
-            scadenze.append(("Revisione", self.scadenza_revisione, colore,
-                           self.scadenza_revisione_identificativo or "", 
-                           self.scadenza_revisione_frazionamento or "", 
-                           self.scadenza_revisione_assicuratore or ""))
-        
-        if self.scadenza_rca:
-            giorni = (self.scadenza_rca - today).days
-            if giorni > 365:
-                colore = "bg-success"
-            elif giorni > 90:
-                colore = "bg-warning text-dark"
-            else:
-                colore = "bg-danger"
-            scadenze.append(("RCA", self.scadenza_rca, colore,
-                           self.scadenza_rca_identificativo or "", 
-                           self.scadenza_rca_frazionamento or "", 
-                           self.scadenza_rca_assicuratore or ""))
-        
-        if self.scadenza_infortuni_conducente:
-            giorni = (self.scadenza_infortuni_conducente - today).days
-            if giorni > 365:
-                colore = "bg-success"
-            elif giorni > 90:
-                colore = "bg-warning text-dark"
-            else:
-                colore = "bg-danger"
-            scadenze.append(("Infortuni conducente", self.scadenza_infortuni_conducente, colore,
-                           self.scadenza_infortuni_conducente_identificativo or "", 
-                           self.scadenza_infortuni_conducente_frazionamento or "", 
-                           self.scadenza_infortuni_conducente_assicuratore or ""))
-        
-        return scadenze
+        return _scadenze_colorate(self, self.SCADENZE)
 
 
 class GommoneOre(Base):
@@ -426,6 +452,10 @@ class GommoneOre(Base):
     gommone = relationship("Gommone", back_populates="registro_ore")
     allenatore = relationship("User", back_populates="gommone_ore")
 
+    __table_args__ = (
+        Index("ix_gommone_ore_gommone_data", "gommone_id", "data_utilizzo"),
+    )
+
 
 class Gommone(Base):
     __tablename__ = "gommoni"
@@ -437,12 +467,12 @@ class Gommone(Base):
     stato = Column(Enum("libero", "manutenzione", "fuori_uso", name="stato_gommone"), default="libero")
     
     # Scadenze con nuovi campi
-    scadenza_rca = Column(Date, nullable=True)
+    scadenza_rca = Column(Date, nullable=True, index=True)
     scadenza_rca_identificativo = Column(String, nullable=True)
     scadenza_rca_frazionamento = Column(Enum("mensile", "semestrale", "annuale", name="frazionamento"), nullable=True)
     scadenza_rca_assicuratore = Column(String, nullable=True)
     
-    scadenza_manutenzione = Column(Date, nullable=True)
+    scadenza_manutenzione = Column(Date, nullable=True, index=True)
     scadenza_manutenzione_identificativo = Column(String, nullable=True)
     scadenza_manutenzione_frazionamento = Column(Enum("mensile", "semestrale", "annuale", name="frazionamento"), nullable=True)
     scadenza_manutenzione_assicuratore = Column(String, nullable=True)
@@ -452,6 +482,11 @@ class Gommone(Base):
     
     # Relazione con il registro ore
     registro_ore = relationship("GommoneOre", back_populates="gommone")
+
+    SCADENZE = (
+        ("RCA", "scadenza_rca"),
+        ("Manutenzione", "scadenza_manutenzione"),
+    )
     
     @property
     def status_info(self) -> Tuple[str, str]:
@@ -466,37 +501,7 @@ class Gommone(Base):
     @property
     def scadenze(self) -> List[Tuple[str, date, str, str, str, str]]:
         """Restituisce lista di (nome, data, colore, identificativo, frazionamento, assicuratore)"""
-        from datetime import date
-        today = date.today()
-        scadenze = []
-        
-        if self.scadenza_rca:
-            giorni = (self.scadenza_rca - today).days
-            if giorni > 365:
-                colore = "bg-success"
-            elif giorni > 90:
-                colore = "bg-warning text-dark"
-            else:
-                colore = "bg-danger"
-            scadenze.append(("RCA", self.scadenza_rca, colore,
-                           self.scadenza_rca_identificativo or "", 
-                           self.scadenza_rca_frazionamento or "", 
-                           self.scadenza_rca_assicuratore or ""))
-        
-        if self.scadenza_manutenzione:
-            giorni = (self.scadenza_manutenzione - today).days
-            if giorni > 365:
-                colore = "bg-success"
-            elif giorni > 90:
-                colore = "bg-warning text-dark"
-            else:
-                colore = "bg-danger"
-            scadenze.append(("Manutenzione", self.scadenza_manutenzione, colore,
-                           self.scadenza_manutenzione_identificativo or "", 
-                           self.scadenza_manutenzione_frazionamento or "", 
-                           self.scadenza_manutenzione_assicuratore or ""))
-        
-        return scadenze
+        return _scadenze_colorate(self, self.SCADENZE)
 
 
 class EsercizioPesi(Base):
@@ -509,6 +514,9 @@ class EsercizioPesi(Base):
 
 class SchedaPesi(Base):
     __tablename__ = "schede_pesi"
+    __table_args__ = (
+        UniqueConstraint("atleta_id", "esercizio_id", name="uq_scheda_pesi_atleta_esercizio"),
+    )
     id = Column(Integer, primary_key=True)
     atleta_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     esercizio_id = Column(Integer, ForeignKey('esercizi_pesi.id'), nullable=False)
@@ -521,6 +529,20 @@ class SchedaPesi(Base):
     esercizio = relationship("EsercizioPesi", back_populates="schede")
 
 
+class MassimaleStorico(Base):
+    """Storico dei massimali (un valore per giorno), per i confronti di stagione."""
+
+    __tablename__ = "massimali_storico"
+    __table_args__ = (
+        UniqueConstraint("atleta_id", "esercizio_id", "recorded_at", name="uq_massimale_storico_giorno"),
+    )
+    id = Column(Integer, primary_key=True)
+    atleta_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    esercizio_id = Column(Integer, ForeignKey("esercizi_pesi.id", ondelete="CASCADE"), nullable=False)
+    massimale = Column(Float, nullable=False)
+    recorded_at = Column(Date, nullable=False, default=date.today)
+
+
 class Allenamento(Base):
     __tablename__ = "allenamenti"
     id = Column(Integer, primary_key=True, index=True)
@@ -530,11 +552,11 @@ class Allenamento(Base):
     orario = Column(String)
     time_start = Column(Time, nullable=True)
     time_end = Column(Time, nullable=True)
-    recurrence = Column(String(20), nullable=True)
-    repeat_until = Column(Date, nullable=True)
     barca_id = Column(ForeignKey('barche.id'), nullable=True)
     coach_id = Column(ForeignKey('users.id'), nullable=True)
     recurrence_id = Column(String, index=True, nullable=True)
+    # occorrenza materializzata (override) di una TrainingSeries
+    series_id = Column(ForeignKey('training_series.id', ondelete="SET NULL"), nullable=True, index=True)
     categories = relationship(
         "Categoria", secondary=allenamento_categoria_association, back_populates="allenamenti"
     )
@@ -543,6 +565,12 @@ class Allenamento(Base):
     )
     barca = relationship("Barca", lazy="selectin")
     coach = relationship("User", foreign_keys=[coach_id], lazy="selectin")
+    series = relationship("TrainingSeries", back_populates="overrides")
+
+    @property
+    def occurrence_ref(self) -> str:
+        """Identificativo usato dalla UI; vedi ``services.recurrence.VirtualTraining``."""
+        return str(self.id)
 
 
 Index("idx_allenamenti_date", Allenamento.data)
@@ -550,6 +578,57 @@ Index("idx_allenamenti_barca", Allenamento.barca_id)
 Index("idx_allenamenti_coach", Allenamento.coach_id)
 
 
+class TrainingSeries(Base):
+    """Allenamento ricorrente settimanale, espanso in memoria per finestra di date.
+
+    Le singole occorrenze esistono come righe ``Allenamento`` solo quando
+    vengono modificate o ricevono presenze; la data originale viene allora
+    registrata in ``TrainingSeriesException`` per non duplicarla.
+    """
+    __tablename__ = "training_series"
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String, nullable=False)
+    descrizione = Column(String)
+    orario = Column(String)
+    # giorni della settimana (0 = lunedì) separati da virgola, es. "0,2,4"
+    weekdays = Column(String(20), nullable=False)
+    start_date = Column(Date, nullable=False)
+    until = Column(Date, nullable=False)
+    barca_id = Column(ForeignKey('barche.id'), nullable=True)
+    categories = relationship("Categoria", secondary=training_series_categoria)
+    coaches = relationship("User", secondary=training_series_coach)
+    barca = relationship("Barca")
+    exceptions = relationship(
+        "TrainingSeriesException", back_populates="series", cascade="all, delete-orphan"
+    )
+    overrides = relationship("Allenamento", back_populates="series")
+
+    @property
+    def weekday_list(self) -> List[int]:
+        return [int(d) for d in self.weekdays.split(",") if d != ""]
+
+
+Index("idx_training_series_window", TrainingSeries.start_date, TrainingSeries.until)
+
+
+class TrainingSeriesException(Base):
+    """Data originale di una occorrenza cancellata o materializzata.
+
+    ``allenamento_id`` punta alla riga di override; se è nullo l'occorrenza
+    è stata cancellata.
+    """
+    __tablename__ = "training_series_exceptions"
+    id = Column(Integer, primary_key=True)
+    series_id = Column(ForeignKey('training_series.id', ondelete="CASCADE"), nullable=False, index=True)
+    data = Column(Date, nullable=False)
+    allenamento_id = Column(ForeignKey('allenamenti.id', ondelete="SET NULL"), nullable=True)
+    series = relationship("TrainingSeries", back_populates="exceptions")
+    allenamento = relationship("Allenamento")
+    __table_args__ = (
+        UniqueConstraint('series_id', 'data', name='uq_training_series_exception'),
+    )
+
+
 class Turno(Base):
     __tablename__ = "turni"
     id = Column(Integer, primary_key=True, index=True)
@@ -619,12 +698,18 @@ class AttendanceChangeLog(Base):
     source = Column(Enum(AttendanceSource), nullable=False)
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     reason = Column(String, nullable=True)
+    # chiave di idempotenza generata dal client per le modifiche sincronizzate offline
+    client_key = Column(String(64), nullable=True, unique=True)
 
     attendance = relationship(
         "Attendance", backref=backref("changes", cascade="all,delete-orphan")
     )
     changed_by_user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_attendance_change_logs_created_at", "created_at"),
+    )
+
 
 class AthleteMeasurement(Base):
     __tablename__ = "athlete_measurements"
@@ -656,3 +741,50 @@ class AthleteMeasurement(Base):
         foreign_keys=[athlete_id],
         backref=backref("measurements", cascade="all,delete-orphan"),
     )
+
+
+class AppMeta(Base):
+    """Coppie chiave/valore di servizio (es. versione dei dati di base)."""
+
+    __tablename__ = "app_meta"
+
+    key = Column(String(64), primary_key=True)
+    value = Column(String(255), nullable=False)
+
+
+class CacheVersion(Base):
+    """Versione dei dati di un gruppo di tabelle, per invalidare le cache dei worker."""
+
+    __tablename__ = "cache_versions"
+
+    entity = Column(String(32), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class LogArchive(Base):
+    """Un mese di log spostato dal database in un file compresso (vedi services.log_archive)."""
+
+    __tablename__ = "log_archives"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(32), nullable=False)
+    month = Column(String(7), nullable=False)  # YYYY-MM
+    path = Column(String(255), nullable=False)
+    rows = Column(Integer, nullable=False)
+    checksum = Column(String(64), nullable=False)  # sha256 del JSON Lines non compresso
+    archived_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (UniqueConstraint("kind", "month", name="uq_log_archive_kind_month"),)
+
+
+class ClosedSeason(Base):
+    """Stagione chiusa: i suoi allenamenti e presenze stanno nello schema ``storico``."""
+
+    __tablename__ = "closed_seasons"
+
+    season = Column(Integer, primary_key=True)  # anno di inizio
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    trainings = Column(Integer, nullable=False)
+    attendances = Column(Integer, nullable=False)
+    closed_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,134 @@
+"""Tabelle delle stagioni chiuse (schema ``storico``), in sola lettura.
+
+Hanno le stesse colonne delle tabelle correnti; ``attendances`` porta in più
+la data dell'allenamento (``training_date``) per poter essere partizionata.
+Su PostgreSQL ``allenamenti`` e ``attendances`` sono partizionate per
+intervallo di data, una partizione per stagione; su SQLite lo schema è un
+database separato collegato con ``ATTACH`` (vedi ``database.py``). Le
+tabelle non fanno parte di ``Base.metadata``: le crea
+``services.seasons.close_season`` alla prima chiusura.
+"""
+
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    Index,
+    Integer,
+    MetaData,
+    PrimaryKeyConstraint,
+    String,
+    Table,
+    Time,
+)
+from sqlalchemy.orm import foreign, relationship
+
+from database import Base
+from .base_models import AttendanceSource, AttendanceStatus, Barca, Categoria, User
+
+HISTORY_SCHEMA = "storico"
+
+history_metadata = MetaData(schema=HISTORY_SCHEMA)
+
+storico_allenamenti = Table(
+    "allenamenti", history_metadata,
+    Column("id", Integer, nullable=False),
+    Column("tipo", String, nullable=False),
+    Column("descrizione", String),
+    Column("data", Date, nullable=False),
+    Column("orario", String),
+    Column("time_start", Time),
+    Column("time_end", Time),
+    Column("barca_id", Integer),
+    Column("coach_id", Integer),
+    Column("recurrence_id", String),
+    Column("series_id", Integer),
+    # la chiave di partizione deve far parte della chiave primaria
+    PrimaryKeyConstraint("id", "data"),
+    Index("ix_storico_allenamenti_data", "data"),
+    postgresql_partition_by="RANGE (data)",
+)
+
+storico_allenamento_categoria = Table(
+    "allenamento_categoria_association", history_metadata,
+    Column("allenamento_id", Integer, primary_key=True),
+    Column("categoria_id", Integer, primary_key=True),
+)
+
+storico_allenamento_coach = Table(
+    "allenamento_coach_association", history_metadata,
+    Column("allenamento_id", Integer, primary_key=True),
+    Column("user_id", Integer, primary_key=True),
+)
+
+storico_attendances = Table(
+    "attendances", history_metadata,
+    Column("id", Integer, nullable=False),
+    Column("training_id", Integer, nullable=False),
+    Column("training_date", Date, nullable=False),
+    Column("athlete_id", Integer, nullable=False),
+    Column("status", Enum(AttendanceStatus), nullable=False),
+    Column("source", Enum(AttendanceSource), nullable=False),
+    Column("change_count", Integer, nullable=False),
+    Column("last_changed_at", DateTime),
+    PrimaryKeyConstraint("id", "training_date"),
+    Index("ix_storico_attendances_training", "training_id", "athlete_id"),
+    Index("ix_storico_attendances_athlete", "athlete_id"),
+    postgresql_partition_by="RANGE (training_date)",
+)
+
+storico_attendance_change_logs = Table(
+    "attendance_change_logs", history_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("attendance_id", Integer, nullable=False, index=True),
+    Column("changed_by_user_id", Integer),
+    Column("old_status", Enum(AttendanceStatus)),
+    Column("new_status", Enum(AttendanceStatus), nullable=False),
+    Column("source", Enum(AttendanceSource), nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("reason", String),
+    Column("client_key", String(64)),
+)
+
+# tabelle partizionate per stagione (su PostgreSQL) -> colonna di partizione
+PARTITIONED = {"allenamenti": "data", "attendances": "training_date"}
+
+
+class StoricoAllenamento(Base):
+    """Allenamento di una stagione chiusa; espone gli attributi di ``Allenamento``."""
+
+    __table__ = storico_allenamenti
+    __mapper_args__ = {"primary_key": [storico_allenamenti.c.id]}
+
+    categories = relationship(
+        Categoria,
+        secondary=storico_allenamento_categoria,
+        primaryjoin=lambda: StoricoAllenamento.id == foreign(storico_allenamento_categoria.c.allenamento_id),
+        secondaryjoin=lambda: Categoria.id == foreign(storico_allenamento_categoria.c.categoria_id),
+        viewonly=True,
+    )
+    coaches = relationship(
+        User,
+        secondary=storico_allenamento_coach,
+        primaryjoin=lambda: StoricoAllenamento.id == foreign(storico_allenamento_coach.c.allenamento_id),
+        secondaryjoin=lambda: User.id == foreign(storico_allenamento_coach.c.user_id),
+        viewonly=True,
+    )
+    barca = relationship(
+        Barca, primaryjoin=lambda: foreign(StoricoAllenamento.barca_id) == Barca.id, viewonly=True, lazy="selectin"
+    )
+    coach = relationship(
+        User, primaryjoin=lambda: foreign(StoricoAllenamento.coach_id) == User.id, viewonly=True, lazy="selectin"
+    )
+
+    @property
+    def occurrence_ref(self) -> str:
+        return str(self.id)
+
+
+class StoricoAttendance(Base):
+    __table__ = storico_attendances
+    __mapper_args__ = {"primary_key": [storico_attendances.c.id]}
+
+    athlete = relationship(User, primaryjoin=lambda: foreign(StoricoAttendance.athlete_id) == User.id, viewonly=True)
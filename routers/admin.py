@@ -1,17 +1,17 @@
 # File: routers/admin.py
 from typing import List, Optional
 from datetime import date, timedelta
-from fastapi import APIRouter, Request, Depends, Form, Query, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Request, Depends, File, Form, Query, HTTPException, UploadFile, status
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_
-from fastapi.templating import Jinja2Templates
 import models, security
 from database import get_db
 from dependencies import get_current_admin_user
+from services.member_import import import_members, read_rows
+from utils.render import templates
 
 router = APIRouter(prefix="/admin", tags=["Amministrazione"])
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/users", response_class=HTMLResponse)
@@ -121,6 +121,35 @@ async def admin_add_user(db: Session = Depends(get_db), admin_user: models.User
                             status_code=status.HTTP_303_SEE_OTHER)
 
 
+@router.get("/users/import", response_class=HTMLResponse)
+async def admin_import_users_form(request: Request, admin_user: models.User = Depends(get_current_admin_user)):
+    return templates.TemplateResponse(
+        request, "admin/user_import.html", {"current_user": admin_user, "report": None}
+    )
+
+
+@router.post("/users/import", response_class=HTMLResponse)
+async def admin_import_users(
+    request: Request,
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user),
+    file: UploadFile = File(...),
+    dry_run: bool = Form(False),
+    default_role: str = Form("atleta"),
+):
+    """Importa tesserati da CSV/XLSX riportando gli errori riga per riga."""
+    try:
+        rows = read_rows(file.filename or "", await file.read())
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail=f"File non leggibile: {exc}")
+    report = await import_members(db, rows, dry_run=dry_run, default_roles=[default_role])
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse(report.__dict__)
+    return templates.TemplateResponse(
+        request, "admin/user_import.html", {"current_user": admin_user, "report": report}
+    )
+
+
 @router.get("/users/{user_id}", response_class=HTMLResponse, name="admin_view_user")
 async def admin_view_user(user_id: int, request: Request, db: Session = Depends(get_db),
                           admin_user: models.User = Depends(get_current_admin_user)):
@@ -19,11 +19,14 @@ from schemas.activities import (
     ExtractionFilter, ExtractionRow, PaymentKPI, PaymentSummary,
     QualificationTypeRead
 )
+from services import stats_cache
+from services.log_archive import activity_audit_history
 from services.availability import (
     has_time_conflict, compute_activity_coverage, 
     get_available_users_for_requirement, can_user_self_assign,
     get_user_activity_hours
 )
+from utils.dates import month_window
 
 router = APIRouter(prefix="/api/attivita", tags=["API Attività"])
 
@@ -221,6 +224,17 @@ async def delete_activity(
     db.commit()
 
 
+@router.get("/{activity_id}/audit")
+async def get_activity_audit(
+    activity_id: int,
+    include_archived: bool = Query(False),
+    current_user: User = Depends(require_roles("admin")),
+    db: Session = Depends(get_db)
+):
+    """Storico delle modifiche di un'attività; con ``include_archived`` anche i mesi archiviati."""
+    return activity_audit_history(db, activity_id, include_archived)
+
+
 # --- ENDPOINTS PER I REQUISITI ---
 
 @router.get("/{activity_id}/requirements", response_model=List[ActivityRequirementRead])
@@ -641,9 +655,20 @@ async def get_extractions(
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id è richiesto")
     
-    # Ottieni le ore
-    hours_data = get_user_activity_hours(db, user_id, month, year)
-    
+    def _compute() -> List[dict]:
+        return [
+            {**data, "date": data["date"].isoformat(), "hours": float(data["hours"])}
+            for data in get_user_activity_hours(db, user_id, month, year)
+        ]
+
+    hours_data = stats_cache.cached_result(
+        "estrazioni",
+        {"user_id": user_id, "month": month, "year": year},
+        month_window(year, month) if year else None,
+        stats_cache.ACTIVITIES,
+        _compute,
+    )
+
     # Converti in formato ExtractionRow
     extraction_rows = []
     for data in hours_data:
@@ -1,14 +1,11 @@
 """Routes related to athletes management."""
 from datetime import date
-from io import StringIO
 from typing import List, Optional
-import csv
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import extract, or_
+from sqlalchemy import or_
 
 import models
 from schemas.athletes import MeasurementIn
@@ -18,13 +15,25 @@ from services.athletes_service import (
     current_category_for_user,
     get_athlete_attendance_stats,
 )
+from services import stats_cache
 from services.attendance_service import (
     get_roster_for_training,
     compute_status_for_athlete,
 )
+from services.measurements_service import (
+    METRIC_FIELDS,
+    bucket_means,
+    category_percentile_bands,
+    downsample_lttb,
+    load_series,
+    to_json_list,
+)
+from utils.dates import month_window
+from utils.export import streaming_export
+from utils.render import templates
+from utils.responses import FastJSONResponse
 
 router = APIRouter(tags=["Atleti"])
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/risorse/athletes", name="athletes_list")
@@ -399,37 +408,52 @@ async def add_measurement(
 @router.get("/api/athletes/{athlete_id}/measurements")
 async def measurements_series(
     athlete_id: int,
-    metric: str = Query(...),
+    metric: Optional[str] = Query(None),
+    fields: List[str] = Query([]),
     year: Optional[int] = Query(None),
+    downsample: Optional[str] = Query(None, pattern="^(lttb|week|month)$"),
+    points: int = Query(300, ge=3, le=5000),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    q = db.query(models.AthleteMeasurement).filter_by(athlete_id=athlete_id)
-    if year is not None:
-        q = q.filter(extract('year', models.AthleteMeasurement.measured_at) == year)
-    q = q.order_by(models.AthleteMeasurement.measured_at.asc())
-    measurements = q.all()
-    labels = [m.measured_at.isoformat() for m in measurements]
-    
-    metric_mapping = {
-        "weight": "weight_kg",
-        "height": "height_cm",
-        "torso_height": "torso_height_cm",
-        "wingspan": "wingspan_cm",
-        "leg_length": "leg_length_cm",
-        "tibia_length": "tibia_length_cm",
-        "arm_length": "arm_length_cm",
-        "foot_length": "foot_length_cm",
-        "flexibility": "flexibility_cm"
-    }
-    
-    field_name = metric_mapping.get(metric)
-    if field_name:
-        data = [getattr(m, field_name) for m in measurements]
-    else:
-        data = []
-    
-    return {"labels": labels, "data": data}
+    """Serie delle misurazioni di un atleta.
+
+    Con ``metric`` restituisce ``labels``/``data`` per una singola metrica;
+    con ``fields`` restituisce più metriche in formato colonnare.  Il
+    parametro ``downsample`` riduce i punti lato server (LTTB o medie
+    settimanali/mensili).
+    """
+    metrics = [m for m in (fields or ([metric] if metric else [])) if m in METRIC_FIELDS]
+    if not metrics:
+        if fields:
+            raise HTTPException(status_code=422, detail="Nessuna metrica valida")
+        return {"labels": [], "data": []}
+    dates, values = load_series(db, athlete_id, metrics, year)
+    if downsample == "lttb":
+        dates, values = downsample_lttb(dates, values, points)
+    elif downsample in ("week", "month"):
+        dates, values = bucket_means(dates, values, downsample)
+    labels = [d.isoformat() for d in dates]
+    if not fields:
+        return FastJSONResponse({"labels": labels, "data": to_json_list(values[metrics[0]])})
+    return FastJSONResponse(
+        {
+            "labels": labels,
+            "series": {m: to_json_list(values[m]) for m in metrics},
+        }
+    )
+
+
+@router.get("/api/categories/{categoria_id}/measurement_bands")
+def measurement_bands(
+    categoria_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_or_coach_user),
+):
+    categoria = db.get(models.Categoria, categoria_id)
+    if not categoria:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return FastJSONResponse(category_percentile_bands(db, categoria))
 
 
 @router.put("/risorse/athletes/{athlete_id}/measurements/{measurement_id}")
@@ -535,6 +559,16 @@ async def get_athlete_measurements(
     ]
 
 
+def _attendance_stats(db: Session, athlete_id: int, year: int, month: Optional[int], tipo: Optional[List[str]]) -> dict:
+    return stats_cache.cached_result(
+        "athlete_attendance_stats",
+        {"athlete_id": athlete_id, "year": year, "month": month, "tipo": tipo},
+        month_window(year, month),
+        stats_cache.TRAININGS,
+        lambda: get_athlete_attendance_stats(db, athlete_id, year, month, tipo),
+    )
+
+
 @router.get("/api/athletes/{athlete_id}/attendance_stats")
 def athlete_attendance_stats(
     athlete_id: int,
@@ -544,7 +578,7 @@ def athlete_attendance_stats(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    stats = get_athlete_attendance_stats(db, athlete_id, year, month, tipo)
+    stats = _attendance_stats(db, athlete_id, year, month, tipo)
     return stats
 
 
@@ -557,24 +591,21 @@ def athlete_attendance_csv(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    stats = get_athlete_attendance_stats(db, athlete_id, year, month, tipo)
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["date", "tipo", "categories", "status", "source", "change_count", "time_range"])
-    for s in stats["sessions"]:
-        writer.writerow(
-            [
-                s["date"],
-                s["tipo"],
-                ",".join(s["categories"]),
-                s["status"],
-                s["source"],
-                s["change_count"],
-                s.get("time_range"),
-            ]
-        )
-    response = Response(content=output.getvalue(), media_type="text/csv; charset=utf-8")
-    response.headers["Content-Disposition"] = (
-        f"attachment; filename=athlete_{athlete_id}_attendance.csv"
+    stats = _attendance_stats(db, athlete_id, year, month, tipo)
+    rows = (
+        [
+            s["date"],
+            s["tipo"],
+            ",".join(s["categories"]),
+            s["status"],
+            s["source"],
+            s["change_count"],
+            s.get("time_range"),
+        ]
+        for s in stats["sessions"]
+    )
+    return streaming_export(
+        rows,
+        f"athlete_{athlete_id}_attendance",
+        header=["date", "tipo", "categories", "status", "source", "change_count", "time_range"],
     )
-    return response
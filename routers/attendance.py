@@ -9,13 +9,18 @@ from schemas.attendance import (
     ToggleAttendanceIn,
     SetAttendanceIn,
     AttendanceBulkIn,
+    AttendanceSyncIn,
 )
 from database import get_db
 from dependencies import get_current_user, get_current_admin_or_coach_user
 from services.attendance_service import (
+    apply_attendance_changes,
     get_roster_for_training,
     compute_status_for_athlete,
 )
+from services.log_archive import attendance_history
+from services.recurrence import resolve_training
+from services.seasons import ensure_open
 from utils import parse_orario
 
 router = APIRouter(tags=["Presenze"])
@@ -33,6 +38,7 @@ async def toggle_attendance(
     training = db.get(models.Allenamento, training_id)
     if not training:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Training not found")
+    ensure_open(db, training.data)
     start_dt, _ = parse_orario(training.data, training.orario)
     if datetime.now(timezone.utc) >= start_dt - timedelta(hours=3):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cambio limite superato")
@@ -90,11 +96,11 @@ async def toggle_attendance(
 
 @router.get("/trainings/{training_id}/attendance")
 async def list_attendance(
-    training_id: int,
+    training_id: str,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    training = db.get(models.Allenamento, training_id)
+    training = resolve_training(db, training_id)
     if not training:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Training not found")
     roster = get_roster_for_training(db, training)
@@ -142,6 +148,7 @@ async def bulk_set_attendance(
     training = db.get(models.Allenamento, training_id)
     if not training:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Training not found")
+    ensure_open(db, training.data)
     roster = {a.id for a in get_roster_for_training(db, training)}
     extra_ids = [
         att.athlete_id
@@ -193,6 +200,30 @@ async def bulk_set_attendance(
     return {"updated": results}
 
 
+@router.post("/attendance/sync")
+async def sync_attendance(
+    payload: AttendanceSyncIn,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_or_coach_user),
+):
+    """Apply attendance changes queued offline by the PWA in one transaction."""
+    results = apply_attendance_changes(db, payload.changes, current_user.id)
+    db.commit()
+    return {"results": results}
+
+
+@router.get("/trainings/{training_id}/attendance/{athlete_id}/history")
+def get_attendance_history(
+    training_id: int,
+    athlete_id: int,
+    include_archived: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_or_coach_user),
+):
+    """Change log of one attendance; ``include_archived`` also reads archived months."""
+    return {"changes": attendance_history(db, training_id, athlete_id, include_archived)}
+
+
 @router.post("/trainings/{training_id}/attendance/{athlete_id}")
 async def set_attendance(
     training_id: int,
@@ -204,6 +235,7 @@ async def set_attendance(
     training = db.get(models.Allenamento, training_id)
     if not training:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Training not found")
+    ensure_open(db, training.data)
     desired_status = models.AttendanceStatus(payload.status)
     reason = payload.reason
     attendance = (
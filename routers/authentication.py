@@ -3,15 +3,21 @@ from typing import Optional
 
 from fastapi import APIRouter, Request, Depends, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 import models, security
 from database import get_db
 from dependencies import get_optional_user
 from schemas.auth import LoginInput
+from utils.rate_limit import TokenBucketLimiter, retry_after
+from utils.render import templates
 
 router = APIRouter(tags=["Autenticazione"])
-templates = Jinja2Templates(directory="templates")
+
+# Limiti ai tentativi di login, controllati prima di calcolare bcrypt.
+# Per IP il secchio è ampio perché gli atleti entrano insieme dal wifi della
+# sede; per username basta a coprire i 10 tentativi prima della sospensione.
+login_ip_limiter = TokenBucketLimiter(capacity=30, refill_rate=0.5)
+login_user_limiter = TokenBucketLimiter(capacity=15, refill_rate=1 / 30)
 
 
 @router.get("/login", response_class=HTMLResponse)
@@ -44,6 +50,21 @@ async def login(
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
+    ip_key = request.client.host if request.client else "unknown"
+    user_key = creds.username.strip().lower()
+    wait = login_ip_limiter.acquire(ip_key) or login_user_limiter.acquire(user_key)
+    if wait:
+        return templates.TemplateResponse(
+            request,
+            "auth/login.html",
+            {
+                "current_user": current_user,
+                "error_message": "Troppi tentativi di accesso. Riprova tra qualche istante",
+            },
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": retry_after(wait)},
+        )
+
     db_user = db.query(models.User).filter(models.User.username == creds.username).first()
     if not db_user:
         return templates.TemplateResponse(
@@ -67,7 +88,7 @@ async def login(
             status_code=status.HTTP_403_FORBIDDEN,
         )
 
-    if not security.verify_password(creds.password, db_user.hashed_password):
+    if not await security.verify_password_async(creds.password, db_user.hashed_password):
         db_user.failed_login_attempts += 1
         if db_user.failed_login_attempts >= 10:
             db_user.is_suspended = True
@@ -92,6 +113,8 @@ async def login(
 
     db_user.failed_login_attempts = 0
     db.commit()
+    login_ip_limiter.refund(ip_key)
+    login_user_limiter.refund(user_key)
     request.session["user_id"] = db_user.id
     return RedirectResponse(url="/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
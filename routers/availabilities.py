@@ -4,15 +4,17 @@ from typing import Dict, List
 
 from fastapi import APIRouter, Depends, Request, Form, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
 import models
 from database import get_db
 from dependencies import get_current_admin_or_coach_user, get_current_admin_user
+from schemas.turni import MatrixChangesIn
+from services import turni_matrix
+from utils.render import templates
+from utils.responses import FastJSONResponse
 
 router = APIRouter(tags=["Disponibilità Turni"])
-templates = Jinja2Templates(directory="templates")
 
 
 def _next_month_range() -> tuple[date, date]:
@@ -48,23 +50,20 @@ async def view_availabilities(
         grouped[t.data][t.fascia_oraria] = t
 
     if current_user.is_admin and not user_id:
-        availabilities = (
-            db.query(models.TrainerAvailability)
-            .join(models.Turno)
+        rows = (
+            db.query(
+                models.TrainerAvailability.user_id,
+                models.Turno.data,
+                models.Turno.fascia_oraria,
+            )
+            .join(models.Turno, models.Turno.id == models.TrainerAvailability.turno_id)
             .filter(models.Turno.data.between(month_start, month_end))
-            .options(joinedload(models.TrainerAvailability.user), joinedload(models.TrainerAvailability.turno))
-            .all()
-        )
-        coach_map: Dict[models.User, List[models.Turno]] = defaultdict(list)
-        for av in availabilities:
-            coach_map[av.user].append(av.turno)
-        coaches = (
-            db.query(models.User)
-            .join(models.User.roles)
-            .filter(models.Role.name == "allenatore")
-            .order_by(models.User.first_name, models.User.last_name)
-            .all()
+            .order_by(models.Turno.data, models.Turno.fascia_oraria)
         )
+        coach_map: Dict[int, List[tuple]] = defaultdict(list)
+        for coach_id, data, fascia in rows:
+            coach_map[coach_id].append((data, fascia))
+        coaches = turni_matrix.coach_rows(db)
         return templates.TemplateResponse(
             request,
             "turni_disponibilita.html",
@@ -118,12 +117,7 @@ async def save_availability(
             models.Turno.data.between(month_start, month_end)
         )
     ]
-    db.query(models.TrainerAvailability).filter(
-        models.TrainerAvailability.user_id == target_user_id,
-        models.TrainerAvailability.turno_id.in_(turni_ids),
-    ).delete(synchronize_session=False)
-    for tid in turno_ids:
-        db.add(models.TrainerAvailability(user_id=target_user_id, turno_id=tid, available=True))
+    turni_matrix.set_availability(db, target_user_id, set(turno_ids), turni_ids)
     db.commit()
     redirect_url = "/turni/disponibilita"
     if current_user.is_admin:
@@ -131,6 +125,54 @@ async def save_availability(
     return RedirectResponse(redirect_url, status_code=status.HTTP_303_SEE_OTHER)
 
 
+def _month_range(year: int | None, month: int | None) -> tuple[date, date]:
+    if year is None and month is None:
+        return _next_month_range()
+    if year is None or month is None or not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Mese non valido")
+    next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return date(year, month, 1), next_month - timedelta(days=1)
+
+
+@router.get("/api/turni/matrice")
+async def get_availability_matrix(
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user),
+    year: int | None = None,
+    month: int | None = None,
+):
+    """Matrice allenatori × turni del mese (default il prossimo) in bitset base64."""
+    start, end = _month_range(year, month)
+    return FastJSONResponse(turni_matrix.build_matrix(db, start, end))
+
+
+@router.post("/api/turni/matrice")
+async def save_availability_matrix(
+    changes: MatrixChangesIn,
+    db: Session = Depends(get_db),
+    admin_user: models.User = Depends(get_current_admin_user),
+):
+    """Applica solo le celle modificate della matrice (disponibilità e assegnazioni)."""
+    coach_ids = {c.coach_id for c in changes.availability}
+    coach_ids |= {a.coach_id for a in changes.assignments if a.coach_id is not None}
+    turno_ids = {c.turno_id for c in changes.availability} | {a.turno_id for a in changes.assignments}
+    valid_coaches = {cid for cid, _, _ in turni_matrix.coach_rows(db)}
+    if not coach_ids <= valid_coaches:
+        raise HTTPException(status_code=400, detail="Utente non valido o non è un allenatore")
+    if turno_ids:
+        found = {tid for (tid,) in db.query(models.Turno.id).filter(models.Turno.id.in_(turno_ids))}
+        if found != turno_ids:
+            raise HTTPException(status_code=404, detail="Turno non trovato")
+    added, removed = turni_matrix.apply_changes(
+        db, [(c.coach_id, c.turno_id, c.available) for c in changes.availability]
+    )
+    assigned = turni_matrix.apply_assignments(
+        db, [(a.turno_id, a.coach_id) for a in changes.assignments]
+    )
+    db.commit()
+    return {"added": added, "removed": removed, "assigned": assigned}
+
+
 @router.post("/turni/disponibilita/proponi", response_class=RedirectResponse)
 async def proponi_turni(
     db: Session = Depends(get_db),
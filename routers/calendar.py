@@ -1,9 +1,9 @@
 """Calendar and agenda related routes."""
 from datetime import date, datetime, timedelta, time, timezone
 from zoneinfo import ZoneInfo
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from typing import List, Literal
+from fastapi import APIRouter, Depends, HTTPException, Response, Request, Query
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 import models
@@ -15,9 +15,14 @@ from services.calendar_service import (
     rotate_calendar_token,
 )
 from services.attendance_service import get_roster_for_training
+from services.recurrence import trainings_in_window
+from services import agenda
+from utils.render import templates
+from utils.cache import KeyedCache
+from utils.responses import FastJSONResponse, json_bytes
+from services.cache_versions import versioned_key
 
 router = APIRouter(tags=["Calendario"])
-templates = Jinja2Templates(directory="templates")
 TZ = ZoneInfo("Europe/Rome")
 
 
@@ -51,11 +56,12 @@ def _event(uid: str, start: datetime, end: datetime, summary: str, description:
     return "\r\n".join(lines)
 
 
-@router.get("/calendar/{token}.ics", include_in_schema=False)
-def calendar_ics(token: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter_by(calendar_token=token).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Token non valido")
+_ics_cache = KeyedCache("calendar_ics", maxsize=256)
+# gruppi di dati da cui dipende il feed di un utente (vedi services.cache_versions)
+ICS_ENTITIES = ("allenamenti", "turni", "categorie", "utenti")
+
+
+def _build_ics(db: Session, user: models.User) -> str:
     today = date.today()
     start_date = today - timedelta(days=60)
     end_date = today + timedelta(days=270)
@@ -87,15 +93,8 @@ def calendar_ics(token: str, db: Session = Depends(get_db)):
                 )
             )
 
-    trainings_added: set[int] = set()
-    trainings = (
-        db.query(models.Allenamento)
-        .filter(
-            models.Allenamento.data >= start_date,
-            models.Allenamento.data <= end_date,
-        )
-        .all()
-    )
+    trainings_added: set[str] = set()
+    trainings = trainings_in_window(db, start_date, end_date)
     for a in trainings:
         include = False
         if user.is_allenatore and any(c.id == user.id for c in a.coaches):
@@ -104,9 +103,9 @@ def calendar_ics(token: str, db: Session = Depends(get_db)):
             roster = get_roster_for_training(db, a)
             if any(u.id == user.id for u in roster):
                 include = True
-        if not include or a.id in trainings_added:
+        if not include or a.occurrence_ref in trainings_added:
             continue
-        trainings_added.add(a.id)
+        trainings_added.add(a.occurrence_ref)
         start_dt, end_dt = parse_orario(a.data, a.orario)
         start_dt = start_dt.replace(tzinfo=TZ)
         end_dt = end_dt.replace(tzinfo=TZ)
@@ -131,7 +130,7 @@ def calendar_ics(token: str, db: Session = Depends(get_db)):
         description = "\n".join(desc_lines)
         events.append(
             _event(
-                f"training-{a.id}@sebino",
+                f"training-{a.occurrence_ref}@sebino",
                 start_dt,
                 end_dt,
                 summary,
@@ -148,7 +147,16 @@ def calendar_ics(token: str, db: Session = Depends(get_db)):
         "X-WR-CALNAME:Agenda Canottieri",
         "X-WR-TIMEZONE:Europe/Rome",
     ] + events + ["END:VCALENDAR"]
-    content = "\r\n".join(ics_lines) + "\r\n"
+    return "\r\n".join(ics_lines) + "\r\n"
+
+
+@router.get("/calendar/{token}.ics", include_in_schema=False)
+def calendar_ics(token: str, db: Session = Depends(get_db)):
+    user = db.query(models.User).filter_by(calendar_token=token).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Token non valido")
+    key = versioned_key((user.id, date.today()), *ICS_ENTITIES)
+    content = _ics_cache.get_or_set(key, lambda: _build_ics(db, user))
     headers = {"Cache-Control": "private, max-age=300"}
     return Response(content=content, media_type="text/calendar; charset=utf-8", headers=headers)
 
@@ -242,15 +250,8 @@ def agenda_events(
                 }
             )
 
-    trainings_added: set[int] = set()
-    trainings = (
-        db.query(models.Allenamento)
-        .filter(
-            models.Allenamento.data >= start_date,
-            models.Allenamento.data <= end_date,
-        )
-        .all()
-    )
+    trainings_added: set[str] = set()
+    trainings = trainings_in_window(db, start_date, end_date)
     for a in trainings:
         include = False
         if current_user.is_allenatore and any(c.id == current_user.id for c in a.coaches):
@@ -259,9 +260,9 @@ def agenda_events(
             roster = get_roster_for_training(db, a)
             if any(u.id == current_user.id for u in roster):
                 include = True
-        if not include or a.id in trainings_added:
+        if not include or a.occurrence_ref in trainings_added:
             continue
-        trainings_added.add(a.id)
+        trainings_added.add(a.occurrence_ref)
         start_dt, end_dt = parse_orario(a.data, a.orario)
         start_dt = start_dt.replace(tzinfo=TZ)
         end_dt = end_dt.replace(tzinfo=TZ)
@@ -272,7 +273,7 @@ def agenda_events(
         ) or "Nessuno"
         events.append(
             {
-                "id": f"training-{a.id}",
+                "id": f"training-{a.occurrence_ref}",
                 "title": title,
                 "start": start_dt.isoformat(),
                 "end": end_dt.isoformat(),
@@ -286,4 +287,55 @@ def agenda_events(
                 },
             }
         )
-    return events
+    return FastJSONResponse(events)
+
+
+@router.get("/api/agenda/feed")
+def agenda_feed(
+    request: Request,
+    start: str = Query(...),
+    end: str = Query(...),
+    sources: List[Literal["allenamenti", "turni", "attivita"]] = Query(["allenamenti"]),
+    format: Literal["json", "ndjson"] = "json",
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Eventi di più sorgenti nella finestra ``[start, end)``, in ordine di inizio.
+
+    Ogni sorgente ha il proprio ETag (header ``X-Agenda-ETags``): le sorgenti
+    il cui ETag compare in ``If-None-Match`` non vengono ricaricate e sono
+    elencate in ``X-Agenda-Unchanged``; se nessuna è cambiata si risponde 304.
+    """
+    # FullCalendar invia la finestra visibile come ISO datetime
+    try:
+        window_start = date.fromisoformat(start[:10])
+        window_end = date.fromisoformat(end[:10])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Intervallo di date non valido")
+    if not window_start < window_end <= window_start + timedelta(days=agenda.MAX_WINDOW_DAYS):
+        raise HTTPException(status_code=400, detail="Intervallo di date non valido")
+    names = list(dict.fromkeys(sources))
+    if not all(agenda.allowed(name, current_user) for name in names):
+        raise HTTPException(status_code=403, detail="Accesso negato")
+
+    etags = {name: agenda.source_etag(name, window_start, window_end) for name in names}
+    combined = agenda.combined_etag(etags.values())
+    known = agenda.parse_if_none_match(request.headers.get("if-none-match"))
+    unchanged = [name for name, tag in etags.items() if tag in known]
+    headers = {
+        "ETag": combined,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Cookie",
+        "X-Agenda-ETags": ", ".join(f"{name}={tag}" for name, tag in etags.items()),
+    }
+    if combined[2:] in known or len(unchanged) == len(names):
+        return Response(status_code=304, headers=headers)
+    if unchanged:
+        headers["X-Agenda-Unchanged"] = ", ".join(unchanged)
+    events = agenda.merged_events(
+        db, window_start, window_end, [n for n in names if n not in unchanged]
+    )
+    if format == "ndjson":
+        lines = (json_bytes(event) + b"\n" for event in events)
+        return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+    return FastJSONResponse(list(events), headers=headers)
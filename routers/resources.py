@@ -4,20 +4,19 @@ from datetime import date, datetime, timezone
 from fastapi import APIRouter, Request, Depends, Form, HTTPException, status, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session, joinedload
-from fastapi.templating import Jinja2Templates
 import models
 from database import get_db
 from dependencies import get_current_user, get_current_admin_user, get_current_admin_or_coach_user, require_roles
 from services import barche as barche_service, users as users_service
 from services.users import ALLOWED_PESI_CATEGORIES
 from utils.parsing import to_float
-from services import athletes_service
+from services import athletes_service, deadlines, engine_hours, strength_stats, weights_service
+from schemas.weights import ProgramIn
+from utils.render import templates
+from utils.responses import FastJSONResponse
 
 router = APIRouter(prefix="/risorse", tags=["Risorse"])
 mezzi_router = APIRouter(tags=["Mezzi"], dependencies=[Depends(get_current_admin_user)])  # Router separato per i mezzi con restrizione di accesso
-templates = Jinja2Templates(directory="templates")
-
-
 
 
 @router.get("/barche", response_class=HTMLResponse)
@@ -39,10 +38,7 @@ async def list_barche(
         sort_by=sort_by,
         sort_dir=sort_dir,
     )
-    
-    # Carica gli equipaggi per tutte le barche
-    for barca in barche:
-        barca.equipaggi = athletes_service.get_equipaggi_by_barca(db, barca.id)
+
     barche_assegnate: List[models.Barca] = []
     if not (current_user.is_admin or current_user.is_allenatore):
         barche_assegnate = (
@@ -309,7 +305,6 @@ async def crea_barca(
     return RedirectResponse(url="/risorse/barche", status_code=status.HTTP_303_SEE_OTHER)
 
 
-
 @router.get("/barche/{barca_id}/modifica", response_class=HTMLResponse, name="modifica_barca_form")
 async def modifica_barca_form(barca_id: int, request: Request, db: Session = Depends(get_db),
                               admin_user: models.User = Depends(get_current_admin_user)):
@@ -509,10 +504,7 @@ async def nuovo_equipaggio_form(
         raise HTTPException(status_code=404, detail="Barca non trovata")
     
     posti_richiesti = barca.get_posti_richiesti()
-    atleti_disponibili = {}
-    
-    for posto in posti_richiesti.keys():
-        atleti_disponibili[posto] = athletes_service.get_atleti_disponibili_for_posto(db, barca_id, posto)
+    atleti_disponibili = athletes_service.get_atleti_disponibili_per_posti(db, barca_id, posti_richiesti)
     
     return templates.TemplateResponse(
         request,
@@ -591,12 +583,9 @@ async def modifica_equipaggio_form(
     
     barca = equipaggio.barca
     posti_richiesti = barca.get_posti_richiesti()
-    atleti_disponibili = {}
-    
-    for posto in posti_richiesti.keys():
-        atleti_disponibili[posto] = athletes_service.get_atleti_disponibili_for_posto(
-            db, barca.id, posto, equipaggio_id
-        )
+    atleti_disponibili = athletes_service.get_atleti_disponibili_per_posti(
+        db, barca.id, posti_richiesti, equipaggio_id
+    )
     
     return templates.TemplateResponse(
         request,
@@ -701,9 +690,7 @@ async def view_pesi(
     categoria: Optional[str] = None,
 ):
     esercizi = db.query(models.EsercizioPesi).order_by(models.EsercizioPesi.ordine).all()
-    atleti, categorie = users_service.get_atleti_e_categorie(db, ALLOWED_PESI_CATEGORIES)
-    if categoria:
-        atleti = [a for a in atleti if a.category == categoria]
+    atleti, categorie = users_service.atleti_pesi(db, categoria)
     selected_atleta = None
     if current_user.is_atleta:
         selected_atleta = current_user
@@ -740,21 +727,111 @@ async def update_scheda_pesi(request: Request, db: Session = Depends(get_db),
     atleta_id = int(form_data.get("atleta_id"))
     if not (current_user.is_admin or current_user.is_allenatore or current_user.id == atleta_id): raise HTTPException(
         status_code=403, detail="Non autorizzato")
+    entries, manual = [], {}
     for key, value in form_data.items():
         if key.startswith("massimale_"):
             esercizio_id = int(key.split("_")[1])
-            scheda = db.query(models.SchedaPesi).filter_by(atleta_id=atleta_id,
-                                                           esercizio_id=esercizio_id).first() or models.SchedaPesi(
-                atleta_id=atleta_id, esercizio_id=esercizio_id)
-            if not scheda.id: db.add(scheda)
-            scheda.massimale = float(value) if value else None
-            for rep in [5, 7, 10, 20]:
-                rep_value = form_data.get(f"{rep}rep_{esercizio_id}")
-                setattr(scheda, f"carico_{rep}_rep", float(rep_value) if rep_value else None)
+            entries.append((atleta_id, esercizio_id, float(value) if value else None))
+            # i carichi lasciati vuoti vengono calcolati dal massimale
+            manual[(atleta_id, esercizio_id)] = [
+                float(v) if (v := form_data.get(f"{rep}rep_{esercizio_id}")) else None
+                for rep in weights_service.REPS
+            ]
+    try:
+        weights_service.save_program(db, entries, manual_loads=manual)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     db.commit()
     return RedirectResponse(url=f"/risorse/pesi?atleta_id={atleta_id}", status_code=status.HTTP_303_SEE_OTHER)
 
 
+def _pesi_categoria_or_404(categoria: str) -> str:
+    if categoria not in ALLOWED_PESI_CATEGORIES:
+        raise HTTPException(status_code=404, detail="Categoria non trovata")
+    return categoria
+
+
+def _save_category_program(db: Session, categoria: str, entries, formula: str) -> int:
+    atleti_ids = {a.id for a in weights_service.category_athletes(db, categoria)}
+    esercizi_ids = {e_id for (e_id,) in db.query(models.EsercizioPesi.id)}
+    invalid = [e for e in entries if e[0] not in atleti_ids or e[1] not in esercizi_ids]
+    if invalid:
+        raise HTTPException(status_code=422, detail="Atleta o esercizio non appartenente alla categoria")
+    try:
+        saved = weights_service.save_program(db, entries, formula)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    db.commit()
+    return saved
+
+
+@router.get("/pesi/categoria/{categoria}", response_class=HTMLResponse)
+async def pesi_categoria(
+    request: Request,
+    categoria: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_or_coach_user),
+):
+    """Griglia dei massimali di tutta la categoria con i carichi calcolati."""
+    grid = weights_service.load_grid(db, _pesi_categoria_or_404(categoria))
+    return templates.TemplateResponse(
+        request,
+        "pesi_categoria.html",
+        {
+            "current_user": current_user,
+            "grid": grid.to_dict(),
+            "categorie": ALLOWED_PESI_CATEGORIES,
+            "formule": weights_service.FORMULAS,
+            "message": request.query_params.get("message"),
+        },
+    )
+
+
+@router.post("/pesi/categoria/{categoria}", response_class=RedirectResponse)
+async def salva_pesi_categoria(
+    request: Request,
+    categoria: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_or_coach_user),
+):
+    _pesi_categoria_or_404(categoria)
+    form_data = await request.form()
+    formula = form_data.get("formula", "epley")
+    entries = []
+    for key, value in form_data.items():
+        if key.startswith("m_"):
+            _, atleta_id, esercizio_id = key.split("_")
+            entries.append((int(atleta_id), int(esercizio_id), to_float(value)))
+    saved = _save_category_program(db, categoria, entries, formula)
+    return RedirectResponse(
+        url=f"/risorse/pesi/categoria/{categoria}?message=Schede salvate: {saved}",
+        status_code=status.HTTP_303_SEE_OTHER,
+    )
+
+
+@router.get("/pesi/categoria/{categoria}/grid")
+def pesi_categoria_grid(
+    categoria: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_or_coach_user),
+):
+    return FastJSONResponse(weights_service.load_grid(db, _pesi_categoria_or_404(categoria)).to_dict())
+
+
+@router.put("/pesi/categoria/{categoria}/grid")
+def aggiorna_pesi_categoria_grid(
+    categoria: str,
+    payload: ProgramIn,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_admin_or_coach_user),
+):
+    """Salva in un colpo i massimali della categoria e ricalcola i carichi."""
+    _pesi_categoria_or_404(categoria)
+    entries = [(e.atleta_id, e.esercizio_id, e.massimale) for e in payload.entries]
+    _save_category_program(db, categoria, entries, payload.formula)
+    return FastJSONResponse(weights_service.load_grid(db, categoria).to_dict())
+
+
 @router.post("/pesi/add_esercizio", response_class=RedirectResponse)
 async def add_esercizio_pesi(
     db: Session = Depends(get_db),
@@ -825,9 +902,7 @@ async def statistiche_pesi(
     atleta_id: Optional[int] = None,
 ):
     esercizi = db.query(models.EsercizioPesi).order_by(models.EsercizioPesi.ordine).all()
-    atleti, categorie = users_service.get_atleti_e_categorie(db, ALLOWED_PESI_CATEGORIES)
-    if categoria:
-        atleti = [a for a in atleti if a.category == categoria]
+    atleti, categorie = users_service.atleti_pesi(db, categoria)
     selected_atleta = None
     if current_user.is_atleta:
         selected_atleta = current_user
@@ -849,6 +924,23 @@ async def statistiche_pesi(
         },
     )
 
+
+@router.get("/pesi/statistiche/data")
+def statistiche_pesi_data(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    categoria: Optional[str] = None,
+):
+    """Classifiche e percentili della categoria; un atleta vede solo la propria riga."""
+    if current_user.is_admin or current_user.is_allenatore:
+        stats = strength_stats.strength_stats(db, _pesi_categoria_or_404(categoria or ""))
+        return FastJSONResponse(stats.to_dict())
+    stats = strength_stats.stats_for_athlete(db, current_user.id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Nessuna categoria pesi per l'atleta")
+    return FastJSONResponse(stats.to_dict(atleta_id=current_user.id))
+
+
 # --- ROUTE PER I MEZZI ---
 
 @mezzi_router.get("/", response_class=HTMLResponse)
@@ -873,6 +965,7 @@ async def list_mezzi(
             "current_user": current_user,
             "furgoni": furgoni,
             "gommoni": gommoni,
+            "ore_motore": engine_hours.usage_by_gommone(db),
             "tipo_filter": tipo_filter,
             "page_title": "Mezzi"
         }
@@ -948,6 +1041,18 @@ async def gestione_mezzi(
     )
 
 
+@mezzi_router.get("/scadenze")
+def scadenze_mezzi(
+    dal: date = Query(..., description="Prima data dell'intervallo (inclusa)"),
+    al: date = Query(..., description="Ultima data dell'intervallo (inclusa)"),
+    db: Session = Depends(get_db),
+):
+    """Scadenze di mezzi, certificati e qualifiche fra ``dal`` e ``al``."""
+    if al < dal:
+        raise HTTPException(status_code=422, detail="Intervallo di date non valido")
+    return FastJSONResponse([s.to_dict() for s in deadlines.deadlines_between(db, dal, al)])
+
+
 @mezzi_router.get("/furgone/{furgone_id}", response_class=HTMLResponse)
 async def furgone_detail(
     furgone_id: int,
@@ -991,13 +1096,23 @@ async def gommone_detail(
     if not gommone:
         raise HTTPException(status_code=404, detail="Gommone non trovato")
     
+    ultimi_utilizzi = (
+        db.query(models.GommoneOre)
+        .options(joinedload(models.GommoneOre.allenatore))
+        .filter(models.GommoneOre.gommone_id == gommone_id)
+        .order_by(models.GommoneOre.data_utilizzo.desc(), models.GommoneOre.id.desc())
+        .limit(5)
+        .all()
+    )
     return templates.TemplateResponse(
         request,
         "mezzi/gommone_detail.html",
         {
             "current_user": current_user,
             "gommone": gommone,
-            "today": date.today()
+            "today": date.today(),
+            "ore_motore": engine_hours.usage_for(db, gommone_id),
+            "ultimi_utilizzi": ultimi_utilizzi,
         }
     )
 
@@ -1020,21 +1135,18 @@ async def gommone_ore_detail(
     if not gommone:
         raise HTTPException(status_code=404, detail="Gommone non trovato")
     
-    # Ottieni tutti gli utilizzi ordinati per data (più recenti prima)
-    utilizzi = db.query(models.GommoneOre).filter(
-        models.GommoneOre.gommone_id == gommone_id
-    ).order_by(models.GommoneOre.data_utilizzo.desc()).all()
-    
-    # Calcola statistiche
-    ore_totali = sum(u.ore_utilizzo for u in utilizzi)
-    
-    # Ore per allenatore
-    ore_per_allenatore = {}
-    for utilizzo in utilizzi:
-        allenatore_nome = f"{utilizzo.allenatore.first_name} {utilizzo.allenatore.last_name}"
-        if allenatore_nome not in ore_per_allenatore:
-            ore_per_allenatore[allenatore_nome] = 0
-        ore_per_allenatore[allenatore_nome] += utilizzo.ore_utilizzo
+    # Registro completo, più recenti prima; le statistiche sono aggregate in SQL
+    utilizzi = (
+        db.query(models.GommoneOre)
+        .options(joinedload(models.GommoneOre.allenatore))
+        .filter(models.GommoneOre.gommone_id == gommone_id)
+        .order_by(models.GommoneOre.data_utilizzo.desc())
+        .all()
+    )
+    ore_motore = engine_hours.usage_for(db, gommone_id)
+    ore_per_allenatore = {
+        r["allenatore"]: r["ore"] for r in engine_hours.hours_by_coach(db, gommone_id)
+    }
     
     return templates.TemplateResponse(
         request,
@@ -1043,8 +1155,33 @@ async def gommone_ore_detail(
             "current_user": current_user,
             "gommone": gommone,
             "utilizzi": utilizzi,
-            "ore_totali": ore_totali,
-            "ore_per_allenatore": ore_per_allenatore
+            "ore_totali": ore_motore.ore_totali,
+            "ore_per_allenatore": ore_per_allenatore,
+            "ore_motore": ore_motore,
+            "ore_per_mese": engine_hours.hours_by_month(db, gommone_id),
+        }
+    )
+
+
+@mezzi_router.get("/gommone/{gommone_id}/ore/report")
+def gommone_ore_report(gommone_id: int, db: Session = Depends(get_db)):
+    """Ore motore aggregate: totali, per allenatore, per mese e tagliando previsto."""
+    if db.get(models.Gommone, gommone_id) is None:
+        raise HTTPException(status_code=404, detail="Gommone non trovato")
+    usage = engine_hours.usage_for(db, gommone_id)
+    return FastJSONResponse(
+        {
+            "gommone_id": gommone_id,
+            "ore_totali": usage.ore_totali,
+            "utilizzi": usage.utilizzi,
+            "ultimo_utilizzo": usage.ultimo_utilizzo.isoformat() if usage.ultimo_utilizzo else None,
+            "ore_ultimi_giorni": usage.ore_recenti,
+            "giorni_finestra": engine_hours.USAGE_WINDOW_DAYS,
+            "prossimo_tagliando_ore": usage.prossimo_tagliando_ore,
+            "ore_al_tagliando": usage.ore_al_tagliando,
+            "tagliando_previsto": usage.tagliando_previsto.isoformat() if usage.tagliando_previsto else None,
+            "per_allenatore": engine_hours.hours_by_coach(db, gommone_id),
+            "per_mese": engine_hours.hours_by_month(db, gommone_id),
         }
     )
 
@@ -1428,4 +1565,3 @@ async def crea_gommone(
         raise HTTPException(status_code=500, detail=f"Errore nella creazione: {str(e)}")
 
 
-
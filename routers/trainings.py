@@ -1,13 +1,10 @@
 # File: routers/trainings.py
-import uuid
-from datetime import date, datetime, time, timedelta
+from datetime import date, timedelta
 from typing import Dict, List, Optional
 from fastapi import APIRouter, Request, Depends, Form, Query, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import extract
-from dateutil.rrule import rrule, WEEKLY
-from fastapi.templating import Jinja2Templates
 import models
 from database import get_db
 from dependencies import (
@@ -17,13 +14,31 @@ from dependencies import (
 )
 from services.attendance_service import get_roster_for_training
 from utils import (
-    DAY_MAP_DATETIL,
-    parse_orario,
-    get_color_for_type,
+    WEEKDAY_INDEX,
     export_turni_csv,
     export_turni_excel,
     MONTH_NAMES,
 )
+from utils.export import iter_query
+from utils.render import templates
+from utils.cache import KeyedCache
+from utils.responses import FastJSONResponse
+from services.agenda import training_event, turni_events
+from services import stats_cache
+from services.cache_versions import versioned_key
+from services.recurrence import (
+    VirtualTraining,
+    create_series,
+    delete_occurrence,
+    delete_recurrence,
+    materialize_occurrence,
+    resolve_training,
+    training_types,
+    trainings_in_window,
+    truncate_series,
+    update_trainings,
+)
+from services.seasons import ensure_open
 
 CATEGORY_GROUPS: Dict[str, List[str]] = {
     "Over14": ["Ragazzo", "Junior", "Under 23", "Senior"],
@@ -32,8 +47,6 @@ CATEGORY_GROUPS: Dict[str, List[str]] = {
 }
 
 router = APIRouter(tags=["Allenamenti e Calendario"])
-templates = Jinja2Templates(directory="templates")
-templates.env.globals['get_color_for_type'] = get_color_for_type
 
 
 def _group_categories(db: Session) -> Dict[str, List[str]]:
@@ -55,7 +68,7 @@ async def view_calendar(
     current_user: models.User = Depends(get_current_user),
 ):
     all_categories = [c.nome for c in db.query(models.Categoria).order_by(models.Categoria.nome)]
-    all_types = [t[0] for t in db.query(models.Allenamento.tipo).distinct().order_by(models.Allenamento.tipo)]
+    all_types = training_types(db)
     all_coaches = (
         db.query(models.User)
         .join(models.User.roles)
@@ -90,40 +103,34 @@ async def list_allenamenti(
     today = date.today()
     start_dt = date.fromisoformat(start_date) if start_date else None
     end_dt = date.fromisoformat(end_date) if end_date else None
-    query = db.query(models.Allenamento).options(
-        joinedload(models.Allenamento.categories),
-        joinedload(models.Allenamento.coaches),
-    )
-    if start_dt:
-        query = query.filter(models.Allenamento.data >= start_dt)
-    if end_dt:
-        query = query.filter(models.Allenamento.data <= end_dt)
+    coach_id_int = int(coach_id) if coach_id else None
+    athlete_only = current_user.is_atleta and not (current_user.is_admin or current_user.is_allenatore)
+
+    def _filters(query, model):
+        if athlete_only:
+            query = query.join(model.categories).filter(models.Categoria.nome == current_user.category)
+        elif category:
+            query = query.join(model.categories).filter(models.Categoria.nome == category)
+        if tipo:
+            query = query.filter(model.tipo == tipo)
+        if coach_id_int is not None:
+            query = query.join(model.coaches).filter(models.User.id == coach_id_int)
+        elif unassigned:
+            query = query.outerjoin(model.coaches).filter(models.User.id == None)
+        return query
+
+    window_start, window_end, descending = start_dt, end_dt, False
     if start_dt or end_dt:
         page_title = "Allenamenti filtrati"
-        query = query.order_by(models.Allenamento.data.asc(), models.Allenamento.orario.asc())
     elif filter == "future":
-        page_title, query = "Prossimi Allenamenti", query.filter(models.Allenamento.data >= today).order_by(models.Allenamento.data.asc(), models.Allenamento.orario.asc())
+        page_title, window_start = "Prossimi Allenamenti", today
     elif filter == "past":
-        page_title, query = "Allenamenti Passati", query.filter(models.Allenamento.data < today).order_by(models.Allenamento.data.desc(), models.Allenamento.orario.desc())
+        page_title, window_end, descending = "Allenamenti Passati", today - timedelta(days=1), True
     else:
-        page_title, query = "Tutti gli Allenamenti", query.order_by(models.Allenamento.data.asc(), models.Allenamento.orario.asc())
-    if current_user.is_atleta and not (current_user.is_admin or current_user.is_allenatore):
-        query = query.join(models.Allenamento.categories).filter(
-            models.Categoria.nome == current_user.category
-        )
-    elif category:
-        query = query.join(models.Allenamento.categories).filter(
-            models.Categoria.nome == category
-        )
-    if tipo:
-        query = query.filter(models.Allenamento.tipo == tipo)
-    coach_id_int = int(coach_id) if coach_id else None
-    if coach_id_int is not None:
-        query = query.join(models.Allenamento.coaches).filter(models.User.id == coach_id_int)
-    elif unassigned:
-        query = query.outerjoin(models.Allenamento.coaches).filter(models.User.id == None)
+        page_title = "Tutti gli Allenamenti"
+    allenamenti = trainings_in_window(db, window_start, window_end, _filters, descending=descending)
     all_categories = [c.nome for c in db.query(models.Categoria).order_by(models.Categoria.nome).all()]
-    all_types = [t[0] for t in db.query(models.Allenamento.tipo).distinct().all()]
+    all_types = training_types(db)
     all_coaches = (
         db.query(models.User)
         .join(models.User.roles)
@@ -135,7 +142,7 @@ async def list_allenamenti(
         request,
         "allenamenti/allenamenti_list.html",
         {
-            "allenamenti": query.all(),
+            "allenamenti": allenamenti,
             "current_user": current_user,
             "page_title": page_title,
             "all_categories": all_categories,
@@ -191,7 +198,7 @@ async def crea_allenamento(
     orario_start: Optional[str] = Form(None),
     orario_end: Optional[str] = Form(None),
     is_recurring: Optional[str] = Form(None),
-    giorni: Optional[List[str]] = Form(None),
+    giorni: List[str] = Form([]),
     recurrence_count: Optional[int] = Form(None),
     recurrence_end_date: Optional[date] = Form(None),
     coach_ids: List[int] = Form([]),
@@ -273,7 +280,12 @@ async def crea_allenamento(
             )
 
     if is_recurring == "true":
-        if not giorni or (not recurrence_count and not recurrence_end_date):
+        weekdays = [WEEKDAY_INDEX[d] for d in giorni if d in WEEKDAY_INDEX]
+        if (
+            not weekdays
+            or (not recurrence_count and not recurrence_end_date)
+            or (recurrence_end_date and recurrence_end_date < data)
+        ):
             grouped_categories = _group_categories(db)
             available_coaches = (
                 db.query(models.User)
@@ -295,30 +307,18 @@ async def crea_allenamento(
                 },
                 status_code=400,
             )
-        byweekday = [DAY_MAP_DATETIL[d] for d in giorni if d in DAY_MAP_DATETIL]
-        start_dt, end_dt = parse_orario(data, final_orario)
-        duration = end_dt - start_dt
-        rec_id = str(uuid.uuid4())
-        rule_kwargs = {
-            "dtstart": start_dt,
-            "byweekday": byweekday,
-        }
-        if recurrence_end_date:
-            rule_kwargs["until"] = datetime.combine(recurrence_end_date, start_dt.time())
-        else:
-            rule_kwargs["count"] = recurrence_count
-        rule = rrule(WEEKLY, **rule_kwargs)
-        for occ_dt in rule:
-            new_a = models.Allenamento(
-                tipo=tipo,
-                descrizione=descrizione,
-                data=occ_dt.date(),
-                orario=f"{occ_dt.strftime('%H:%M')}-{(occ_dt + duration).strftime('%H:%M')}",
-                recurrence_id=rec_id,
-            )
-            new_a.categories.extend(categories)
-            new_a.coaches.extend(coaches)
-            db.add(new_a)
+        create_series(
+            db,
+            tipo=tipo,
+            descrizione=descrizione,
+            orario=final_orario,
+            weekdays=weekdays,
+            start_date=data,
+            until=recurrence_end_date,
+            count=recurrence_count,
+            categories=categories,
+            coaches=coaches,
+        )
     else:
         new_a = models.Allenamento(
             tipo=tipo,
@@ -334,15 +334,12 @@ async def crea_allenamento(
 
 @router.get("/allenamenti/{id}/modifica", response_class=HTMLResponse)
 async def modifica_allenamento_form(
-    id: int,
+    id: str,
     request: Request,
     db: Session = Depends(get_db),
     staff_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    allenamento = db.query(models.Allenamento).options(
-        joinedload(models.Allenamento.categories),
-        joinedload(models.Allenamento.coaches),
-    ).get(id)
+    allenamento = resolve_training(db, id)
     if not allenamento:
         raise HTTPException(status_code=404, detail="Allenamento non trovato")
     grouped_categories = _group_categories(db)
@@ -370,7 +367,7 @@ async def modifica_allenamento_form(
 
 @router.post("/allenamenti/{id}/modifica", response_class=RedirectResponse)
 async def aggiorna_allenamento(
-    id: int,
+    id: str,
     request: Request,
     db: Session = Depends(get_db),
     staff_user: models.User = Depends(get_current_admin_or_coach_user),
@@ -382,8 +379,9 @@ async def aggiorna_allenamento(
     orario_end: Optional[str] = Form(None),
     category_names: List[str] = Form([]),
     coach_ids: List[int] = Form([]),
+    edit_scope: str = Form("single"),
 ):
-    allenamento = db.get(models.Allenamento, id)
+    allenamento = resolve_training(db, id)
     if not allenamento:
         raise HTTPException(status_code=404, detail="Allenamento non trovato")
     categories = (
@@ -474,6 +472,24 @@ async def aggiorna_allenamento(
                 status_code=400,
             )
 
+    if edit_scope in ("following", "all") and allenamento.recurrence_id:
+        # la data resta quella di ciascuna occorrenza
+        update_trainings(
+            db,
+            allenamento,
+            edit_scope,
+            tipo=tipo,
+            descrizione=descrizione,
+            orario=final_orario,
+            category_ids=[c.id for c in categories],
+            coach_ids=[c.id for c in coaches],
+        )
+        db.commit()
+        return RedirectResponse(url="/calendario", status_code=status.HTTP_303_SEE_OTHER)
+
+    ensure_open(db, data)
+    if isinstance(allenamento, VirtualTraining):
+        allenamento = materialize_occurrence(db, allenamento)
     allenamento.tipo = tipo
     allenamento.descrizione = descrizione
     allenamento.data = data
@@ -487,14 +503,18 @@ async def aggiorna_allenamento(
 async def delete_allenamento_events(
     db: Session = Depends(get_db),
     staff_user: models.User = Depends(get_current_admin_or_coach_user),
-    allenamento_id: int = Form(...),
+    allenamento_id: str = Form(...),
     deletion_type: str = Form(...),
 ):
-    a = db.get(models.Allenamento, allenamento_id)
+    a = resolve_training(db, allenamento_id)
     if not a: raise HTTPException(status_code=404, detail="Allenamento non trovato")
-    if deletion_type == 'future' and a.recurrence_id:
-        db.query(models.Allenamento).filter(models.Allenamento.recurrence_id == a.recurrence_id, models.Allenamento.data >= a.data).delete(synchronize_session=False)
-    else: db.delete(a)
+    if deletion_type in ('future', 'all') and a.series_id:
+        series = a.series
+        truncate_series(db, series, a.data if deletion_type == 'future' else series.start_date)
+    elif deletion_type in ('future', 'all') and a.recurrence_id:
+        delete_recurrence(db, a.recurrence_id, a.data if deletion_type == 'future' else None)
+    else:
+        delete_occurrence(db, a)
     db.commit()
     return RedirectResponse(url="/calendario", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -615,46 +635,52 @@ async def assegnazione_rapida(
     return RedirectResponse(url=f"/turni?week_offset={week_offset}", status_code=status.HTTP_303_SEE_OTHER)
 
 
+def _turni_export_range(start: Optional[date], end: Optional[date]):
+    """Intervallo dell'export turni: di default il mese corrente."""
+    today = date.today()
+    if start is None:
+        start = today.replace(day=1) if end is None else end.replace(day=1)
+    if end is None:
+        if start.month == 12:
+            next_month = date(start.year + 1, 1, 1)
+        else:
+            next_month = date(start.year, start.month + 1, 1)
+        end = next_month - timedelta(days=1)
+    if end < start:
+        raise HTTPException(status_code=400, detail="Intervallo di date non valido")
+    return start, end
+
+
+def _turni_export_query(db: Session, start: date, end: date):
+    query = (
+        db.query(models.Turno)
+        .options(joinedload(models.Turno.user))
+        .filter(models.Turno.data.between(start, end))
+        .order_by(models.Turno.data, models.Turno.id)
+    )
+    return iter_query(query)
+
+
 @router.get("/turni/export/csv")
 async def turni_export_csv(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    today = date.today()
-    month_start = today.replace(day=1)
-    if today.month == 12:
-        next_month = date(today.year + 1, 1, 1)
-    else:
-        next_month = date(today.year, today.month + 1, 1)
-    month_end = next_month - timedelta(days=1)
-    turni = (
-        db.query(models.Turno)
-        .filter(models.Turno.data.between(month_start, month_end))
-        .order_by(models.Turno.data)
-        .all()
-    )
-    return export_turni_csv(turni, month_start)
+    start, end = _turni_export_range(start, end)
+    return export_turni_csv(_turni_export_query(db, start, end), start, end)
 
 
 @router.get("/turni/export/excel")
 async def turni_export_excel(
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    today = date.today()
-    month_start = today.replace(day=1)
-    if today.month == 12:
-        next_month = date(today.year + 1, 1, 1)
-    else:
-        next_month = date(today.year, today.month + 1, 1)
-    month_end = next_month - timedelta(days=1)
-    turni = (
-        db.query(models.Turno)
-        .filter(models.Turno.data.between(month_start, month_end))
-        .order_by(models.Turno.data)
-        .all()
-    )
-    return export_turni_excel(turni, month_start)
+    start, end = _turni_export_range(start, end)
+    return export_turni_excel(_turni_export_query(db, start, end), start, end)
 
 
 @router.get("/turni/statistiche", response_class=HTMLResponse)
@@ -682,47 +708,65 @@ async def turni_stats(
     else:
         next_month = date(year, month + 1, 1)
     month_end = next_month - timedelta(days=1)
-
-    month_query = db.query(models.Turno).filter(
-        models.Turno.data.between(month_start, month_end)
-    )
-    if not current_user.is_admin:
-        month_query = month_query.filter(models.Turno.user_id == current_user.id)
-    month_covered = month_query.filter(models.Turno.user_id.isnot(None)).count()
-    month_uncovered = month_query.filter(models.Turno.user_id.is_(None)).count()
-
     season_year = year
     season_months = [6, 7, 8, 9]
-    if current_user.is_admin:
-        coaches = (
-            db.query(models.User)
-            .join(models.User.roles)
-            .filter(models.Role.name == "allenatore")
-            .all()
+    owner_id = None if current_user.is_admin else current_user.id
+
+    def _compute() -> dict:
+        month_query = db.query(models.Turno).filter(
+            models.Turno.data.between(month_start, month_end)
         )
-    else:
-        coaches = [current_user]
-    season_counts = []
-    for coach in coaches:
-        count = (
-            db.query(models.Turno)
-            .filter(
-                models.Turno.user_id == coach.id,
-                extract("year", models.Turno.data) == season_year,
-                extract("month", models.Turno.data).in_(season_months),
+        if owner_id is not None:
+            month_query = month_query.filter(models.Turno.user_id == owner_id)
+        month_covered = month_query.filter(models.Turno.user_id.isnot(None)).count()
+        month_uncovered = month_query.filter(models.Turno.user_id.is_(None)).count()
+
+        if owner_id is None:
+            coaches = (
+                db.query(models.User)
+                .join(models.User.roles)
+                .filter(models.Role.name == "allenatore")
+                .all()
             )
-            .count()
-        )
-        season_counts.append((f"{coach.first_name} {coach.last_name}", count))
+        else:
+            coaches = [current_user]
+        season_counts = []
+        for coach in coaches:
+            count = (
+                db.query(models.Turno)
+                .filter(
+                    models.Turno.user_id == coach.id,
+                    extract("year", models.Turno.data) == season_year,
+                    extract("month", models.Turno.data).in_(season_months),
+                )
+                .count()
+            )
+            season_counts.append((f"{coach.first_name} {coach.last_name}", count))
+        return {
+            "month_covered": month_covered,
+            "month_uncovered": month_uncovered,
+            "season_counts": season_counts,
+        }
+
+    stats = stats_cache.cached_result(
+        "turni_statistiche",
+        {"year": year, "month": month, "user_id": owner_id},
+        (
+            min(month_start, date(season_year, min(season_months), 1)),
+            max(month_end, date(season_year, max(season_months), 30)),
+        ),
+        stats_cache.TURNI,
+        _compute,
+    )
 
     return templates.TemplateResponse(
         request,
         "turni_statistiche.html",
         {
             "current_user": current_user,
-            "month_covered": month_covered,
-            "month_uncovered": month_uncovered,
-            "season_counts": season_counts,
+            "month_covered": stats["month_covered"],
+            "month_uncovered": stats["month_uncovered"],
+            "season_counts": stats["season_counts"],
             "years": years,
             "months": months,
             "selected_year": year,
@@ -788,15 +832,21 @@ async def delete_turni(
 
 @router.get("/api/training/types")
 async def get_training_types(db: Session = Depends(get_db)):
-    return [t[0] for t in db.query(models.Allenamento.tipo).distinct().order_by(models.Allenamento.tipo)]
+    return training_types(db)
+
+
+_categories_cache = KeyedCache("all_categories", maxsize=4)
 
 
 @router.get("/api/all-categories")
 def list_all_categories(db: Session = Depends(get_db)):
-    return [
-        {"id": c.id, "name": c.nome}
-        for c in db.query(models.Categoria).order_by(models.Categoria.ordine)
-    ]
+    return _categories_cache.get_or_set(
+        versioned_key("all", "categorie"),
+        lambda: [
+            {"id": c.id, "name": c.nome}
+            for c in db.query(models.Categoria).order_by(models.Categoria.ordine)
+        ],
+    )
 
 
 @router.get("/api/allenamenti")
@@ -807,91 +857,56 @@ async def get_allenamenti_api(
     user_category: Optional[str] = None,
     coach_filter: List[int] = Query([]),
     unassigned: bool = Query(False),
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
 ):
-    query = db.query(models.Allenamento).options(
-        joinedload(models.Allenamento.categories),
-        joinedload(models.Allenamento.coaches),
-    )
+    def _filters(query, model):
+        if user_category or category_filter:
+            query = query.join(model.categories)
+        if category_filter:
+            query = query.filter(models.Categoria.nome.in_(category_filter))
+        if user_category:
+            query = query.filter(models.Categoria.nome == user_category)
+        if type_filter:
+            query = query.filter(model.tipo.in_(type_filter))
+        if coach_filter:
+            query = query.join(model.coaches).filter(models.User.id.in_(coach_filter))
+        elif unassigned:
+            query = query.outerjoin(model.coaches).filter(models.User.id == None)
+        return query
+
+    # FullCalendar invia la finestra visibile come ISO datetime (es. 2024-04-29T00:00:00+02:00)
+    window_start = date.fromisoformat(start[:10]) if start else None
+    window_end = date.fromisoformat(end[:10]) if end else None
+    events = [training_event(a) for a in trainings_in_window(db, window_start, window_end, _filters)]
+    return FastJSONResponse(events)
+
+
+@router.post("/api/allenamenti/occurrences/{ref}/materialize")
+async def materialize_training_occurrence(
+    ref: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Restituisce l'id persistente di un'occorrenza, creando l'override se serve."""
+    training = resolve_training(db, ref, materialize=True)
+    if not training:
+        raise HTTPException(status_code=404, detail="Allenamento non trovato")
+    db.commit()
+    return {"id": training.id}
+
 
-    if user_category or category_filter:
-        query = query.join(models.Allenamento.categories)
-    if category_filter:
-        query = query.filter(models.Categoria.nome.in_(category_filter))
-    if user_category:
-        query = query.filter(models.Categoria.nome == user_category)
-    if type_filter:
-        query = query.filter(models.Allenamento.tipo.in_(type_filter))
-    if coach_filter:
-        query = query.join(models.Allenamento.coaches).filter(models.User.id.in_(coach_filter))
-    elif unassigned:
-        query = query.outerjoin(models.Allenamento.coaches).filter(models.User.id == None)
-
-    events = []
-    for a in query.distinct().all():
-        start_dt, end_dt = parse_orario(a.data, a.orario)
-        if not end_dt or end_dt <= start_dt:
-            end_dt = start_dt + timedelta(hours=1)
-        cat_names = [c.nome for c in a.categories]
-        categories = ", ".join(cat_names) or "Nessuno"
-        coaches = ", ".join([f"{c.first_name} {c.last_name}" for c in a.coaches]) or "Nessuno"
-        events.append(
-            {
-                "id": a.id,
-                "title": f"{a.tipo} - {a.descrizione}" if a.descrizione else a.tipo,
-                "start": start_dt.isoformat(),
-                "end": end_dt.isoformat(),
-                "allDay": False,
-                "backgroundColor": get_color_for_type(a.tipo),
-                "borderColor": get_color_for_type(a.tipo),
-                "extendedProps": {
-                    "descrizione": a.descrizione,
-                    "orario": a.orario,
-                    "recurrence_id": a.recurrence_id,
-                    "categories": categories,
-                    "catlist": cat_names,
-                    "is_recurrent": "Sì" if a.recurrence_id else "No",
-                    "coaches": coaches,
-                },
-            }
-        )
-    return events
 @router.get("/api/turni")
-async def get_turni_api(db: Session = Depends(get_db), allenatore_id: int | None = None):
-    query = db.query(models.Turno).options(joinedload(models.Turno.user))
-    if allenatore_id:
-        query = query.filter(models.Turno.user_id == allenatore_id)
-    turni = query.all()
-    availabilities = (
-        db.query(models.TrainerAvailability)
-        .filter(
-            models.TrainerAvailability.turno_id.in_([t.id for t in turni]),
-            models.TrainerAvailability.available.is_(True),
-        )
-        .all()
-    )
-    avail_map: dict[int, list[int]] = {}
-    for av in availabilities:
-        avail_map.setdefault(av.turno_id, []).append(av.user_id)
-    events = []
-    for t in turni:
-        start_hour, end_hour = (8, 12) if t.fascia_oraria == "Mattina" else (17, 21)
-        start_dt = datetime.combine(t.data, time(hour=start_hour))
-        end_dt = datetime.combine(t.data, time(hour=end_hour))
-        events.append(
-            {
-                "id": t.id,
-                "title": f"{t.user.first_name} {t.user.last_name}" if t.user else "Turno Libero",
-                "start": start_dt.isoformat(),
-                "end": end_dt.isoformat(),
-                "backgroundColor": "#198754" if t.user else "#dc3545",
-                "borderColor": "#198754" if t.user else "#dc3545",
-                "extendedProps": {
-                    "user_id": t.user_id,
-                    "fascia_oraria": t.fascia_oraria,
-                    "available_ids": avail_map.get(t.id, []),
-                },
-            }
-        )
-    return events
+async def get_turni_api(
+    db: Session = Depends(get_db),
+    allenatore_id: int | None = None,
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+):
+    # FullCalendar invia la finestra visibile: senza, si restituiscono tutti i turni
+    window_start = date.fromisoformat(start[:10]) if start else None
+    window_end = date.fromisoformat(end[:10]) if end else None
+    events = turni_events(db, window_start, window_end, allenatore_id)
+    return FastJSONResponse(events)
 
 
@@ -4,16 +4,18 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy import and_
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
 
 import models
 from database import get_db
-from utils.dates import week_bounds, expand_occurrences
+from services.recurrence import create_series, trainings_in_window
+from services.seasons import ensure_open
+from utils import parse_orario
+from utils.dates import Occurrence, week_bounds, weekly_dates
+from utils.render import templates
 
 router = APIRouter(prefix="/trainings", tags=["trainings"])
-templates = Jinja2Templates(directory="templates")
 
 def _parse_week(week: Optional[str]) -> tuple[int, int]:
     if not week:
@@ -27,21 +29,34 @@ def _parse_week(week: Optional[str]) -> tuple[int, int]:
 def calendar_view(request: Request, week: Optional[str] = None, coach_id: Optional[int] = None, db: Session = Depends(get_db)):
     year, isoweek = _parse_week(week)
     start, end = week_bounds(year, isoweek)
-    query = (
-        db.query(models.Allenamento)
-        .options(selectinload(models.Allenamento.barca), selectinload(models.Allenamento.coach))
-        .filter(models.Allenamento.data.between(start, end))
-    )
-    if coach_id:
-        query = query.filter(models.Allenamento.coach_id == coach_id)
-    trainings = query.all()
-    occurrences = []
-    for t in trainings:
-        occs = expand_occurrences(t, (start, end))
-        for occ in occs:
-            occ["coach_id"] = t.coach_id
-            occ["coach_name"] = f"{t.coach.first_name} {t.coach.last_name}" if t.coach else None
-        occurrences.extend(occs)
+
+    def _filters(query, model):
+        if not coach_id:
+            return query
+        # righe correnti e storiche hanno coach_id, le serie solo l'associazione
+        if hasattr(model, "coach_id"):
+            return query.filter(model.coach_id == coach_id)
+        return query.filter(model.coaches.any(models.User.id == coach_id))
+
+    occurrences: list[Occurrence] = []
+    for t in trainings_in_window(db, start, end, _filters):
+        if t.time_start and t.time_end:
+            time_start, time_end = t.time_start, t.time_end
+        else:
+            start_dt, end_dt = parse_orario(t.data, t.orario)
+            time_start, time_end = start_dt.time(), end_dt.time()
+        coach = t.coach or (t.coaches[0] if t.coaches else None)
+        occurrences.append(
+            {
+                "date": t.data,
+                "time_start": time_start,
+                "time_end": time_end,
+                "is_override": t.series_id is not None and t.id is not None,
+                "source_id": t.occurrence_ref,
+                "coach_id": coach.id if coach else None,
+                "coach_name": f"{coach.first_name} {coach.last_name}" if coach else None,
+            }
+        )
     coaches = (
         db.query(models.User)
         .join(models.User.roles)
@@ -63,6 +78,42 @@ def calendar_view(request: Request, week: Optional[str] = None, coach_id: Option
         },
     )
 
+def _has_conflict(
+    db: Session, dates: list[date], ts: time, te: time, barca_id: Optional[int], coach_id: Optional[int]
+) -> bool:
+    """Vero se barca o allenatore sono già impegnati in una delle ``dates`` nella fascia ``[ts, te)``.
+
+    Passa da ``trainings_in_window``: considera righe, occorrenze delle serie
+    e allenamenti delle stagioni chiuse.
+    """
+    if not dates:
+        return False
+
+    def _filters(query, model):
+        clauses = []
+        if barca_id:
+            clauses.append(model.barca_id == barca_id)
+        if coach_id:
+            clause = model.coaches.any(models.User.id == coach_id)
+            if hasattr(model, "coach_id"):
+                clause = or_(model.coach_id == coach_id, clause)
+            clauses.append(clause)
+        return query.filter(or_(*clauses))
+
+    days = set(dates)
+    for t in trainings_in_window(db, dates[0], dates[-1], _filters):
+        if t.data not in days:
+            continue
+        if t.time_start and t.time_end:
+            start, end = t.time_start, t.time_end
+        else:
+            start_dt, end_dt = parse_orario(t.data, t.orario)
+            start, end = start_dt.time(), end_dt.time()
+        if ts < end and start < te:
+            return True
+    return False
+
+
 @router.post("", status_code=303)
 def create_training(
     tipo: str = Form(...),
@@ -80,28 +131,39 @@ def create_training(
     te = time.fromisoformat(time_end)
     if te <= ts:
         raise HTTPException(status_code=400, detail="Ora fine deve essere > ora inizio")
-    conflict_filters = [models.Allenamento.data == date_]
-    if barca_id:
-        conflict_filters.append(models.Allenamento.barca_id == barca_id)
-    if coach_id:
-        conflict_filters.append(models.Allenamento.coach_id == coach_id)
-    if len(conflict_filters) > 1:
-        existing = db.query(models.Allenamento).filter(and_(*conflict_filters)).all()
-        for e in existing:
-            if e.time_start and e.time_end:
-                if not (te <= e.time_start or ts >= e.time_end):
-                    raise HTTPException(status_code=409, detail="Conflitto di orario con barca/coach")
-    t = models.Allenamento(
-        tipo=tipo,
-        descrizione=descrizione,
-        data=date_,
-        time_start=ts,
-        time_end=te,
-        recurrence=recurrence,
-        repeat_until=repeat_until,
-        barca_id=barca_id,
-        coach_id=coach_id,
-    )
-    db.add(t)
+    if recurrence == "weekly" and (not repeat_until or repeat_until < date_):
+        raise HTTPException(status_code=400, detail="Data di fine ricorrenza non valida")
+    ensure_open(db, date_, repeat_until if recurrence == "weekly" else None)
+    if barca_id or coach_id:
+        until = repeat_until if recurrence == "weekly" else date_
+        if _has_conflict(db, weekly_dates(date_, until, [date_.weekday()]), ts, te, barca_id, coach_id):
+            raise HTTPException(status_code=409, detail="Conflitto di orario con barca/coach")
+    orario = f"{ts.strftime('%H:%M')}-{te.strftime('%H:%M')}"
+    if recurrence == "weekly":
+        coaches = [db.get(models.User, coach_id)] if coach_id else []
+        create_series(
+            db,
+            tipo=tipo,
+            descrizione=descrizione,
+            orario=orario,
+            weekdays=[date_.weekday()],
+            start_date=date_,
+            until=repeat_until,
+            coaches=[c for c in coaches if c],
+            barca_id=barca_id,
+        )
+    else:
+        db.add(
+            models.Allenamento(
+                tipo=tipo,
+                descrizione=descrizione,
+                data=date_,
+                orario=orario,
+                time_start=ts,
+                time_end=te,
+                barca_id=barca_id,
+                coach_id=coach_id,
+            )
+        )
     db.commit()
     return RedirectResponse(url="/trainings/calendar", status_code=303)
@@ -1,31 +1,34 @@
 from __future__ import annotations
 from datetime import date
-from io import StringIO
 from typing import List, Optional
-import csv
 
-from fastapi import APIRouter, Depends, Query, Request, Response
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import extract
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.orm import Session
 
 import models
 from database import get_db
 from dependencies import get_current_admin_or_coach_user
 from services.attendance_service import get_roster_for_training
+from services.recurrence import trainings_in_window
+from services import stats_cache
+from services.seasons import attendance_model
 from utils import parse_orario
+from utils.dates import month_window
+from utils.export import streaming_export
+from utils.render import templates
+from utils.responses import FastJSONResponse
 
 router = APIRouter(tags=["Trainings Stats"])
-templates = Jinja2Templates(directory="templates")
 
 
 def _collect_stats(db: Session, year: int, month: int | None, categorie: List[str] | None, tipi: List[str] | None):
-    query = db.query(models.Allenamento).filter(extract("year", models.Allenamento.data) == year)
-    if month:
-        query = query.filter(extract("month", models.Allenamento.data) == month)
-    if tipi:
-        query = query.filter(models.Allenamento.tipo.in_(tipi))
-    trainings = query.options(joinedload(models.Allenamento.categories)).all()
+    window_start, window_end = month_window(year, month)
+    trainings = trainings_in_window(
+        db,
+        window_start,
+        window_end,
+        (lambda q, model: q.filter(model.tipo.in_(tipi))) if tipi else None,
+    )
     data = {
         "kpi": {"trainings": 0, "total_hours": 0.0, "present": 0, "absent": 0},
         "monthly": {},
@@ -36,9 +39,10 @@ def _collect_stats(db: Session, year: int, month: int | None, categorie: List[st
             continue
         roster = get_roster_for_training(db, t)
         roster_ids = {a.id for a in roster}
+        attendance = attendance_model(t)
         absents = (
-            db.query(models.Attendance)
-            .filter(models.Attendance.training_id == t.id, models.Attendance.status == models.AttendanceStatus.absent, models.Attendance.athlete_id.in_(roster_ids))
+            db.query(attendance)
+            .filter(attendance.training_id == t.id, attendance.status == models.AttendanceStatus.absent, attendance.athlete_id.in_(roster_ids))
             .count()
         )
         presents = len(roster_ids) - absents
@@ -86,6 +90,15 @@ def _collect_stats(db: Session, year: int, month: int | None, categorie: List[st
     }
 
 
+def _cached_stats(db: Session, year: int, month: int | None, categorie: List[str] | None, tipi: List[str] | None):
+    return stats_cache.cached_result(
+        "trainings_stats",
+        {"year": year, "month": month, "categoria": categorie, "tipo": tipi},
+        month_window(year, month),
+        stats_cache.TRAININGS,
+        lambda: _collect_stats(db, year, month, categorie, tipi),
+    )
+
 
 @router.get("/api/trainings/stats")
 def trainings_stats_api(
@@ -96,7 +109,7 @@ def trainings_stats_api(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    return _collect_stats(db, year, month, categoria, tipo)
+    return FastJSONResponse(_cached_stats(db, year, month, categoria, tipo))
 
 
 @router.get("/api/trainings/stats.csv")
@@ -108,12 +121,11 @@ def trainings_stats_csv(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_admin_or_coach_user),
 ):
-    stats = _collect_stats(db, year, month, categoria, tipo)
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["month", "trainings", "hours", "present", "absent"])
-    for row in stats["monthly"]:
-        writer.writerow([row["month"], row["trainings"], row["hours"], row["present"], row["absent"]])
-    response = Response(content=output.getvalue(), media_type="text/csv; charset=utf-8")
-    response.headers["Content-Disposition"] = "attachment; filename=trainings_stats.csv"
-    return response
+    stats = _cached_stats(db, year, month, categoria, tipo)
+    rows = (
+        [row["month"], row["trainings"], row["hours"], row["present"], row["absent"]]
+        for row in stats["monthly"]
+    )
+    return streaming_export(
+        rows, "trainings_stats", header=["month", "trainings", "hours", "present", "absent"]
+    )
@@ -3,17 +3,18 @@ from typing import Optional
 from datetime import date, datetime, time, timezone
 from fastapi import APIRouter, Request, Depends, Form, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session, joinedload
-from fastapi.templating import Jinja2Templates
-from models import User, Allenamento, Categoria, Turno
+from sqlalchemy.orm import Session
+from models import User, Categoria, Turno
 import security
 from database import get_db
 from dependencies import get_current_user
 from utils import parse_orario, get_color_for_type
 from services.attendance_service import compute_status_for_athlete
+from services.deadlines import deadline_digest
+from services.recurrence import trainings_in_window
+from utils.render import templates
 
 router = APIRouter(tags=["Utenti e Pagine Principali"])
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/", response_class=RedirectResponse, include_in_schema=False)
 async def root(request: Request):
@@ -29,25 +30,17 @@ async def dashboard(
     events = []
 
     if current_user.is_atleta:
-        allenamenti = (
-            db.query(Allenamento)
-            .join(Allenamento.categories)
-            .options(
-                joinedload(Allenamento.categories),
-                joinedload(Allenamento.coaches),
-            )
-            .filter(
-                Categoria.nome == current_user.category,
-                Allenamento.data >= today,
-            )
-            .order_by(Allenamento.data, Allenamento.orario)
-            .all()
+        allenamenti = trainings_in_window(
+            db,
+            today,
+            None,
+            lambda q, model: q.join(model.categories).filter(Categoria.nome == current_user.category),
         )
         for a in allenamenti:
             start_dt, end_dt = parse_orario(a.data, a.orario)
             events.append(
                 {
-                    "id": a.id,
+                    "id": a.occurrence_ref,
                     "type": "allenamento",
                     "title": f"{a.tipo} - {a.descrizione}" if a.descrizione else a.tipo,
                     "date": a.data,
@@ -87,22 +80,17 @@ async def dashboard(
                 }
             )
 
-        allenamenti_coach = (
-            db.query(Allenamento)
-            .join(Allenamento.coaches)
-            .options(
-                joinedload(Allenamento.categories),
-                joinedload(Allenamento.coaches),
-            )
-            .filter(User.id == current_user.id, Allenamento.data >= today)
-            .order_by(Allenamento.data, Allenamento.orario)
-            .all()
+        allenamenti_coach = trainings_in_window(
+            db,
+            today,
+            None,
+            lambda q, model: q.join(model.coaches).filter(User.id == current_user.id),
         )
         for a in allenamenti_coach:
             start_dt, end_dt = parse_orario(a.data, a.orario)
             events.append(
                 {
-                    "id": a.id,
+                    "id": a.occurrence_ref,
                     "type": "allenamento",
                     "title": f"{a.tipo} - {a.descrizione}" if a.descrizione else a.tipo,
                     "date": a.data,
@@ -123,7 +111,11 @@ async def dashboard(
     return templates.TemplateResponse(
         request,
         "dashboard.html",
-        {"current_user": current_user, "events": events},
+        {
+            "current_user": current_user,
+            "events": events,
+            "scadenze": deadline_digest(db) if current_user.is_admin else None,
+        },
     )
 
 @router.get("/profilo", response_class=HTMLResponse)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import List, Optional, Literal
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ToggleAttendanceIn(BaseModel):
@@ -21,3 +22,16 @@ class AttendanceBulkItem(BaseModel):
 class AttendanceBulkIn(BaseModel):
     items: List[AttendanceBulkItem]
     reason: Optional[str] = None
+
+
+class AttendanceChangeIn(BaseModel):
+    key: str = Field(min_length=1, max_length=64)
+    training_id: str
+    athlete_id: int
+    status: Literal["present", "absent", "maybe"]
+    changed_at: datetime
+    reason: Optional[str] = None
+
+
+class AttendanceSyncIn(BaseModel):
+    changes: List[AttendanceChangeIn] = Field(max_length=500)
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class AvailabilityCellIn(BaseModel):
+    coach_id: int
+    turno_id: int
+    available: bool
+
+
+class AssignmentCellIn(BaseModel):
+    turno_id: int
+    coach_id: Optional[int] = None
+
+
+class MatrixChangesIn(BaseModel):
+    availability: List[AvailabilityCellIn] = Field(default_factory=list, max_length=5000)
+    assignments: List[AssignmentCellIn] = Field(default_factory=list, max_length=1000)
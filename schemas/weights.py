@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class MassimaleIn(BaseModel):
+    atleta_id: int
+    esercizio_id: int
+    massimale: Optional[float] = Field(default=None, ge=0)
+
+
+class ProgramIn(BaseModel):
+    formula: Literal["epley", "brzycki"] = "epley"
+    entries: List[MassimaleIn] = Field(max_length=5000)
@@ -2,12 +2,23 @@
 # Questo file contiene tutte le funzioni e le configurazioni
 # relative alla sicurezza, come la gestione delle password.
 
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 from passlib.context import CryptContext
 
 # 1. Configurazione del contesto per l'hashing delle password
 # Usiamo bcrypt come algoritmo di hashing, che è lo standard di sicurezza attuale.
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Pool limitato per le verifiche al login: bcrypt rilascia il GIL, quindi i
+# thread bastano e l'event loop resta libero. Il limite evita che un picco di
+# login occupi tutte le CPU del worker.
+VERIFY_WORKERS = int(os.environ.get("LOGIN_VERIFY_WORKERS", min(4, os.cpu_count() or 1)))
+_verify_pool: Optional[ThreadPoolExecutor] = None
+
 
 # 2. Funzioni di verifica e hashing
 
@@ -25,6 +36,29 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def _get_verify_pool() -> ThreadPoolExecutor:
+    global _verify_pool
+    if _verify_pool is None:
+        _verify_pool = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="bcrypt")
+    return _verify_pool
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Come ``verify_password`` ma eseguita nel pool dedicato, senza bloccare l'event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_verify_pool(), verify_password, plain_password, hashed_password
+    )
+
+
+def shutdown_verify_pool() -> None:
+    """Termina il pool delle verifiche (chiamato allo shutdown)."""
+    global _verify_pool
+    if _verify_pool is not None:
+        _verify_pool.shutdown(cancel_futures=True)
+        _verify_pool = None
+
+
 def get_password_hash(password: str) -> str:
     """
     Genera l'hash di una password.
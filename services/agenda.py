@@ -0,0 +1,184 @@
+"""Feed unificato dell'agenda: allenamenti, turni e attività in una finestra.
+
+Ogni sorgente esegue una sola query limitata alla finestra ``[start, end)``
+e produce eventi FullCalendar ordinati per inizio; ``merged_events`` li
+fonde con un merge a k vie (``heapq.merge``) senza riordinare l'insieme.
+
+Ogni sorgente ha un ETag derivato da finestra e versioni dei gruppi di dati
+da cui dipende (``services.cache_versions``): cambia solo quando cambiano i
+dati, quindi il client può rivalidare sorgente per sorgente.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+import models
+from services.cache_versions import versioned_key
+from services.recurrence import trainings_in_window
+from utils import get_color_for_type, parse_orario
+
+MAX_WINDOW_DAYS = 400
+
+
+def training_event(a) -> dict:
+    start_dt, end_dt = parse_orario(a.data, a.orario)
+    if not end_dt or end_dt <= start_dt:
+        end_dt = start_dt + timedelta(hours=1)
+    cat_names = [c.nome for c in a.categories]
+    color = get_color_for_type(a.tipo)
+    return {
+        "id": a.occurrence_ref,
+        "title": f"{a.tipo} - {a.descrizione}" if a.descrizione else a.tipo,
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "allDay": False,
+        "backgroundColor": color,
+        "borderColor": color,
+        "extendedProps": {
+            "descrizione": a.descrizione,
+            "orario": a.orario,
+            "recurrence_id": a.recurrence_id,
+            "categories": ", ".join(cat_names) or "Nessuno",
+            "catlist": cat_names,
+            "is_recurrent": "Sì" if a.recurrence_id else "No",
+            "coaches": ", ".join(f"{c.first_name} {c.last_name}" for c in a.coaches) or "Nessuno",
+        },
+    }
+
+
+def turno_event(t: models.Turno, available_ids: List[int]) -> dict:
+    start_hour, end_hour = (8, 12) if t.fascia_oraria == "Mattina" else (17, 21)
+    color = "#198754" if t.user else "#dc3545"
+    return {
+        "id": t.id,
+        "title": f"{t.user.first_name} {t.user.last_name}" if t.user else "Turno Libero",
+        "start": datetime.combine(t.data, time(hour=start_hour)).isoformat(),
+        "end": datetime.combine(t.data, time(hour=end_hour)).isoformat(),
+        "backgroundColor": color,
+        "borderColor": color,
+        "extendedProps": {
+            "user_id": t.user_id,
+            "fascia_oraria": t.fascia_oraria,
+            "available_ids": available_ids,
+        },
+    }
+
+
+def turni_events(db: Session, start: date | None, end: date | None, allenatore_id: int | None = None) -> List[dict]:
+    """Eventi turno (con gli allenatori disponibili) in ``[start, end)``."""
+    query = db.query(models.Turno).options(joinedload(models.Turno.user))
+    if start:
+        query = query.filter(models.Turno.data >= start)
+    if end:
+        query = query.filter(models.Turno.data < end)
+    if allenatore_id:
+        query = query.filter(models.Turno.user_id == allenatore_id)
+    turni = query.all()
+    avail_map: Dict[int, List[int]] = {}
+    if turni:
+        rows = db.query(
+            models.TrainerAvailability.turno_id, models.TrainerAvailability.user_id
+        ).filter(
+            models.TrainerAvailability.turno_id.in_([t.id for t in turni]),
+            models.TrainerAvailability.available.is_(True),
+        )
+        for turno_id, user_id in rows:
+            avail_map.setdefault(turno_id, []).append(user_id)
+    return [turno_event(t, avail_map.get(t.id, [])) for t in turni]
+
+
+def activity_event(activity) -> dict:
+    color = activity.activity_type.color if activity.activity_type else "#007bff"
+    return {
+        "id": f"attivita-{activity.id}",
+        "title": activity.title,
+        "start": datetime.combine(activity.date, activity.start_time).isoformat(),
+        "end": datetime.combine(activity.date, activity.end_time).isoformat(),
+        "backgroundColor": color,
+        "borderColor": color,
+        "extendedProps": {
+            "activity_id": activity.id,
+            "state": activity.state.value,
+            "type": activity.activity_type.name if activity.activity_type else None,
+            "payment_state": activity.payment_state.value,
+        },
+    }
+
+
+def _trainings(db: Session, start: date, end: date) -> List[dict]:
+    return [training_event(a) for a in trainings_in_window(db, start, end - timedelta(days=1))]
+
+
+def _turni(db: Session, start: date, end: date) -> List[dict]:
+    events = turni_events(db, start, end)
+    for event in events:
+        # gli id numerici dei turni non devono collidere con quelli degli allenamenti
+        event["id"] = f"turno-{event['id']}"
+    return events
+
+
+def _activities(db: Session, start: date, end: date) -> List[dict]:
+    activities = (
+        db.query(models.Activity)
+        .options(selectinload(models.Activity.activity_type))
+        .filter(models.Activity.date >= start, models.Activity.date < end)
+        .all()
+    )
+    return [activity_event(a) for a in activities]
+
+
+class Source(NamedTuple):
+    load: Callable[[Session, date, date], List[dict]]
+    entities: Sequence[str]
+    # ruoli ammessi; ``None`` per tutti gli utenti autenticati
+    roles: Optional[frozenset]
+
+
+SOURCES: Dict[str, Source] = {
+    "allenamenti": Source(_trainings, ("allenamenti", "categorie", "utenti"), None),
+    "turni": Source(_turni, ("turni", "utenti"), frozenset({"admin", "allenatore"})),
+    "attivita": Source(_activities, ("attivita",), frozenset({"admin", "allenatore", "istruttore"})),
+}
+
+
+def allowed(name: str, user: models.User) -> bool:
+    roles = SOURCES[name].roles
+    return roles is None or any(role.name in roles for role in user.roles)
+
+
+def source_etag(name: str, start: date, end: date) -> str:
+    key = versioned_key((name, start.isoformat(), end.isoformat()), *SOURCES[name].entities)
+    return '"%s-%s"' % (name, hashlib.sha1(repr(key).encode()).hexdigest()[:16])
+
+
+def combined_etag(etags: Iterable[str]) -> str:
+    return 'W/"%s"' % hashlib.sha1(",".join(etags).encode()).hexdigest()[:16]
+
+
+def parse_if_none_match(header: str | None) -> set:
+    if not header:
+        return set()
+    tags = {tag.strip() for tag in header.split(",")}
+    return {tag[2:] if tag.startswith("W/") else tag for tag in tags if tag}
+
+
+def _start_key(event: dict) -> str:
+    # ora locale senza offset: gli allenamenti riportano "+00:00", turni e attività no
+    return event["start"][:19]
+
+
+def merged_events(db: Session, start: date, end: date, sources: Iterable[str]) -> Iterator[dict]:
+    """Eventi delle ``sources`` in ``[start, end)``, fusi in ordine di inizio."""
+    streams = []
+    for name in sources:
+        events = SOURCES[name].load(db, start, end)
+        for event in events:
+            event["source"] = name
+        events.sort(key=_start_key)
+        streams.append(events)
+    return heapq.merge(*streams, key=_start_key)
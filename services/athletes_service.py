@@ -1,11 +1,15 @@
 from __future__ import annotations
+from collections import defaultdict
 from datetime import date, datetime, timezone
-from typing import List, Optional, Tuple, Dict
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import extract
+from typing import Iterable, List, Optional, Tuple, Dict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 
 import models
 from services.attendance_service import get_roster_for_training, compute_status_for_athlete
+from services.recurrence import trainings_in_window
+from services.seasons import attendance_model
+from utils.dates import month_window
 
 
 def current_category_for_user(db: Session, user: models.User, ref: date) -> Optional[models.Categoria]:
@@ -24,14 +28,13 @@ def current_category_for_user(db: Session, user: models.User, ref: date) -> Opti
 def get_athlete_attendance_stats(
     db: Session, athlete_id: int, year: int, month: int | None = None, tipi: List[str] | None = None
 ) -> dict:
-    trainings_query = db.query(models.Allenamento).filter(
-        extract("year", models.Allenamento.data) == year
+    window_start, window_end = month_window(year, month)
+    trainings = trainings_in_window(
+        db,
+        window_start,
+        window_end,
+        (lambda q, model: q.filter(model.tipo.in_(tipi))) if tipi else None,
     )
-    if month:
-        trainings_query = trainings_query.filter(extract("month", models.Allenamento.data) == month)
-    if tipi:
-        trainings_query = trainings_query.filter(models.Allenamento.tipo.in_(tipi))
-    trainings = trainings_query.options(joinedload(models.Allenamento.categories)).all()
 
     athlete = db.get(models.User, athlete_id)
     if not athlete:
@@ -46,9 +49,10 @@ def get_athlete_attendance_stats(
         roster = get_roster_for_training(db, training)
         if athlete not in roster:
             continue
-        status = compute_status_for_athlete(db, training.id, athlete_id)
+        model = attendance_model(training)
+        status = compute_status_for_athlete(db, training.id, athlete_id, model)
         attendance = (
-            db.query(models.Attendance)
+            db.query(model)
             .filter_by(training_id=training.id, athlete_id=athlete_id)
             .first()
         )
@@ -179,47 +183,56 @@ def get_equipaggio_by_id(db: Session, equipaggio_id: int) -> Optional[models.Equ
     return db.query(models.Equipaggio).filter(models.Equipaggio.id == equipaggio_id).first()
 
 
+def get_atleti_disponibili_per_posti(
+    db: Session, barca_id: int, posti: Iterable[str], equipaggio_id: Optional[int] = None
+) -> Dict[str, List[models.User]]:
+    """Atleti disponibili per ogni posto di una barca, con una sola query.
+
+    Sono disponibili gli atleti attivi assegnati alla barca che non occupano
+    già quel posto in un altro equipaggio della stessa barca (escluso
+    ``equipaggio_id`` quando si modifica un equipaggio esistente).
+    """
+    posti = list(posti)
+    occupati = (
+        select(models.CrewSeat.user_id, models.CrewSeat.posto)
+        .join(models.Equipaggio, models.Equipaggio.id == models.CrewSeat.equipaggio_id)
+        .where(models.Equipaggio.barca_id == barca_id, models.CrewSeat.posto.in_(posti))
+    )
+    if equipaggio_id:
+        occupati = occupati.where(models.Equipaggio.id != equipaggio_id)
+    occupati = occupati.subquery()
+    rows = (
+        db.query(models.User, occupati.c.posto)
+        .join(models.User.barche_assegnate)
+        .outerjoin(occupati, occupati.c.user_id == models.User.id)
+        .filter(models.Barca.id == barca_id, models.User.is_suspended == False)
+        .order_by(models.User.last_name, models.User.first_name)
+        .all()
+    )
+    atleti: Dict[int, models.User] = {}
+    presi: Dict[int, set] = defaultdict(set)
+    for atleta, posto in rows:
+        atleti[atleta.id] = atleta
+        if posto:
+            presi[atleta.id].add(posto)
+    return {
+        posto: [a for a in atleti.values() if posto not in presi[a.id]]
+        for posto in posti
+    }
+
+
 def get_atleti_disponibili_for_posto(db: Session, barca_id: int, posto: str, equipaggio_id: int = None) -> List[models.User]:
     """Restituisce gli atleti disponibili per un determinato posto in una barca
     SOLO tra gli atleti assegnati a quella barca specifica"""
-    # Query base per atleti non sospesi (attivi) E assegnati alla barca specifica
-    query = db.query(models.User).filter(
-        models.User.is_suspended == False
-    ).join(
-        models.User.barche_assegnate
-    ).filter(
-        models.Barca.id == barca_id
+    return get_atleti_disponibili_per_posti(db, barca_id, [posto], equipaggio_id)[posto]
+
+
+def get_equipaggi_by_atleta(db: Session, user_id: int) -> List[models.Equipaggio]:
+    """Equipaggi in cui siede l'atleta, in qualunque posto (indice ``user_id, posto``)."""
+    return (
+        db.query(models.Equipaggio)
+        .join(models.CrewSeat, models.CrewSeat.equipaggio_id == models.Equipaggio.id)
+        .filter(models.CrewSeat.user_id == user_id)
+        .order_by(models.Equipaggio.nome)
+        .all()
     )
-    
-    # Escludi atleti già assegnati a questo posto in altri equipaggi della stessa barca
-    if equipaggio_id:
-        # Se stiamo modificando un equipaggio, escludi solo gli altri equipaggi
-        subquery = db.query(models.Equipaggio).filter(
-            models.Equipaggio.barca_id == barca_id,
-            models.Equipaggio.id != equipaggio_id
-        )
-    else:
-        # Se stiamo creando un nuovo equipaggio, escludi tutti gli equipaggi esistenti
-        subquery = db.query(models.Equipaggio).filter(models.Equipaggio.barca_id == barca_id)
-    
-    # Aggiungi filtri per escludere atleti già assegnati a questo posto specifico
-    if posto == 'capovoga':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.capovoga_id).filter(models.Equipaggio.capovoga_id.isnot(None))))
-    elif posto == 'secondo':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.secondo_id).filter(models.Equipaggio.secondo_id.isnot(None))))
-    elif posto == 'terzo':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.terzo_id).filter(models.Equipaggio.terzo_id.isnot(None))))
-    elif posto == 'quarto':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.quarto_id).filter(models.Equipaggio.quarto_id.isnot(None))))
-    elif posto == 'quinto':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.quinto_id).filter(models.Equipaggio.quinto_id.isnot(None))))
-    elif posto == 'sesto':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.sesto_id).filter(models.Equipaggio.sesto_id.isnot(None))))
-    elif posto == 'settimo':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.settimo_id).filter(models.Equipaggio.settimo_id.isnot(None))))
-    elif posto == 'prodiere':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.prodiere_id).filter(models.Equipaggio.prodiere_id.isnot(None))))
-    elif posto == 'timoniere':
-        query = query.filter(~models.User.id.in_(subquery.with_entities(models.Equipaggio.timoniere_id).filter(models.Equipaggio.timoniere_id.isnot(None))))
-    
-    return query.all()
@@ -1,9 +1,14 @@
 """Helper functions for attendance management."""
-from datetime import date
-from typing import List
+from datetime import date, datetime, timezone
+from typing import Dict, List
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 import models
+from schemas.attendance import AttendanceChangeIn
+from services.recurrence import resolve_training
+from services.seasons import SeasonClosedError, ensure_open
 
 
 def get_roster_for_training(db: Session, training: models.Allenamento) -> List[models.User]:
@@ -38,17 +43,154 @@ def get_roster_for_training(db: Session, training: models.Allenamento) -> List[m
     return roster
 
 
-def compute_status_for_athlete(db: Session, training_id: int, athlete_id: int) -> models.AttendanceStatus:
+def compute_status_for_athlete(
+    db: Session, training_id: int, athlete_id: int, model: type = models.Attendance
+) -> models.AttendanceStatus:
     """Return the attendance status for the athlete in the training.
 
     If no record exists in ``Attendance`` the athlete is considered maybe
-    (i.e. not yet confirmed) by default.
+    (i.e. not yet confirmed) by default. Trainings of closed seasons pass
+    ``model=models.StoricoAttendance`` (see ``services.seasons``).
     """
     attendance = (
-        db.query(models.Attendance)
+        db.query(model)
         .filter_by(training_id=training_id, athlete_id=athlete_id)
         .first()
     )
     if attendance:
         return attendance.status
     return models.AttendanceStatus.maybe
+
+
+def _utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _seen_keys(db: Session, keys) -> set:
+    return {
+        key
+        for (key,) in db.query(models.AttendanceChangeLog.client_key).filter(
+            models.AttendanceChangeLog.client_key.in_(keys)
+        )
+    }
+
+
+def apply_attendance_changes(
+    db: Session, changes: List[AttendanceChangeIn], user_id: int
+) -> List[dict]:
+    """Apply a batch of queued attendance changes (possibly across trainings).
+
+    Each change carries a client-generated idempotency key, stored on the
+    ``AttendanceChangeLog`` entry: a key already seen is reported as
+    ``duplicate``. Conflicts are resolved last-writer-wins on
+    ``last_changed_at`` using the client timestamp (capped to now); an older
+    change is reported as ``stale`` and one on a training of a closed season
+    as ``error``. Logs are written with a single bulk
+    insert and the caller commits once. Results follow the input order.
+
+    The batch runs in a savepoint: if a concurrent replay commits the same
+    keys (or creates the same attendance) first, the unique constraints
+    raise ``IntegrityError`` and the batch is applied again, now reporting
+    those keys as ``duplicate``.
+    """
+    try:
+        with db.begin_nested():
+            return _apply_changes(db, changes, user_id)
+    except IntegrityError:
+        with db.begin_nested():
+            return _apply_changes(db, changes, user_id)
+
+
+def _apply_changes(db: Session, changes: List[AttendanceChangeIn], user_id: int) -> List[dict]:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    seen = _seen_keys(db, {c.key for c in changes})
+    trainings: Dict[str, int] = {}
+    closed: Dict[str, str] = {}
+    for ref in {c.training_id for c in changes}:
+        try:
+            training = resolve_training(db, ref, materialize=True)
+            if training:
+                ensure_open(db, training.data)
+        except SeasonClosedError as exc:
+            closed[ref] = str(exc)
+            continue
+        if training:
+            trainings[ref] = training.id
+    athlete_ids = {
+        athlete_id
+        for (athlete_id,) in db.query(models.User.id).filter(
+            models.User.id.in_({c.athlete_id for c in changes})
+        )
+    }
+    existing = {
+        (a.training_id, a.athlete_id): a
+        for a in db.query(models.Attendance).filter(
+            models.Attendance.training_id.in_(set(trainings.values())),
+            models.Attendance.athlete_id.in_(athlete_ids),
+        )
+    }
+
+    results: Dict[str, dict] = {}
+    logs = []
+    for change in sorted(changes, key=lambda c: _utc_naive(c.changed_at)):
+        training_id = trainings.get(change.training_id)
+        if change.key in seen:
+            results.setdefault(change.key, {"key": change.key, "result": "duplicate"})
+            continue
+        seen.add(change.key)
+        if change.training_id in closed:
+            results[change.key] = {"key": change.key, "result": "error", "detail": closed[change.training_id]}
+            continue
+        if training_id is None or change.athlete_id not in athlete_ids:
+            results[change.key] = {"key": change.key, "result": "error", "detail": "Training or athlete not found"}
+            continue
+        changed_at = min(_utc_naive(change.changed_at), now)
+        attendance = existing.get((training_id, change.athlete_id))
+        if attendance and attendance.last_changed_at and _utc_naive(attendance.last_changed_at) > changed_at:
+            results[change.key] = {
+                "key": change.key,
+                "result": "stale",
+                "training_id": training_id,
+                "status": attendance.status.value,
+            }
+            continue
+        desired_status = models.AttendanceStatus(change.status)
+        if attendance:
+            old_status = attendance.status
+        else:
+            old_status = models.AttendanceStatus.maybe
+            attendance = models.Attendance(training_id=training_id, athlete_id=change.athlete_id)
+            db.add(attendance)
+            existing[(training_id, change.athlete_id)] = attendance
+        attendance.status = desired_status
+        attendance.source = models.AttendanceSource.coach
+        attendance.last_changed_at = changed_at
+        logs.append(
+            (
+                attendance,
+                {
+                    "changed_by_user_id": user_id,
+                    "old_status": old_status,
+                    "new_status": desired_status,
+                    "source": models.AttendanceSource.coach,
+                    "created_at": now,
+                    "reason": change.reason,
+                    "client_key": change.key,
+                },
+            )
+        )
+        results[change.key] = {
+            "key": change.key,
+            "result": "applied",
+            "training_id": training_id,
+            "status": desired_status.value,
+        }
+    db.flush()
+    if logs:
+        db.execute(
+            insert(models.AttendanceChangeLog),
+            [{"attendance_id": attendance.id, **values} for attendance, values in logs],
+        )
+    return [results[key] for key in dict.fromkeys(c.key for c in changes)]
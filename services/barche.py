@@ -1,7 +1,35 @@
 from __future__ import annotations
 from typing import List, Tuple, Optional
+from sqlalchemy import case
 from sqlalchemy.orm import Session, selectinload
 import models
+from services.cache_versions import versioned_key
+from utils.cache import KeyedCache
+
+# stessa precedenza di Barca.status: una barca fuori uso e in manutenzione è "Fuori uso"
+STATUS_CODES = ("fuori_uso", "in_manutenzione", "in_prestito", "in_trasferta", "in_uso")
+status_rank = case(
+    (models.Barca.fuori_uso.is_(True), 0),
+    (models.Barca.in_manutenzione.is_(True), 1),
+    (models.Barca.in_prestito.is_(True), 2),
+    (models.Barca.in_trasferta.is_(True), 3),
+    else_=4,
+)
+
+_tipi_cache = KeyedCache("tipi_barca", maxsize=4)
+
+
+def get_tipi_barca(db: Session) -> List[str]:
+    """Distinct boat types, cached until a boat is written.
+
+    Writes on ``barche`` bump the ``allenamenti`` cache version (crews decide
+    the rosters of boat trainings), so that is the version the key follows.
+    """
+    return _tipi_cache.get_or_set(
+        versioned_key("tipi", "allenamenti"),
+        lambda: [t for (t,) in db.query(models.Barca.tipo).distinct().order_by(models.Barca.tipo)],
+    )
+
 
 def list_barche(
     db: Session,
@@ -11,39 +39,29 @@ def list_barche(
     sort_by: str = "nome",
     sort_dir: str = "asc",
 ) -> Tuple[List[models.Barca], List[str]]:
-    """Return boats filtered by type, status and search string with eager loading."""
-    query = db.query(models.Barca).options(selectinload(models.Barca.atleti_assegnati))
+    """Return boats filtered by type, status and search string with eager loading.
+
+    Crews and assigned athletes are loaded with ``selectinload``; status
+    filtering and ordering use the ``status_rank`` ``CASE`` expression, so the
+    whole listing costs three queries (plus the cached type list).
+    """
+    query = db.query(models.Barca).options(
+        selectinload(models.Barca.atleti_assegnati),
+        selectinload(models.Barca.equipaggi),
+    )
     if tipo_filter:
         query = query.filter(models.Barca.tipo == tipo_filter)
-    if status_filter:
-        if status_filter == "in_uso":
-            query = query.filter(
-                models.Barca.in_manutenzione.is_(False),
-                models.Barca.fuori_uso.is_(False),
-                models.Barca.in_prestito.is_(False),
-                models.Barca.in_trasferta.is_(False),
-            )
-        elif status_filter == "in_manutenzione":
-            query = query.filter(models.Barca.in_manutenzione.is_(True))
-        elif status_filter == "fuori_uso":
-            query = query.filter(models.Barca.fuori_uso.is_(True))
-        elif status_filter == "in_prestito":
-            query = query.filter(models.Barca.in_prestito.is_(True))
-        elif status_filter == "in_trasferta":
-            query = query.filter(models.Barca.in_trasferta.is_(True))
+    if status_filter in STATUS_CODES:
+        query = query.filter(status_rank == STATUS_CODES.index(status_filter))
     if search:
         query = query.filter(models.Barca.nome.ilike(f"%{search}%"))
-    if sort_by != "status":
+    if sort_by == "status":
+        query = query.order_by(
+            status_rank.desc() if sort_dir == "desc" else status_rank.asc(), models.Barca.nome
+        )
+    else:
         sort_column = getattr(models.Barca, sort_by, models.Barca.nome)
         query = query.order_by(
             sort_column.desc() if sort_dir == "desc" else sort_column.asc()
         )
-        barche = query.all()
-    else:
-        barche = query.all()
-        barche.sort(key=lambda b: b.status[0], reverse=(sort_dir == "desc"))
-    tipi_barca_result = (
-        db.query(models.Barca.tipo).distinct().order_by(models.Barca.tipo).all()
-    )
-    tipi_barca = [t[0] for t in tipi_barca_result]
-    return barche, tipi_barca
+    return query.all(), get_tipi_barca(db)
@@ -0,0 +1,239 @@
+"""Invalidazione delle cache in memoria fra worker diversi.
+
+Ogni gruppo di dati (``categorie``, ``allenamenti``, ``turni``, ``presenze``,
+``attivita``, ``utenti``, ``pesi``, ``misurazioni``, ``mezzi``) ha una riga in
+``cache_versions`` il cui numero di versione viene incrementato dopo ogni
+commit che ha scritto sulle tabelle del gruppo: le modifiche ORM sono
+intercettate al flush, gli ``insert``/``update``/``delete`` in blocco
+eseguiti con ``Session.execute`` prima dell'esecuzione, e i gruppi toccati
+vengono incrementati dopo il commit in una transazione breve e separata.
+Così le transazioni di scrittura non tengono il lock sulla riga condivisa
+del gruppo (su PostgreSQL serializzerebbe tutti gli scrittori); una
+transazione annullata non incrementa nulla. Fra il commit dei dati e
+l'incremento un lettore può salvare dati nuovi sotto la versione vecchia,
+che l'incremento rende comunque obsoleta.
+
+I worker leggono le versioni con una sola ``SELECT`` al massimo ogni
+``CACHE_VERSION_POLL`` secondi (default 2) e le cache usano
+``versioned_key`` come chiave: una voce calcolata con una versione vecchia
+non viene più letta, quindi un dato resta stale al massimo per l'intervallo
+di polling. Il worker che scrive vede subito le proprie modifiche.
+
+Su PostgreSQL l'incremento invia anche un ``NOTIFY cache_versions``; con
+``start_listener`` un thread in ``LISTEN`` forza la rilettura appena un
+altro worker fa commit, senza attendere il polling.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import select
+import threading
+import time
+from typing import Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import Delete, Insert, Update, event, select as sa_select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+import models
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get("CACHE_VERSION_POLL", "2"))
+NOTIFY_CHANNEL = "cache_versions"
+
+# tabella -> gruppo di dati il cui numero di versione va incrementato
+ENTITY_TABLES: Dict[str, str] = {
+    "categorie": "categorie",
+    "allenamenti": "allenamenti",
+    "allenamento_categoria_association": "allenamenti",
+    "allenamento_coach_association": "allenamenti",
+    "training_series": "allenamenti",
+    "training_series_exceptions": "allenamenti",
+    "training_series_categoria": "allenamenti",
+    "training_series_coach": "allenamenti",
+    "closed_seasons": "allenamenti",
+    # gli equipaggi determinano il roster degli allenamenti in barca
+    "barche": "allenamenti",
+    "barca_atleti_association": "allenamenti",
+    "turni": "turni",
+    "trainer_availabilities": "turni",
+    "attendances": "presenze",
+    "attendance_change_logs": "presenze",
+    "activities": "attivita",
+    "activity_types": "attivita",
+    "activity_requirements": "attivita",
+    "activity_assignments": "attivita",
+    # nomi, età e ruoli compaiono nei roster e nei feed
+    "users": "utenti",
+    "user_roles": "utenti",
+    "user_qualifications": "utenti",
+    "qualification_types": "utenti",
+    "schede_pesi": "pesi",
+    "esercizi_pesi": "pesi",
+    "massimali_storico": "pesi",
+    "athlete_measurements": "misurazioni",
+    "furgoni": "mezzi",
+    "gommoni": "mezzi",
+    "gommone_ore": "mezzi",
+}
+ENTITIES = tuple(sorted(set(ENTITY_TABLES.values())))
+
+_PENDING = "cache_versions_bumped"
+
+
+def _table_entity(table) -> Optional[str]:
+    return ENTITY_TABLES.get(getattr(table, "name", None))
+
+
+def bump(conn: Connection, entities: Iterable[str]) -> None:
+    """Incrementa le versioni di ``entities`` nella transazione di ``conn``.
+
+    Da eseguire in una transazione breve: ogni riga resta bloccata fino al commit.
+    """
+    table = models.CacheVersion.__table__
+    for entity in sorted(set(entities)):
+        result = conn.execute(
+            update(table).where(table.c.entity == entity).values(version=table.c.version + 1)
+        )
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(entity=entity, version=1))
+        if conn.dialect.name == "postgresql":
+            conn.execute(
+                text("SELECT pg_notify(:channel, :entity)"),
+                {"channel": NOTIFY_CHANNEL, "entity": entity},
+            )
+
+
+def record(session: Session, entities: Set[str]) -> None:
+    """Segna ``entities`` da incrementare dopo il commit di ``session``."""
+    # nessuna scrittura qui: i gruppi toccati si incrementano dopo il commit
+    session.info.setdefault(_PENDING, set()).update(entities)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context) -> None:
+    changed = [*session.new, *session.deleted]
+    changed += [obj for obj in session.dirty if session.is_modified(obj)]
+    entities = {
+        entity for obj in changed if (entity := _table_entity(getattr(obj, "__table__", None)))
+    }
+    if entities:
+        record(session, entities)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_bulk_statement(state) -> None:
+    statement = state.statement
+    if isinstance(statement, (Insert, Update, Delete)):
+        entity = _table_entity(statement.table)
+        if entity:
+            record(state.session, {entity})
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    entities = session.info.pop(_PENDING, None)
+    if not entities:
+        return
+    try:
+        with session.get_bind().begin() as conn:
+            bump(conn, entities)
+    except Exception as e:
+        # i dati sono già salvati: le cache restano vecchie fino alla prossima scrittura del gruppo
+        logger.warning(f"Incremento di cache_versions fallito per {sorted(entities)}: {e}")
+    versions.mark_stale()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+
+class CacheVersions:
+    """Istantanea per processo di ``cache_versions``, riletta periodicamente."""
+
+    def __init__(self, bind: Engine, poll_interval: float = POLL_INTERVAL):
+        self.bind = bind
+        self.poll_interval = poll_interval
+        self._versions: Dict[str, int] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def mark_stale(self) -> None:
+        self._loaded_at = float("-inf")
+
+    def refresh(self) -> Dict[str, int]:
+        table = models.CacheVersion.__table__
+        with self.bind.connect() as conn:
+            rows = conn.execute(sa_select(table.c.entity, table.c.version)).all()
+        with self._lock:
+            self._versions = {entity: version for entity, version in rows}
+            self._loaded_at = time.monotonic()
+            return self._versions
+
+    def snapshot(self) -> Dict[str, int]:
+        if time.monotonic() - self._loaded_at >= self.poll_interval:
+            return self.refresh()
+        return self._versions
+
+    def get(self, entity: str) -> int:
+        return self.snapshot().get(entity, 0)
+
+    def start_listener(self) -> bool:
+        """Avvia il thread ``LISTEN`` su PostgreSQL; ``False`` con altri database."""
+        if self.bind.dialect.name != "postgresql" or self._listener is not None:
+            return False
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="cache-versions", daemon=True)
+        self._listener.start()
+        return True
+
+    def stop_listener(self) -> None:
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+            self._listener = None
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                raw = self.bind.raw_connection()
+                try:
+                    dbapi_conn = raw.driver_connection
+                    dbapi_conn.autocommit = True
+                    dbapi_conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    # notifiche perse durante la riconnessione
+                    self.mark_stale()
+                    while not self._stop.is_set():
+                        if select.select([dbapi_conn], [], [], 1.0)[0]:
+                            dbapi_conn.poll()
+                            if dbapi_conn.notifies:
+                                dbapi_conn.notifies.clear()
+                                self.mark_stale()
+                finally:
+                    raw.invalidate()
+            except Exception as e:  # pragma: no cover - depends on a live Postgres
+                logger.warning(f"LISTEN su {NOTIFY_CHANNEL} interrotto: {e}")
+                self._stop.wait(self.poll_interval)
+
+
+versions = CacheVersions(engine)
+
+
+def versioned_key(key: Hashable, *entities: str) -> Tuple:
+    """Chiave di cache che include le versioni correnti di ``entities``."""
+    snapshot = versions.snapshot()
+    return (key, *(snapshot.get(entity, 0) for entity in entities))
+
+
+def ensure_rows(db: Session) -> None:
+    """Crea le righe mancanti di ``cache_versions`` (una per gruppo)."""
+    existing = {entity for (entity,) in db.query(models.CacheVersion.entity)}
+    db.add_all(models.CacheVersion(entity=e, version=0) for e in ENTITIES if e not in existing)
+    db.commit()
@@ -0,0 +1,147 @@
+"""Scadenze di mezzi, certificati medici e qualifiche in un'unica vista.
+
+Ogni data di scadenza (le colonne ``Furgone.SCADENZE`` e ``Gommone.SCADENZE``,
+``User.certificate_expiration``, ``UserQualification.expiry_date``) ha un
+proprio indice; ``deadlines_between`` costruisce una ``UNION ALL`` con il
+filtro sull'intervallo dentro ogni ramo, così ciascuno è una scansione di
+intervallo sul suo indice e non si caricano tutti i mezzi o gli utenti.
+
+Il riepilogo per la dashboard degli admin (scadute di recente, entro 30 e
+entro 90 giorni) viene calcolato una volta al giorno per worker e ricalcolato
+solo quando cambia un mezzo, un utente o una qualifica (versioni ``mezzi``
+e ``utenti`` di ``services.cache_versions``).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+import models
+from services.cache_versions import versioned_key
+from utils.cache import KeyedCache
+
+CACHE_ENTITIES = ("mezzi", "utenti")
+# (chiave, etichetta, giorni dall'inizio, giorni dalla fine) rispetto a oggi
+DIGEST_WINDOWS = (
+    ("scadute", "Scadute negli ultimi 30 giorni", -30, -1),
+    ("entro_30", "In scadenza entro 30 giorni", 0, 30),
+    ("entro_90", "In scadenza fra 31 e 90 giorni", 31, 90),
+)
+
+_digest_cache = KeyedCache("deadlines_digest", maxsize=4)
+
+
+@dataclass(frozen=True)
+class Scadenza:
+    tipo: str  # furgone, gommone, certificato, qualifica
+    ref_id: int
+    nome: str
+    voce: str
+    data: date
+
+    @property
+    def url(self) -> str:
+        return {
+            "furgone": f"/mezzi/furgone/{self.ref_id}",
+            "gommone": f"/mezzi/gommone/{self.ref_id}",
+        }.get(self.tipo, f"/admin/users/{self.ref_id}")
+
+    def to_dict(self) -> dict:
+        return {
+            "tipo": self.tipo,
+            "ref_id": self.ref_id,
+            "nome": self.nome,
+            "voce": self.voce,
+            "data": self.data.isoformat(),
+            "url": self.url,
+        }
+
+
+def _branches(start: date, end: date) -> list:
+    furgone = models.Furgone
+    gommone = models.Gommone
+    user = models.User
+    nome_furgone = furgone.marca + " " + furgone.modello + " (" + furgone.targa + ")"
+    nome_utente = func.coalesce(user.first_name, "") + " " + func.coalesce(user.last_name, "")
+    branches = []
+    for voce, campo in furgone.SCADENZE:
+        column = getattr(furgone, campo)
+        branches.append(
+            select(
+                literal("furgone").label("tipo"),
+                furgone.id.label("ref_id"),
+                nome_furgone.label("nome"),
+                literal(voce).label("voce"),
+                column.label("data"),
+            ).where(column.between(start, end))
+        )
+    for voce, campo in gommone.SCADENZE:
+        column = getattr(gommone, campo)
+        branches.append(
+            select(
+                literal("gommone"),
+                gommone.id,
+                gommone.nome,
+                literal(voce),
+                column,
+            ).where(column.between(start, end))
+        )
+    branches.append(
+        select(
+            literal("certificato"),
+            user.id,
+            nome_utente,
+            literal("Certificato medico"),
+            user.certificate_expiration,
+        ).where(user.certificate_expiration.between(start, end), user.is_suspended.is_(False))
+    )
+    qualifica = models.UserQualification
+    branches.append(
+        select(
+            literal("qualifica"),
+            user.id,
+            nome_utente,
+            models.QualificationType.name,
+            qualifica.expiry_date,
+        )
+        .join(user, user.id == qualifica.user_id)
+        .join(models.QualificationType, models.QualificationType.id == qualifica.qualification_type_id)
+        .where(
+            qualifica.expiry_date.between(start, end),
+            qualifica.is_active.is_(True),
+            user.is_suspended.is_(False),
+        )
+    )
+    return branches
+
+
+def deadlines_between(db: Session, start: date, end: date) -> List[Scadenza]:
+    """Tutte le scadenze con data in ``[start, end]``, in ordine di data."""
+    if end < start:
+        return []
+    union = union_all(*_branches(start, end)).subquery()
+    rows = db.execute(select(union).order_by(union.c.data, union.c.tipo, union.c.nome))
+    return [Scadenza(*row) for row in rows]
+
+
+def _compute_digest(db: Session, today: date) -> Dict[str, dict]:
+    first = today + timedelta(days=min(w[2] for w in DIGEST_WINDOWS))
+    last = today + timedelta(days=max(w[3] for w in DIGEST_WINDOWS))
+    scadenze = deadlines_between(db, first, last)
+    digest = {}
+    for key, label, from_day, to_day in DIGEST_WINDOWS:
+        lo, hi = today + timedelta(days=from_day), today + timedelta(days=to_day)
+        digest[key] = {"label": label, "items": [s for s in scadenze if lo <= s.data <= hi]}
+    return digest
+
+
+def deadline_digest(db: Session, today: Optional[date] = None) -> Dict[str, dict]:
+    """Riepilogo delle scadenze per ``DIGEST_WINDOWS``, in cache per giorno e versione."""
+    today = today or date.today()
+    return _digest_cache.get_or_set(
+        versioned_key(today, *CACHE_ENTITIES), lambda: _compute_digest(db, today)
+    )
@@ -0,0 +1,157 @@
+"""Ore motore dei gommoni: totali, ripartizioni e previsione del tagliando.
+
+Le aggregazioni si fanno in SQL su ``gommone_ore`` (indice ``gommone_id,
+data_utilizzo``): totali per gommone con un solo ``GROUP BY``, ore per
+allenatore e per mese, con il progressivo mensile calcolato da una window
+function. I totali di tutti i gommoni restano in cache finché non viene
+registrato un nuovo utilizzo o modificato un gommone (versione ``mezzi``).
+
+Il tagliando è previsto ogni ``GOMMONE_TAGLIANDO_ORE`` ore motore (default
+100): la data stimata del prossimo si ricava dal ritmo di utilizzo degli
+ultimi ``USAGE_WINDOW_DAYS`` giorni.
+"""
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, extract, func
+from sqlalchemy.orm import Session
+
+import models
+from services.cache_versions import versioned_key
+from utils.cache import KeyedCache
+
+MAINTENANCE_INTERVAL_HOURS = float(os.environ.get("GOMMONE_TAGLIANDO_ORE", "100"))
+USAGE_WINDOW_DAYS = 90
+
+_usage_cache = KeyedCache("engine_hours", maxsize=4)
+
+
+@dataclass(frozen=True)
+class EngineUsage:
+    gommone_id: int
+    ore_totali: float
+    utilizzi: int
+    ultimo_utilizzo: Optional[date]
+    ore_recenti: float  # negli ultimi USAGE_WINDOW_DAYS giorni
+    prossimo_tagliando_ore: float
+    ore_al_tagliando: float
+    tagliando_previsto: Optional[date]
+
+    @property
+    def ore_al_giorno(self) -> float:
+        return self.ore_recenti / USAGE_WINDOW_DAYS
+
+
+def forecast(
+    ore_totali: float,
+    ore_recenti: float,
+    today: date,
+    interval: float = MAINTENANCE_INTERVAL_HOURS,
+    window_days: int = USAGE_WINDOW_DAYS,
+):
+    """(soglia del prossimo tagliando, ore mancanti, data stimata o ``None``).
+
+    Senza utilizzi recenti la data non è stimabile.
+    """
+    soglia = (math.floor(ore_totali / interval) + 1) * interval
+    mancanti = soglia - ore_totali
+    rate = ore_recenti / window_days
+    previsto = today + timedelta(days=math.ceil(mancanti / rate)) if rate > 0 else None
+    return soglia, mancanti, previsto
+
+
+def _compute_usage(db: Session, today: date) -> Dict[int, EngineUsage]:
+    ore = models.GommoneOre
+    since = today - timedelta(days=USAGE_WINDOW_DAYS)
+    rows = (
+        db.query(
+            ore.gommone_id,
+            func.sum(ore.ore_utilizzo),
+            func.count(ore.id),
+            func.max(ore.data_utilizzo),
+            func.sum(case((ore.data_utilizzo > since, ore.ore_utilizzo), else_=0.0)),
+        )
+        .group_by(ore.gommone_id)
+        .all()
+    )
+    usage = {}
+    for gommone_id, totale, utilizzi, ultimo, recenti in rows:
+        totale, recenti = float(totale or 0), float(recenti or 0)
+        soglia, mancanti, previsto = forecast(totale, recenti, today)
+        usage[gommone_id] = EngineUsage(
+            gommone_id, totale, utilizzi, ultimo, recenti, soglia, mancanti, previsto
+        )
+    return usage
+
+
+def usage_by_gommone(db: Session, today: Optional[date] = None) -> Dict[int, EngineUsage]:
+    """Totali e previsione per ogni gommone con almeno un utilizzo (in cache)."""
+    today = today or date.today()
+    return _usage_cache.get_or_set(
+        versioned_key(today, "mezzi"), lambda: _compute_usage(db, today)
+    )
+
+
+def usage_for(db: Session, gommone_id: int, today: Optional[date] = None) -> EngineUsage:
+    today = today or date.today()
+    usage = usage_by_gommone(db, today).get(gommone_id)
+    if usage is None:
+        soglia, mancanti, _ = forecast(0.0, 0.0, today)
+        usage = EngineUsage(gommone_id, 0.0, 0, None, 0.0, soglia, mancanti, None)
+    return usage
+
+
+def hours_by_coach(db: Session, gommone_id: int) -> List[dict]:
+    """Ore e utilizzi per allenatore, dal più assiduo."""
+    ore = models.GommoneOre
+    totale = func.sum(ore.ore_utilizzo)
+    rows = (
+        db.query(models.User.first_name, models.User.last_name, totale, func.count(ore.id))
+        .join(models.User, models.User.id == ore.allenatore_id)
+        .filter(ore.gommone_id == gommone_id)
+        .group_by(models.User.id, models.User.first_name, models.User.last_name)
+        .order_by(totale.desc(), models.User.last_name)
+        .all()
+    )
+    return [
+        {"allenatore": f"{first} {last}", "ore": float(hours), "utilizzi": count}
+        for first, last, hours, count in rows
+    ]
+
+
+def hours_by_month(db: Session, gommone_id: int) -> List[dict]:
+    """Ore per mese con il progressivo cumulato (window function)."""
+    ore = models.GommoneOre
+    anno = extract("year", ore.data_utilizzo)
+    mese = extract("month", ore.data_utilizzo)
+    mensili = (
+        db.query(
+            anno.label("anno"),
+            mese.label("mese"),
+            func.sum(ore.ore_utilizzo).label("ore"),
+            func.count(ore.id).label("utilizzi"),
+        )
+        .filter(ore.gommone_id == gommone_id)
+        .group_by(anno, mese)
+        .subquery()
+    )
+    progressivo = func.sum(mensili.c.ore).over(order_by=(mensili.c.anno, mensili.c.mese))
+    rows = (
+        db.query(mensili.c.anno, mensili.c.mese, mensili.c.ore, mensili.c.utilizzi, progressivo)
+        .order_by(mensili.c.anno, mensili.c.mese)
+        .all()
+    )
+    return [
+        {
+            "mese": f"{int(y):04d}-{int(m):02d}",
+            "ore": float(hours),
+            "utilizzi": count,
+            "progressivo": float(total),
+        }
+        for y, m, hours, count, total in rows
+    ]
@@ -0,0 +1,336 @@
+"""Archiviazione dei log di presenze e degli audit delle attività.
+
+``attendance_change_logs`` e ``activity_audits`` crescono ad ogni modifica.
+``archive`` sposta le righe più vecchie di ``ARCHIVE_RETENTION_MONTHS`` mesi
+(default 12, sempre a mesi interi) in un file JSON Lines compresso per tipo e
+mese sotto ``ARCHIVE_DIR``: zstd se il modulo ``zstandard`` è installato e
+``ARCHIVE_CODEC=zstd``, altrimenti gzip. Ogni mese archiviato ha una riga in
+``log_archives`` con numero di righe e sha256 del contenuto non compresso.
+
+Per ogni mese si scrive un nuovo file (fondendo un eventuale archivio già
+presente, senza duplicare gli id), lo si rilegge e confronta con il
+checksum; solo dopo le righe vengono cancellate, nella stessa transazione
+che aggiorna ``log_archives``. Se il processo si interrompe a metà, il file
+registrato resta quello precedente e la riesecuzione riparte dallo stesso
+stato. Con ``dry_run`` si ottiene solo il conteggio.
+
+``attendance_history`` e ``activity_audit_history`` leggono le tabelle e, se
+richiesto, anche i mesi archiviati; per gli allenamenti delle stagioni chiuse
+``attendance_history`` legge i log spostati nello storico da
+``services.seasons.close_season``. Da eseguire periodicamente con
+``python archive_logs.py``.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models
+from models.storico import storico_attendance_change_logs, storico_attendances
+from services.seasons import closed_seasons
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional at runtime
+    zstandard = None
+
+ARCHIVE_DIR = os.environ.get(
+    "ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archive"),
+)
+RETENTION_MONTHS = int(os.environ.get("ARCHIVE_RETENTION_MONTHS", "12"))
+DELETE_CHUNK = 500
+
+
+class ArchiveChecksumError(RuntimeError):
+    """Il contenuto di un file di archivio non corrisponde a ``log_archives``."""
+
+
+def _codec() -> str:
+    if os.environ.get("ARCHIVE_CODEC", "gzip").lower() == "zstd" and zstandard is not None:
+        return "zst"
+    return "gz"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def _decompress(data: bytes, path: str) -> bytes:
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Serve il modulo zstandard per leggere {path}")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return gzip.decompress(data)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _enum(value) -> Optional[str]:
+    return value.value if value is not None else None
+
+
+@dataclass(frozen=True)
+class ArchiveKind:
+    name: str
+    model: type
+    timestamp: object  # colonna su cui si applica la retention
+    query: Callable[[Session], object]
+    record: Callable[[object], dict]
+
+
+def _attendance_query(db: Session):
+    log = models.AttendanceChangeLog
+    # outer join: i log rimasti senza presenza vanno archiviati comunque, con training/atleta nulli
+    return db.query(log, models.Attendance.training_id, models.Attendance.athlete_id).outerjoin(
+        models.Attendance, models.Attendance.id == log.attendance_id
+    )
+
+
+def _attendance_record(row) -> dict:
+    log, training_id, athlete_id = row
+    return {
+        "id": log.id,
+        "attendance_id": log.attendance_id,
+        "training_id": training_id,
+        "athlete_id": athlete_id,
+        "changed_by_user_id": log.changed_by_user_id,
+        "old_status": _enum(log.old_status),
+        "new_status": _enum(log.new_status),
+        "source": _enum(log.source),
+        "created_at": _iso(log.created_at),
+        "reason": log.reason,
+        "client_key": log.client_key,
+    }
+
+
+def _audit_record(audit) -> dict:
+    return {
+        "id": audit.id,
+        "activity_id": audit.activity_id,
+        "user_id": audit.user_id,
+        "action": audit.action,
+        "changes": audit.changes,
+        "timestamp": _iso(audit.timestamp),
+    }
+
+
+KINDS: Dict[str, ArchiveKind] = {
+    "attendance_changes": ArchiveKind(
+        "attendance_changes",
+        models.AttendanceChangeLog,
+        models.AttendanceChangeLog.created_at,
+        _attendance_query,
+        _attendance_record,
+    ),
+    "activity_audits": ArchiveKind(
+        "activity_audits",
+        models.ActivityAudit,
+        models.ActivityAudit.timestamp,
+        lambda db: db.query(models.ActivityAudit),
+        _audit_record,
+    ),
+}
+
+
+def _month_start(year: int, month: int) -> datetime:
+    return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+
+
+def retention_cutoff(today: date, months: int = RETENTION_MONTHS) -> datetime:
+    """Inizio del mese più vecchio che resta nel database."""
+    return _month_start(today.year, today.month - months)
+
+
+def _encode(records: Iterable[dict]) -> bytes:
+    return b"".join(
+        json.dumps(r, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8") + b"\n"
+        for r in records
+    )
+
+
+def _checksum(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _read(entry: models.LogArchive) -> bytes:
+    with open(os.path.join(ARCHIVE_DIR, entry.path), "rb") as fh:
+        content = _decompress(fh.read(), entry.path)
+    if _checksum(content) != entry.checksum:
+        raise ArchiveChecksumError(f"Checksum non valido per {entry.path}")
+    return content
+
+
+def read_month(entry: models.LogArchive) -> List[dict]:
+    return [json.loads(line) for line in _read(entry).splitlines()]
+
+
+def _write(relpath: str, content: bytes) -> None:
+    path = os.path.join(ARCHIVE_DIR, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(_compress(content, relpath.rsplit(".", 1)[-1]))
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+@dataclass
+class MonthResult:
+    kind: str
+    month: str
+    rows: int
+    path: Optional[str] = None
+    checksum: Optional[str] = None
+
+
+def _archive_month(db: Session, kind: ArchiveKind, start: datetime, end: datetime, dry_run: bool) -> Optional[MonthResult]:
+    rows = (
+        kind.query(db)
+        .filter(kind.timestamp >= start, kind.timestamp < end)
+        .order_by(kind.timestamp, kind.model.id)
+        .all()
+    )
+    if not rows:
+        return None
+    month = start.strftime("%Y-%m")
+    result = MonthResult(kind.name, month, len(rows))
+    if dry_run:
+        return result
+
+    entry = db.query(models.LogArchive).filter_by(kind=kind.name, month=month).one_or_none()
+    new_records = [kind.record(row) for row in rows]
+    records = {r["id"]: r for r in (read_month(entry) if entry else [])}
+    records.update((r["id"], r) for r in new_records)
+    content = _encode(sorted(records.values(), key=lambda r: r["id"]))
+    checksum = _checksum(content)
+    # un file nuovo per ogni versione: quello registrato resta valido finché il commit non riesce
+    relpath = f"{kind.name}/{month}-{checksum[:12]}.jsonl.{_codec()}"
+    _write(relpath, content)
+
+    previous = entry.path if entry else None
+    if entry is None:
+        entry = models.LogArchive(kind=kind.name, month=month)
+        db.add(entry)
+    entry.path, entry.rows, entry.checksum = relpath, len(records), checksum
+    entry.archived_at = datetime.now(timezone.utc)
+    # rilettura dal disco prima di cancellare le righe
+    if len(read_month(entry)) != entry.rows:
+        raise ArchiveChecksumError(f"Righe mancanti in {relpath}")
+
+    ids = [r["id"] for r in new_records]
+    table = kind.model.__table__
+    for i in range(0, len(ids), DELETE_CHUNK):
+        db.execute(table.delete().where(table.c.id.in_(ids[i:i + DELETE_CHUNK])))
+    db.commit()
+    if previous and previous != relpath:
+        os.remove(os.path.join(ARCHIVE_DIR, previous))
+    result.path, result.checksum = relpath, entry.checksum
+    return result
+
+
+def archive(
+    db: Session,
+    months: int = RETENTION_MONTHS,
+    kinds: Iterable[str] = tuple(KINDS),
+    dry_run: bool = False,
+    today: Optional[date] = None,
+) -> List[MonthResult]:
+    """Archivia, mese per mese, le righe anteriori alla retention."""
+    cutoff = retention_cutoff(today or date.today(), months)
+    results = []
+    for name in kinds:
+        kind = KINDS[name]
+        oldest = db.query(func.min(kind.timestamp)).filter(kind.timestamp < cutoff).scalar()
+        if oldest is None:
+            continue
+        year, month = oldest.year, oldest.month
+        while (start := _month_start(year, month)) < cutoff:
+            month += 1
+            result = _archive_month(db, kind, start, _month_start(year, month), dry_run)
+            if result:
+                results.append(result)
+    return results
+
+
+def verify(db: Session) -> List[str]:
+    """Ricontrolla checksum e numero di righe di ogni archivio; restituisce gli errori."""
+    errors = []
+    for entry in db.query(models.LogArchive).order_by(models.LogArchive.kind, models.LogArchive.month):
+        try:
+            rows = len(read_month(entry))
+        except (OSError, ArchiveChecksumError) as e:
+            errors.append(f"{entry.kind} {entry.month}: {e}")
+            continue
+        if rows != entry.rows:
+            errors.append(f"{entry.kind} {entry.month}: {rows} righe invece di {entry.rows}")
+    return errors
+
+
+def _archived(db: Session, kind: str, predicate: Callable[[dict], bool]) -> Iterator[dict]:
+    entries = db.query(models.LogArchive).filter_by(kind=kind).order_by(models.LogArchive.month)
+    for entry in entries:
+        for record in read_month(entry):
+            if predicate(record):
+                record["archived"] = True
+                yield record
+
+
+def _historic_attendance_history(db: Session, training_id: int, athlete_id: int) -> List[dict]:
+    logs, attendances = storico_attendance_change_logs, storico_attendances
+    rows = db.execute(
+        select(logs, attendances.c.training_id, attendances.c.athlete_id)
+        .join(attendances, attendances.c.id == logs.c.attendance_id)
+        .where(attendances.c.training_id == training_id, attendances.c.athlete_id == athlete_id)
+        .order_by(logs.c.created_at, logs.c.id)
+    )
+    return [_attendance_record((row, row.training_id, row.athlete_id)) for row in rows]
+
+
+def attendance_history(db: Session, training_id: int, athlete_id: int, include_archived: bool = False) -> List[dict]:
+    """Modifiche di una presenza, dalla più vecchia; con ``include_archived`` anche i mesi archiviati."""
+    kind = KINDS["attendance_changes"]
+    rows = (
+        kind.query(db)
+        .filter(models.Attendance.training_id == training_id, models.Attendance.athlete_id == athlete_id)
+        .order_by(kind.timestamp, kind.model.id)
+    )
+    history = [kind.record(row) for row in rows]
+    if not history and closed_seasons(db):
+        history = _historic_attendance_history(db, training_id, athlete_id)
+    if include_archived:
+        archived = _archived(
+            db,
+            kind.name,
+            lambda r: r["training_id"] == training_id and r["athlete_id"] == athlete_id,
+        )
+        history = [*archived, *history]
+    return history
+
+
+def activity_audit_history(db: Session, activity_id: int, include_archived: bool = False) -> List[dict]:
+    """Audit di un'attività, dal più vecchio; con ``include_archived`` anche i mesi archiviati."""
+    kind = KINDS["activity_audits"]
+    rows = (
+        kind.query(db)
+        .filter(models.ActivityAudit.activity_id == activity_id)
+        .order_by(kind.timestamp, kind.model.id)
+    )
+    history = [kind.record(row) for row in rows]
+    if include_archived:
+        archived = _archived(db, kind.name, lambda r: r["activity_id"] == activity_id)
+        history = [*archived, *history]
+    return history
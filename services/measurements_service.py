@@ -0,0 +1,203 @@
+"""Serie temporali e bande percentili delle misurazioni antropometriche."""
+from __future__ import annotations
+
+from datetime import date
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import extract
+from sqlalchemy.orm import Session
+
+import models
+from services.cache_versions import versioned_key
+from utils.cache import KeyedCache
+
+# NumPy si importa nelle funzioni: caricarlo all'avvio rallenta il boot
+if TYPE_CHECKING:
+    import numpy as np
+
+METRIC_FIELDS: Dict[str, str] = {
+    "weight": "weight_kg",
+    "height": "height_cm",
+    "torso_height": "torso_height_cm",
+    "wingspan": "wingspan_cm",
+    "leg_length": "leg_length_cm",
+    "tibia_length": "tibia_length_cm",
+    "arm_length": "arm_length_cm",
+    "foot_length": "foot_length_cm",
+    "flexibility": "flexibility_cm",
+}
+
+BAND_METRICS: Tuple[str, ...] = ("height", "weight", "wingspan")
+BAND_PERCENTILES: Tuple[int, ...] = (10, 50, 90)
+
+# bande per categoria: dipendono da misurazioni, date di nascita e fasce d'età
+_bands_cache = KeyedCache("measurement_bands", maxsize=64)
+BANDS_ENTITIES = ("misurazioni", "utenti", "categorie")
+
+
+def load_series(
+    db: Session, athlete_id: int, metrics: Sequence[str], year: Optional[int] = None
+) -> Tuple[List[date], Dict[str, np.ndarray]]:
+    """Load the requested metrics for an athlete as columnar NumPy arrays.
+
+    Only the needed columns are selected; missing values become ``NaN``.
+    """
+    import numpy as np
+    columns = [getattr(models.AthleteMeasurement, METRIC_FIELDS[m]) for m in metrics]
+    query = db.query(models.AthleteMeasurement.measured_at, *columns).filter(
+        models.AthleteMeasurement.athlete_id == athlete_id
+    )
+    if year is not None:
+        query = query.filter(extract("year", models.AthleteMeasurement.measured_at) == year)
+    rows = query.order_by(models.AthleteMeasurement.measured_at.asc()).all()
+    dates = [r[0] for r in rows]
+    values = {
+        metric: np.array([r[idx + 1] for r in rows], dtype=float)
+        for idx, metric in enumerate(metrics)
+    }
+    return dates, values
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Return the indices selected by Largest-Triangle-Three-Buckets.
+
+    ``x`` must be sorted.  First and last points are always kept.
+    """
+    import numpy as np
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        next_start = end
+        next_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        if next_start >= next_end:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        bx = x[start:end]
+        by = y[start:end]
+        areas = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample_lttb(
+    dates: List[date], values: Dict[str, np.ndarray], points: int
+) -> Tuple[List[date], Dict[str, np.ndarray]]:
+    """Downsample every metric with LTTB keeping a shared date column.
+
+    ``points`` is the total budget: each metric gets an equal share and the
+    indices picked for each metric are merged so that the shape of every
+    series is preserved. If the merged set is still larger (tiny budgets),
+    it is thinned evenly, keeping first and last point.
+    """
+    import numpy as np
+    if len(dates) <= points:
+        return dates, values
+    x = np.array([d.toordinal() for d in dates], dtype=float)
+    keep = np.zeros(len(dates), dtype=bool)
+    budget = max(points // max(len(values), 1), 3)
+    for series in values.values():
+        valid = np.flatnonzero(~np.isnan(series))
+        if valid.size:
+            keep[valid[lttb_indices(x[valid], series[valid], budget)]] = True
+    idx = np.flatnonzero(keep)
+    if len(idx) > points:
+        idx = idx[np.unique(np.linspace(0, len(idx) - 1, points).round().astype(int))]
+    return [dates[i] for i in idx], {m: v[idx] for m, v in values.items()}
+
+
+def bucket_means(
+    dates: List[date], values: Dict[str, np.ndarray], period: str
+) -> Tuple[List[date], Dict[str, np.ndarray]]:
+    """Average every metric over weekly (ISO, from Monday) or monthly buckets."""
+    import numpy as np
+    if not dates:
+        return dates, values
+    if period == "week":
+        keys = np.array([d.toordinal() - d.weekday() for d in dates])
+    else:
+        keys = np.array([d.year * 12 + d.month - 1 for d in dates])
+    buckets, inverse = np.unique(keys, return_inverse=True)
+    out: Dict[str, np.ndarray] = {}
+    for metric, series in values.items():
+        valid = ~np.isnan(series)
+        sums = np.bincount(inverse[valid], weights=series[valid], minlength=len(buckets))
+        counts = np.bincount(inverse[valid], minlength=len(buckets))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[metric] = np.where(counts > 0, sums / counts, np.nan)
+    if period == "week":
+        labels = [date.fromordinal(int(k)) for k in buckets]
+    else:
+        labels = [date(int(k) // 12, int(k) % 12 + 1, 1) for k in buckets]
+    return labels, out
+
+
+def to_json_list(series: np.ndarray) -> List[Optional[float]]:
+    """Convert a NumPy array to a JSON friendly list (``NaN`` becomes ``None``)."""
+    import numpy as np
+    return [None if np.isnan(v) else float(v) for v in series]
+
+
+def category_percentile_bands(db: Session, categoria: models.Categoria) -> dict:
+    """Return P10/P50/P90 bands by age for a category, cached per category.
+
+    The key carries the ``cache_versions`` of measurements, users and
+    categories, so every worker drops the entry after a write.
+    """
+    return _bands_cache.get_or_set(
+        versioned_key(categoria.id, *BANDS_ENTITIES), lambda: _compute_bands(db, categoria)
+    )
+
+
+def _compute_bands(db: Session, categoria: models.Categoria) -> dict:
+    import numpy as np
+    age_expr = extract("year", models.AthleteMeasurement.measured_at) - extract(
+        "year", models.User.date_of_birth
+    )
+    columns = [getattr(models.AthleteMeasurement, METRIC_FIELDS[m]) for m in BAND_METRICS]
+    rows = (
+        db.query(age_expr, *columns)
+        .join(models.User, models.User.id == models.AthleteMeasurement.athlete_id)
+        .filter(
+            models.User.date_of_birth.isnot(None),
+            age_expr >= categoria.eta_min,
+            age_expr <= categoria.eta_max,
+        )
+        .all()
+    )
+    result = {
+        "categoria": categoria.nome,
+        "ages": [],
+        "counts": [],
+        "bands": {m: {f"p{p}": [] for p in BAND_PERCENTILES} for m in BAND_METRICS},
+    }
+    if not rows:
+        return result
+    data = np.array([[float(v) if v is not None else np.nan for v in r] for r in rows])
+    ages = data[:, 0].astype(int)
+    for age in np.unique(ages):
+        block = data[ages == age, 1:]
+        result["ages"].append(int(age))
+        result["counts"].append(int(block.shape[0]))
+        for col, metric in enumerate(BAND_METRICS):
+            column = block[:, col]
+            column = column[~np.isnan(column)]
+            bands = result["bands"][metric]
+            if column.size:
+                for p, value in zip(BAND_PERCENTILES, np.percentile(column, BAND_PERCENTILES)):
+                    bands[f"p{p}"].append(float(value))
+            else:
+                for p in BAND_PERCENTILES:
+                    bands[f"p{p}"].append(None)
+    return result
+
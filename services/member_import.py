@@ -0,0 +1,259 @@
+"""Importazione massiva dei tesserati da file CSV/XLSX.
+
+Le righe vengono validate in blocco contro mappe in memoria di ruoli,
+categorie e utenti esistenti; gli hash bcrypt sono calcolati in un
+``ProcessPoolExecutor`` per non bloccare l'event loop e gli inserimenti in
+``users``/``user_roles`` avvengono con ``executemany`` a blocchi.
+
+Il pool è unico per worker web e ha ``IMPORT_HASH_WORKERS`` processi
+(default 2): con più worker uvicorn i processi totali restano
+``worker × IMPORT_HASH_WORKERS`` invece di ``worker × cpu``.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from io import BytesIO, StringIO
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+import models
+import security
+
+INSERT_CHUNK_SIZE = 200
+HASH_WORKERS = max(1, int(os.environ.get("IMPORT_HASH_WORKERS", "2")))
+
+# intestazioni accettate (minuscole) -> campo del modello
+COLUMN_ALIASES: Dict[str, str] = {
+    "username": "username",
+    "password": "password",
+    "nome": "first_name",
+    "first_name": "first_name",
+    "cognome": "last_name",
+    "last_name": "last_name",
+    "data_nascita": "date_of_birth",
+    "data di nascita": "date_of_birth",
+    "date_of_birth": "date_of_birth",
+    "email": "email",
+    "telefono": "phone_number",
+    "phone_number": "phone_number",
+    "codice_fiscale": "tax_code",
+    "codice fiscale": "tax_code",
+    "tax_code": "tax_code",
+    "anno_iscrizione": "enrollment_year",
+    "enrollment_year": "enrollment_year",
+    "data_tesseramento": "membership_date",
+    "membership_date": "membership_date",
+    "scadenza_certificato": "certificate_expiration",
+    "certificate_expiration": "certificate_expiration",
+    "indirizzo": "address",
+    "address": "address",
+    "ruoli": "roles",
+    "roles": "roles",
+    "categoria": "manual_category",
+    "manual_category": "manual_category",
+}
+REQUIRED_FIELDS = ("username", "password", "first_name", "last_name", "date_of_birth")
+DATE_FIELDS = ("date_of_birth", "membership_date", "certificate_expiration")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    total: int = 0
+    dry_run: bool = False
+    errors: List[dict] = field(default_factory=list)
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=min(HASH_WORKERS, os.cpu_count() or 1))
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    """Termina il pool di processi usato per gli hash (chiamato allo shutdown)."""
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(cancel_futures=True)
+        _hash_pool = None
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """Calcola gli hash bcrypt in parallelo senza bloccare l'event loop."""
+    loop = asyncio.get_running_loop()
+    pool = _get_hash_pool()
+    return list(
+        await asyncio.gather(
+            *(loop.run_in_executor(pool, security.get_password_hash, p) for p in passwords)
+        )
+    )
+
+
+def read_rows(filename: str, content: bytes) -> List[Dict[str, str]]:
+    """Legge un CSV (``,`` o ``;``) o un XLSX e normalizza le intestazioni."""
+    if filename.lower().endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:  # pragma: no cover - openpyxl is an optional dep at runtime
+            raise ValueError("Il supporto XLSX richiede openpyxl")
+        wb = load_workbook(BytesIO(content), read_only=True, data_only=True)
+        sheet_rows = wb.active.iter_rows(values_only=True)
+        header = next(sheet_rows, None) or ()
+        raw = [dict(zip(header, values)) for values in sheet_rows]
+        wb.close()
+    else:
+        text = content.decode("utf-8-sig")
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;")
+        except csv.Error:
+            dialect = csv.excel
+        raw = list(csv.DictReader(StringIO(text), dialect=dialect))
+    rows = []
+    for item in raw:
+        row = {}
+        for key, value in item.items():
+            column = COLUMN_ALIASES.get(str(key or "").strip().lower())
+            if column:
+                row[column] = value
+        if any(v not in (None, "") for v in row.values()):
+            rows.append(row)
+    return rows
+
+
+def _parse_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"data non valida: {value}")
+
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _existing(db: Session, column, values: Iterable[str]) -> set:
+    values = {v.lower() for v in values if v}
+    found = set()
+    chunk = list(values)
+    for i in range(0, len(chunk), 500):
+        found.update(
+            v.lower()
+            for (v,) in db.query(column).filter(func.lower(column).in_(chunk[i : i + 500]))
+        )
+    return found
+
+
+def validate_rows(
+    db: Session, rows: List[Dict[str, str]], default_roles: Iterable[str] = ("atleta",)
+) -> tuple[List[dict], List[dict]]:
+    """Valida le righe e restituisce ``(record validi, errori per riga)``.
+
+    Il numero di riga riportato negli errori conta l'intestazione come riga 1.
+    """
+    role_ids = {name.lower(): rid for rid, name in db.query(models.Role.id, models.Role.name)}
+    categories = {nome.lower(): nome for (nome,) in db.query(models.Categoria.nome)}
+    cleaned = [{k: _clean(v) if k not in DATE_FIELDS else v for k, v in r.items()} for r in rows]
+    taken = {
+        "username": _existing(db, models.User.username, (r.get("username") for r in cleaned)),
+        "email": _existing(db, models.User.email, (r.get("email") for r in cleaned)),
+        "tax_code": _existing(db, models.User.tax_code, (r.get("tax_code") for r in cleaned)),
+    }
+    seen: Dict[str, set] = {key: set() for key in taken}
+    valid, errors = [], []
+    for line, row in enumerate(cleaned, start=2):
+        problems = [f"{f} mancante" for f in REQUIRED_FIELDS if not row.get(f)]
+        record = {k: row.get(k) for k in COLUMN_ALIASES.values() if k not in ("roles", "password")}
+        for f in DATE_FIELDS:
+            if row.get(f) not in (None, ""):
+                try:
+                    record[f] = _parse_date(row[f])
+                except ValueError as exc:
+                    problems.append(f"{f}: {exc}")
+            else:
+                record[f] = None
+        if row.get("enrollment_year"):
+            try:
+                record["enrollment_year"] = int(float(row["enrollment_year"]))
+            except ValueError:
+                problems.append("enrollment_year non valido")
+        for key in taken:
+            value = (row.get(key) or "").lower()
+            if value and (value in taken[key] or value in seen[key]):
+                problems.append(f"{key} già in uso: {row[key]}")
+            elif value:
+                seen[key].add(value)
+        names = [n.strip().lower() for n in (row.get("roles") or "").split(",") if n.strip()]
+        names = names or [n.lower() for n in default_roles]
+        unknown = [n for n in names if n not in role_ids]
+        if unknown:
+            problems.append(f"ruoli sconosciuti: {', '.join(unknown)}")
+        if record.get("manual_category"):
+            nome = categories.get(record["manual_category"].lower())
+            if nome is None:
+                problems.append(f"categoria sconosciuta: {record['manual_category']}")
+            record["manual_category"] = nome
+        if problems:
+            errors.append({"row": line, "username": row.get("username"), "errors": problems})
+            continue
+        record["role_ids"] = sorted({role_ids[n] for n in names})
+        record["password"] = row["password"]
+        valid.append(record)
+    return valid, errors
+
+
+async def import_members(
+    db: Session,
+    rows: List[Dict[str, str]],
+    dry_run: bool = False,
+    default_roles: Iterable[str] = ("atleta",),
+) -> ImportReport:
+    """Valida e inserisce i tesserati; le righe con errori vengono saltate."""
+    valid, errors = validate_rows(db, rows, default_roles)
+    report = ImportReport(total=len(rows), dry_run=dry_run, errors=errors)
+    if dry_run or not valid:
+        return report
+    hashes = await hash_passwords([r.pop("password") for r in valid])
+    for record, hashed in zip(valid, hashes):
+        record["hashed_password"] = hashed
+    try:
+        for start in range(0, len(valid), INSERT_CHUNK_SIZE):
+            chunk = valid[start : start + INSERT_CHUNK_SIZE]
+            role_ids = [r.pop("role_ids") for r in chunk]
+            ids = db.scalars(
+                insert(models.User).returning(models.User.id, sort_by_parameter_order=True),
+                chunk,
+            ).all()
+            db.execute(
+                insert(models.user_roles),
+                [
+                    {"user_id": user_id, "role_id": role_id}
+                    for user_id, roles in zip(ids, role_ids)
+                    for role_id in roles
+                ],
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    report.created = len(valid)
+    return report
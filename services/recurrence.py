@@ -0,0 +1,486 @@
+"""Motore unico delle ricorrenze degli allenamenti.
+
+Una ricorrenza è una sola riga ``TrainingSeries``; le occorrenze vengono
+espanse in memoria per la finestra richiesta e restituite come
+``VirtualTraining``. Un'occorrenza diventa una riga ``Allenamento`` (override)
+solo quando serve un identificativo persistente: modifiche puntuali,
+presenze, categorie del singolo evento.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import Select, case, delete, extract, insert, select
+from sqlalchemy.orm import Query, Session, selectinload
+
+import models
+from services.cache_versions import versioned_key
+from services.seasons import ensure_open, historic_trainings
+from utils import parse_orario
+from utils.cache import KeyedCache
+from utils.dates import weekly_dates
+
+TrainingFilter = Callable[[Query, type], Query]
+
+
+def series_recurrence_id(series_id: int) -> str:
+    return f"series-{series_id}"
+
+
+@dataclass(eq=False)
+class VirtualTraining:
+    """Occorrenza non materializzata di una ``TrainingSeries``.
+
+    Espone gli stessi attributi di ``Allenamento`` usati da template e API;
+    ``id`` è ``None`` così le query sulle presenze non trovano righe.
+    """
+
+    series: models.TrainingSeries
+    data: date
+    id = None
+    coach = None
+    coach_id = None
+
+    @property
+    def series_id(self) -> int:
+        return self.series.id
+
+    @property
+    def occurrence_ref(self) -> str:
+        return f"s{self.series.id}-{self.data.isoformat()}"
+
+    @property
+    def recurrence_id(self) -> str:
+        return series_recurrence_id(self.series.id)
+
+    @property
+    def tipo(self) -> str:
+        return self.series.tipo
+
+    @property
+    def descrizione(self) -> Optional[str]:
+        return self.series.descrizione
+
+    @property
+    def orario(self) -> Optional[str]:
+        return self.series.orario
+
+    @property
+    def time_start(self):
+        return parse_orario(self.data, self.series.orario)[0].time()
+
+    @property
+    def time_end(self):
+        return parse_orario(self.data, self.series.orario)[1].time()
+
+    @property
+    def categories(self) -> List[models.Categoria]:
+        return self.series.categories
+
+    @property
+    def coaches(self) -> List[models.User]:
+        return self.series.coaches
+
+    @property
+    def barca_id(self) -> Optional[int]:
+        return self.series.barca_id
+
+    @property
+    def barca(self):
+        return self.series.barca
+
+
+Training = Union[models.Allenamento, VirtualTraining]
+
+
+def parse_occurrence_ref(ref: str) -> Optional[Tuple[int, date]]:
+    """Decodifica un riferimento ``s<series_id>-<YYYY-MM-DD>``."""
+    if not ref.startswith("s") or "-" not in ref:
+        return None
+    series_part, _, date_part = ref[1:].partition("-")
+    try:
+        return int(series_part), date.fromisoformat(date_part)
+    except ValueError:
+        return None
+
+
+def expand_series(
+    series: models.TrainingSeries, start: Optional[date], end: Optional[date]
+) -> List[VirtualTraining]:
+    """Occorrenze non materializzate della serie nella finestra [start, end]."""
+    skip = {e.data for e in series.exceptions}
+    return [
+        VirtualTraining(series, d)
+        for d in weekly_dates(series.start_date, series.until, series.weekday_list, (start, end), skip)
+    ]
+
+
+def series_in_window(
+    db: Session,
+    start: Optional[date],
+    end: Optional[date],
+    filters: Optional[TrainingFilter] = None,
+) -> List[models.TrainingSeries]:
+    """Serie il cui intervallo [start_date, until] interseca la finestra."""
+    query = db.query(models.TrainingSeries).options(
+        selectinload(models.TrainingSeries.categories),
+        selectinload(models.TrainingSeries.coaches),
+        selectinload(models.TrainingSeries.exceptions),
+    )
+    if start:
+        query = query.filter(models.TrainingSeries.until >= start)
+    if end:
+        query = query.filter(models.TrainingSeries.start_date <= end)
+    if filters:
+        query = filters(query, models.TrainingSeries)
+    return query.distinct().all()
+
+
+def trainings_in_window(
+    db: Session,
+    start: Optional[date],
+    end: Optional[date],
+    filters: Optional[TrainingFilter] = None,
+    descending: bool = False,
+) -> List[Training]:
+    """Allenamenti (righe e occorrenze espanse) nella finestra, ordinati per data.
+
+    ``filters`` riceve la query e il modello (``Allenamento`` o
+    ``TrainingSeries``) e viene applicato ad entrambe le sorgenti: i due
+    modelli espongono ``tipo``, ``categories`` e ``coaches`` con lo stesso nome.
+    Se la finestra tocca stagioni chiuse si aggiungono i loro allenamenti
+    (``StoricoAllenamento``, vedi ``services.seasons``).
+    """
+    query = db.query(models.Allenamento).options(
+        selectinload(models.Allenamento.categories),
+        selectinload(models.Allenamento.coaches),
+    )
+    if start:
+        query = query.filter(models.Allenamento.data >= start)
+    if end:
+        query = query.filter(models.Allenamento.data <= end)
+    if filters:
+        query = filters(query, models.Allenamento)
+    trainings: List[Training] = list(query.distinct().all())
+    trainings.extend(historic_trainings(db, start, end, filters))
+    for series in series_in_window(db, start, end, filters):
+        trainings.extend(expand_series(series, start, end))
+    trainings.sort(key=lambda t: (t.data, t.orario or ""), reverse=descending)
+    return trainings
+
+
+_types_cache = KeyedCache("training_types", maxsize=4)
+
+
+def training_types(db: Session) -> List[str]:
+    """Tipi di allenamento presenti fra righe e serie, in ordine alfabetico."""
+
+    def load() -> List[str]:
+        types = {t for (t,) in db.query(models.Allenamento.tipo).distinct()}
+        types.update(t for (t,) in db.query(models.TrainingSeries.tipo).distinct())
+        return sorted(types)
+
+    return list(_types_cache.get_or_set(versioned_key("types", "allenamenti"), load))
+
+
+def series_until_for_count(start: date, weekdays: Sequence[int], count: int) -> date:
+    """Data dell'ultima occorrenza quando la serie è definita da un numero di ripetizioni."""
+    weeks = count // max(len(set(weekdays)), 1) + 2
+    dates = weekly_dates(start, start + timedelta(weeks=weeks), weekdays)
+    return dates[min(count, len(dates)) - 1]
+
+
+def create_series(
+    db: Session,
+    *,
+    tipo: str,
+    descrizione: Optional[str],
+    orario: Optional[str],
+    weekdays: Iterable[int],
+    start_date: date,
+    until: Optional[date] = None,
+    count: Optional[int] = None,
+    categories: Iterable[models.Categoria] = (),
+    coaches: Iterable[models.User] = (),
+    barca_id: Optional[int] = None,
+) -> models.TrainingSeries:
+    """Crea una serie (una riga più le associazioni), senza espandere le occorrenze."""
+    weekdays = sorted(set(weekdays))
+    if until is None:
+        until = series_until_for_count(start_date, weekdays, count or 1)
+    series = models.TrainingSeries(
+        tipo=tipo,
+        descrizione=descrizione,
+        orario=orario,
+        weekdays=",".join(str(d) for d in weekdays),
+        start_date=start_date,
+        until=until,
+        barca_id=barca_id,
+        categories=list(categories),
+        coaches=list(coaches),
+    )
+    db.add(series)
+    return series
+
+
+def materialize_occurrence(db: Session, occurrence: VirtualTraining) -> models.Allenamento:
+    """Crea la riga di override per un'occorrenza e la esclude dall'espansione."""
+    ensure_open(db, occurrence.data)
+    series = occurrence.series
+    training = models.Allenamento(
+        tipo=series.tipo,
+        descrizione=series.descrizione,
+        data=occurrence.data,
+        orario=series.orario,
+        barca_id=series.barca_id,
+        recurrence_id=series_recurrence_id(series.id),
+        series_id=series.id,
+        categories=list(series.categories),
+        coaches=list(series.coaches),
+    )
+    db.add(training)
+    db.flush()
+    db.add(
+        models.TrainingSeriesException(
+            series_id=series.id, data=occurrence.data, allenamento_id=training.id
+        )
+    )
+    db.flush()
+    return training
+
+
+def resolve_training(db: Session, ref: str, materialize: bool = False) -> Optional[Training]:
+    """Restituisce l'allenamento identificato da ``ref``.
+
+    ``ref`` è l'id di una riga ``Allenamento`` oppure il riferimento di
+    un'occorrenza (``s<series_id>-<data>``). Con ``materialize`` l'occorrenza
+    virtuale viene salvata come override.
+    """
+    ref = str(ref)
+    if ref.isdigit():
+        return db.get(models.Allenamento, int(ref))
+    parsed = parse_occurrence_ref(ref)
+    if not parsed:
+        return None
+    series = db.get(models.TrainingSeries, parsed[0])
+    if not series:
+        return None
+    exception = next((e for e in series.exceptions if e.data == parsed[1]), None)
+    if exception:
+        return exception.allenamento
+    if not weekly_dates(series.start_date, series.until, series.weekday_list, (parsed[1], parsed[1])):
+        return None
+    occurrence = VirtualTraining(series, parsed[1])
+    return materialize_occurrence(db, occurrence) if materialize else occurrence
+
+
+def delete_occurrence(db: Session, training: Training) -> None:
+    """Cancella una singola occorrenza (virtuale o materializzata)."""
+    if isinstance(training, VirtualTraining):
+        db.add(models.TrainingSeriesException(series_id=training.series_id, data=training.data))
+        return
+    db.query(models.TrainingSeriesException).filter_by(allenamento_id=training.id).update(
+        {models.TrainingSeriesException.allenamento_id: None}, synchronize_session=False
+    )
+    db.delete(training)
+
+
+def _delete_trainings(db: Session, ids) -> None:
+    """Cancella in blocco gli allenamenti ``ids`` (lista o sottoquery di id).
+
+    Il DELETE in blocco salta le cascade dell'ORM e SQLite non applica le
+    foreign key: log delle presenze e presenze vanno cancellati a mano.
+    """
+    attendance_ids = select(models.Attendance.id).where(models.Attendance.training_id.in_(ids))
+    db.execute(
+        delete(models.AttendanceChangeLog).where(models.AttendanceChangeLog.attendance_id.in_(attendance_ids))
+    )
+    db.execute(delete(models.Attendance).where(models.Attendance.training_id.in_(ids)))
+    db.query(models.TrainingSeriesException).filter(
+        models.TrainingSeriesException.allenamento_id.in_(ids)
+    ).update({models.TrainingSeriesException.allenamento_id: None}, synchronize_session=False)
+    for table in (models.allenamento_categoria_association, models.allenamento_coach_association):
+        db.execute(delete(table).where(table.c.allenamento_id.in_(ids)))
+    db.query(models.Allenamento).filter(models.Allenamento.id.in_(ids)).delete(
+        synchronize_session=False
+    )
+
+
+def truncate_series(db: Session, series: models.TrainingSeries, from_date: date) -> None:
+    """Cancella le occorrenze della serie a partire da ``from_date`` (inclusa)."""
+    overrides = db.query(models.Allenamento.id).filter(
+        models.Allenamento.series_id == series.id, models.Allenamento.data >= from_date
+    )
+    override_ids = [row.id for row in overrides]
+    if override_ids:
+        _delete_trainings(db, override_ids)
+    if from_date <= series.start_date:
+        db.delete(series)
+        return
+    series.until = from_date - timedelta(days=1)
+    db.query(models.TrainingSeriesException).filter(
+        models.TrainingSeriesException.series_id == series.id,
+        models.TrainingSeriesException.data >= from_date,
+    ).delete(synchronize_session=False)
+
+
+def delete_recurrence(db: Session, recurrence_id: str, from_date: Optional[date] = None) -> None:
+    """Cancella le righe di una ricorrenza materializzata (precedente alle serie)."""
+    ids = select(models.Allenamento.id).where(models.Allenamento.recurrence_id == recurrence_id)
+    if from_date:
+        ids = ids.where(models.Allenamento.data >= from_date)
+    _delete_trainings(db, [row.id for row in db.execute(ids)])
+
+
+def split_series(
+    db: Session, series: models.TrainingSeries, from_date: date
+) -> models.TrainingSeries:
+    """Divide la serie: le occorrenze da ``from_date`` passano ad una nuova serie.
+
+    Eccezioni e override successivi vengono spostati con due UPDATE, senza
+    ricreare righe: le presenze già registrate restano collegate.
+    """
+    if from_date <= series.start_date:
+        return series
+    ensure_open(db, from_date, series.until or date.max)
+    tail = models.TrainingSeries(
+        tipo=series.tipo,
+        descrizione=series.descrizione,
+        orario=series.orario,
+        weekdays=series.weekdays,
+        start_date=from_date,
+        until=series.until,
+        barca_id=series.barca_id,
+        categories=list(series.categories),
+        coaches=list(series.coaches),
+    )
+    db.add(tail)
+    db.flush()
+    db.query(models.TrainingSeriesException).filter(
+        models.TrainingSeriesException.series_id == series.id,
+        models.TrainingSeriesException.data >= from_date,
+    ).update({models.TrainingSeriesException.series_id: tail.id}, synchronize_session=False)
+    moved = select(models.TrainingSeriesException.allenamento_id).where(
+        models.TrainingSeriesException.series_id == tail.id
+    )
+    db.query(models.Allenamento).filter(models.Allenamento.id.in_(moved)).update(
+        {
+            models.Allenamento.series_id: tail.id,
+            models.Allenamento.recurrence_id: series_recurrence_id(tail.id),
+        },
+        synchronize_session=False,
+    )
+    series.until = from_date - timedelta(days=1)
+    db.expire(series, ["exceptions", "overrides"])
+    return tail
+
+
+def _replace_associations(db: Session, table, owner_ids: Select, value_model, value_ids) -> None:
+    """Sostituisce le righe di associazione con un DELETE e un INSERT ... SELECT.
+
+    ``table`` ha due colonne (proprietario, valore); ``owner_ids`` è la select
+    degli id proprietari, ``value_ids`` gli id da collegare a ciascuno.
+    """
+    owner_col, value_col = table.c
+    db.execute(delete(table).where(owner_col.in_(owner_ids)))
+    if value_ids:
+        owners = owner_ids.subquery()
+        db.execute(
+            insert(table).from_select(
+                [owner_col.name, value_col.name],
+                select(list(owners.c)[0], value_model.id).where(value_model.id.in_(value_ids)),
+            )
+        )
+
+
+def _delete_out_of_roster(db: Session, training_ids: Select, category_ids: Sequence[int]) -> None:
+    """Cancella presenze e log degli atleti usciti dal roster di ``training_ids``.
+
+    Stessa regola di ``attendance_service.get_roster_for_training``: l'età
+    alla data dell'allenamento deve rientrare in una delle ``category_ids``.
+    """
+    training, athlete = models.Allenamento, models.User
+    age = (
+        extract("year", training.data)
+        - extract("year", athlete.date_of_birth)
+        - case(
+            (
+                extract("month", training.data) * 100 + extract("day", training.data)
+                < extract("month", athlete.date_of_birth) * 100 + extract("day", athlete.date_of_birth),
+                1,
+            ),
+            else_=0,
+        )
+    )
+    in_roster = (
+        select(models.Categoria.id)
+        .where(
+            models.Categoria.id.in_(category_ids),
+            models.Categoria.eta_min <= age,
+            models.Categoria.eta_max >= age,
+        )
+        .exists()
+    )
+    stale_ids = (
+        select(models.Attendance.id)
+        .join(training, training.id == models.Attendance.training_id)
+        .join(athlete, athlete.id == models.Attendance.athlete_id)
+        .where(models.Attendance.training_id.in_(training_ids), ~in_roster)
+    )
+    db.execute(delete(models.AttendanceChangeLog).where(models.AttendanceChangeLog.attendance_id.in_(stale_ids)))
+    db.execute(delete(models.Attendance).where(models.Attendance.id.in_(stale_ids)))
+
+
+def update_trainings(
+    db: Session,
+    training: Training,
+    scope: str,
+    *,
+    tipo: str,
+    descrizione: Optional[str],
+    orario: Optional[str],
+    category_ids: Sequence[int],
+    coach_ids: Sequence[int],
+) -> None:
+    """Modifica una ricorrenza in blocco: ``scope`` è ``"following"`` o ``"all"``.
+
+    Per una serie aggiorna la riga della serie (separando prima le occorrenze
+    successive con ``"following"``) e i suoi override; per le ricorrenze
+    materializzate precedenti aggiorna le righe con lo stesso ``recurrence_id``.
+    Il numero di istruzioni non dipende dalla lunghezza della ricorrenza e gli
+    override restano le stesse righe, con le presenze degli atleti che restano
+    nel roster delle nuove categorie.
+    """
+    values = {"tipo": tipo, "descrizione": descrizione, "orario": orario}
+    if training.series_id:
+        series = training.series
+        ensure_open(db, training.data if scope == "following" else series.start_date, series.until or date.max)
+        if scope == "following":
+            series = split_series(db, series, training.data)
+        series_ids = select(models.TrainingSeries.id).where(models.TrainingSeries.id == series.id)
+        db.execute(
+            models.TrainingSeries.__table__.update()
+            .where(models.TrainingSeries.id == series.id)
+            .values(**values)
+        )
+        _replace_associations(db, models.training_series_categoria, series_ids, models.Categoria, category_ids)
+        _replace_associations(db, models.training_series_coach, series_ids, models.User, coach_ids)
+        training_ids = select(models.Allenamento.id).where(models.Allenamento.series_id == series.id)
+        db.expire(series)
+    else:
+        training_ids = select(models.Allenamento.id).where(
+            models.Allenamento.recurrence_id == training.recurrence_id
+        )
+        if scope == "following":
+            training_ids = training_ids.where(models.Allenamento.data >= training.data)
+        ensure_open(db, training.data)
+    db.execute(
+        models.Allenamento.__table__.update()
+        .where(models.Allenamento.id.in_(training_ids))
+        .values(**values)
+    )
+    _replace_associations(db, models.allenamento_categoria_association, training_ids, models.Categoria, category_ids)
+    _replace_associations(db, models.allenamento_coach_association, training_ids, models.User, coach_ids)
+    _delete_out_of_roster(db, training_ids, category_ids)
@@ -0,0 +1,196 @@
+"""Partizionamento per stagione di allenamenti e presenze.
+
+Le tabelle correnti (``allenamenti``, ``attendances`` e associate) tengono
+solo le stagioni aperte. ``close_season`` sposta in blocco, con
+``INSERT ... SELECT`` e ``DELETE``, le righe di una stagione conclusa nelle
+tabelle di ``models.storico``: su PostgreSQL partizioni native per
+intervallo di data (una per stagione), su SQLite un database collegato con
+``ATTACH``. Le foreign key verso ``allenamenti`` restano valide perché le
+righe spostate escono dalle tabelle correnti insieme a tutto ciò che le
+referenzia; le eccezioni delle serie perdono solo il puntatore all'override.
+
+``historic_trainings`` è il lato di lettura: ``trainings_in_window`` lo
+interroga solo se la finestra tocca una stagione chiusa, quindi le query
+sulla stagione corrente non leggono lo storico. Gli allenamenti storici sono
+in sola lettura e i loro id non identificano righe di ``allenamenti``:
+``ensure_open`` rifiuta le scritture datate in una stagione chiusa
+(allenamenti, occorrenze delle serie, presenze).
+
+Una stagione va dal 1 settembre al 31 agosto (``utils.dates.season_bounds``)
+ed è indicata dall'anno di inizio. Da eseguire con ``python close_season.py``.
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, selectinload
+
+import models
+from models.storico import (
+    HISTORY_SCHEMA,
+    PARTITIONED,
+    history_metadata,
+    storico_allenamenti,
+    storico_allenamento_categoria,
+    storico_allenamento_coach,
+    storico_attendance_change_logs,
+    storico_attendances,
+)
+from services.cache_versions import versioned_key
+from utils.cache import KeyedCache
+from utils.dates import SEASON_START_MONTH, season_bounds
+
+_closed_cache = KeyedCache("closed_seasons", maxsize=4)
+
+
+class SeasonClosedError(ValueError):
+    """Scrittura su una data che cade in una stagione chiusa (409 per le API)."""
+
+
+def season_of(day: date) -> int:
+    return season_bounds(day)[0].year
+
+
+def bounds(season: int) -> Tuple[date, date]:
+    """Primo e ultimo giorno della stagione che inizia nell'anno ``season``."""
+    return season_bounds(date(season, SEASON_START_MONTH, 1))
+
+
+def closed_seasons(db: Session) -> List[Tuple[int, date, date]]:
+    """Stagioni chiuse come (stagione, inizio, fine), dalla più vecchia."""
+
+    def load():
+        return [
+            tuple(row)
+            for row in db.query(
+                models.ClosedSeason.season, models.ClosedSeason.start_date, models.ClosedSeason.end_date
+            ).order_by(models.ClosedSeason.season)
+        ]
+
+    return _closed_cache.get_or_set(versioned_key("closed", "allenamenti"), load)
+
+
+def ensure_open(db: Session, day: date, until: Optional[date] = None) -> None:
+    """Solleva ``SeasonClosedError`` se ``day`` (o l'intervallo fino a ``until``) tocca una stagione chiusa.
+
+    ``until`` è incluso; per un intervallo senza fine si passa ``date.max``.
+    """
+    until = until or day
+    for season, start, end in closed_seasons(db):
+        if start <= until and end >= day:
+            raise SeasonClosedError(f"La stagione {season}/{season + 1} è chiusa: i suoi allenamenti sono in sola lettura")
+
+
+def ensure_history_tables(conn: Connection, season: int) -> None:
+    """Crea, se mancano, le tabelle storiche e su PostgreSQL le partizioni di ``season``."""
+    postgres = conn.dialect.name == "postgresql"
+    if postgres:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {HISTORY_SCHEMA}"))
+    history_metadata.create_all(bind=conn)
+    if not postgres:
+        return
+    start, end = bounds(season)
+    next_start = bounds(season + 1)[0]
+    for table in PARTITIONED:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {HISTORY_SCHEMA}.{table}_{season} "
+            f"PARTITION OF {HISTORY_SCHEMA}.{table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{next_start.isoformat()}')"
+        ))
+
+
+def close_season(db: Session, season: int, today: Optional[date] = None, dry_run: bool = False) -> models.ClosedSeason:
+    """Sposta allenamenti e presenze di ``season`` nello storico.
+
+    Rifiuta con ``ValueError`` una stagione non ancora finita o già chiusa.
+    Con ``dry_run`` restituisce solo i conteggi senza scrivere.
+    """
+    start, end = bounds(season)
+    if end >= (today or date.today()):
+        raise ValueError(f"La stagione {season} non è ancora terminata")
+    if db.get(models.ClosedSeason, season) is not None:
+        raise ValueError(f"La stagione {season} è già chiusa")
+
+    trainings = models.Allenamento.__table__
+    attendances = models.Attendance.__table__
+    logs = models.AttendanceChangeLog.__table__
+    categorie = models.allenamento_categoria_association
+    coaches = models.allenamento_coach_association
+    training_ids = select(trainings.c.id).where(trainings.c.data.between(start, end))
+    attendance_ids = select(attendances.c.id).where(attendances.c.training_id.in_(training_ids))
+
+    result = models.ClosedSeason(
+        season=season,
+        start_date=start,
+        end_date=end,
+        trainings=db.scalar(select(func.count()).select_from(training_ids.subquery())),
+        attendances=db.scalar(select(func.count()).select_from(attendance_ids.subquery())),
+    )
+    if dry_run:
+        return result
+
+    ensure_history_tables(db.connection(), season)
+    columns = [c.name for c in storico_allenamenti.c]
+    db.execute(storico_allenamenti.insert().from_select(
+        columns, select(*(trainings.c[name] for name in columns)).where(trainings.c.data.between(start, end))
+    ))
+    for source, target in ((categorie, storico_allenamento_categoria), (coaches, storico_allenamento_coach)):
+        columns = [c.name for c in target.c]
+        db.execute(target.insert().from_select(
+            columns,
+            select(*(source.c[name] for name in columns)).where(source.c.allenamento_id.in_(training_ids)),
+        ))
+    columns = [c.name for c in storico_attendances.c if c.name != "training_date"]
+    db.execute(storico_attendances.insert().from_select(
+        [*columns, "training_date"],
+        select(*(attendances.c[name] for name in columns), trainings.c.data)
+        .join(trainings, trainings.c.id == attendances.c.training_id)
+        .where(trainings.c.data.between(start, end)),
+    ))
+    columns = [c.name for c in storico_attendance_change_logs.c]
+    db.execute(storico_attendance_change_logs.insert().from_select(
+        columns, select(*(logs.c[name] for name in columns)).where(logs.c.attendance_id.in_(attendance_ids))
+    ))
+
+    # prima chi referenzia, poi gli allenamenti
+    db.execute(logs.delete().where(logs.c.attendance_id.in_(attendance_ids)))
+    db.execute(attendances.delete().where(attendances.c.training_id.in_(training_ids)))
+    db.execute(categorie.delete().where(categorie.c.allenamento_id.in_(training_ids)))
+    db.execute(coaches.delete().where(coaches.c.allenamento_id.in_(training_ids)))
+    exceptions = models.TrainingSeriesException.__table__
+    db.execute(
+        exceptions.update().where(exceptions.c.allenamento_id.in_(training_ids)).values(allenamento_id=None)
+    )
+    db.execute(trainings.delete().where(trainings.c.data.between(start, end)))
+    db.add(result)
+    db.commit()
+    return result
+
+
+def historic_trainings(db: Session, start: Optional[date], end: Optional[date], filters=None) -> list:
+    """Allenamenti delle stagioni chiuse nella finestra; nessuna query se non ce ne sono."""
+    overlaps = [
+        (first, last)
+        for _, first, last in closed_seasons(db)
+        if (end is None or first <= end) and (start is None or last >= start)
+    ]
+    if not overlaps:
+        return []
+    model = models.StoricoAllenamento
+    query = db.query(model).options(selectinload(model.categories), selectinload(model.coaches))
+    # anche i limiti delle stagioni: su PostgreSQL il planner scarta le altre partizioni
+    query = query.filter(model.data >= max(start or overlaps[0][0], overlaps[0][0]))
+    query = query.filter(model.data <= min(end or overlaps[-1][1], overlaps[-1][1]))
+    if filters:
+        query = filters(query, model)
+    return list(query.distinct().all())
+
+
+def attendance_model(training) -> type:
+    """Modello delle presenze che contiene le righe di ``training``."""
+    if isinstance(training, models.StoricoAllenamento):
+        return models.StoricoAttendance
+    return models.Attendance
@@ -0,0 +1,157 @@
+"""Avvio dell'applicazione: verifica dello schema e dati di base.
+
+Con ``STARTUP_MODE=fast`` l'avvio non esegue ``create_all`` ma controlla
+soltanto che il database sia alla revisione Alembic più recente (le
+migrazioni si applicano al deploy con ``alembic upgrade head``). In
+entrambe le modalità i dati di base (ruoli, categorie, turni, mezzi) sono
+popolati una sola volta: la riga ``app_meta.seed_version`` registra la
+versione già applicata e, se coincide con ``SEED_VERSION``, il modulo
+``seed`` non viene nemmeno importato.
+
+Ogni fase viene cronometrata e riportata nel log.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+import security
+from database import Base, engine
+from services import cache_versions
+
+logger = logging.getLogger(__name__)
+
+# da incrementare quando cambiano i dati di base in seed.py
+SEED_VERSION = "1"
+SEED_VERSION_KEY = "seed_version"
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+DEFAULT_ROLES = ("atleta", "allenatore", "istruttore", "admin")
+
+
+class SchemaOutdatedError(RuntimeError):
+    """Il database non è alla revisione Alembic attesa."""
+
+
+@contextmanager
+def phase(name: str, timings: Dict[str, float]) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+        logger.info("Avvio: %s in %.1f ms", name, timings[name] * 1000)
+
+
+def startup_mode() -> str:
+    return os.environ.get("STARTUP_MODE", "full").lower()
+
+
+def check_schema_revision(bind=engine) -> str:
+    """Verifica che il database sia alla head di Alembic e ne restituisce la revisione."""
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_heads())
+    with bind.connect() as conn:
+        current = set(MigrationContext.configure(conn).get_current_heads())
+    if current != heads:
+        raise SchemaOutdatedError(
+            f"Database alla revisione {sorted(current) or 'nessuna'}, attesa {sorted(heads)}: "
+            "eseguire 'alembic upgrade head'"
+        )
+    return ", ".join(sorted(current))
+
+
+def get_seed_version(db: Session) -> Optional[str]:
+    row = db.get(models.AppMeta, SEED_VERSION_KEY)
+    return row.value if row else None
+
+
+def seed_base_data(db: Session) -> bool:
+    """Popola i dati di base se la versione registrata è diversa da ``SEED_VERSION``.
+
+    Restituisce ``True`` se il popolamento è stato eseguito. Le singole
+    funzioni di ``seed`` restano idempotenti, quindi un database esistente
+    privo del marcatore viene solo completato.
+    """
+    if get_seed_version(db) == SEED_VERSION:
+        return False
+    from seed import seed_categories, seed_default_allenamenti, seed_mezzi, seed_turni
+
+    existing = {name for (name,) in db.query(models.Role.name)}
+    missing = [models.Role(name=name) for name in DEFAULT_ROLES if name not in existing]
+    if missing:
+        logger.info("Popolamento dei ruoli...")
+        db.add_all(missing)
+        db.commit()
+    seed_categories(db)
+    seed_turni(db)
+    seed_default_allenamenti(db)
+    seed_mezzi(db)
+    db.merge(models.AppMeta(key=SEED_VERSION_KEY, value=SEED_VERSION))
+    db.commit()
+    return True
+
+
+def ensure_admin_user(db: Session) -> bool:
+    """Crea l'utente admin da ``ADMIN_USERNAME``/``ADMIN_PASSWORD`` se manca."""
+    admin_username = os.environ.get("ADMIN_USERNAME", "admin")
+    admin_password = os.environ.get("ADMIN_PASSWORD")
+    if not admin_password:
+        return False
+    if db.query(models.User.id).filter(models.User.username == admin_username).first():
+        return False
+    logger.info(f"Creazione utente admin '{admin_username}'...")
+    roles = db.query(models.Role).filter(models.Role.name.in_(("admin", "allenatore"))).all()
+    db.add(
+        models.User(
+            username=admin_username,
+            hashed_password=security.get_password_hash(admin_password),
+            first_name="Admin",
+            last_name="User",
+            email=os.environ.get("ADMIN_EMAIL", "admin@example.com"),
+            date_of_birth=date(1990, 1, 1),
+            roles=roles,
+        )
+    )
+    db.commit()
+    logger.info(f"Utente admin '{admin_username}' creato.")
+    return True
+
+
+def prepare_database(session_factory, bind=engine) -> Dict[str, float]:
+    """Schema e dati di base; restituisce le durate delle fasi in secondi.
+
+    In modalità ``fast`` una revisione non aggiornata interrompe l'avvio con
+    ``SchemaOutdatedError``.
+    """
+    timings: Dict[str, float] = {}
+    if startup_mode() == "fast":
+        with phase("verifica revisione", timings):
+            logger.info(f"Revisione database: {check_schema_revision(bind)}")
+    else:
+        with phase("create_all", timings):
+            Base.metadata.create_all(bind=bind)
+    db = session_factory()
+    try:
+        with phase("dati di base", timings):
+            if seed_base_data(db):
+                logger.info(f"Dati di base popolati (versione {SEED_VERSION}).")
+            cache_versions.ensure_rows(db)
+        with phase("utente admin", timings):
+            ensure_admin_user(db)
+    except Exception as e:
+        logger.warning(f"Errore durante il popolamento dei dati di base all'avvio: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    return timings
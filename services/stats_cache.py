@@ -0,0 +1,197 @@
+"""Cache dei risultati degli endpoint di statistiche.
+
+La chiave è endpoint + parametri normalizzati + versioni dei dati usati
+(``services.cache_versions``). Per un periodo aperto (che arriva al mese
+corrente) sono le versioni dei gruppi: ogni scrittura su presenze,
+allenamenti e categorie, turni o assegnazioni rende obsolete le voci che ne
+dipendono.
+
+I periodi chiusi (finiti prima del mese corrente) di solito non cambiano più,
+ma le correzioni tardive delle presenze sono frequenti. Per non perdere tutti
+i mesi passati ad ogni scrittura, i gruppi con una data (``DATED``) hanno
+anche una versione per mese, ``<gruppo>:AAAA-MM``, incrementata solo dalle
+scritture ORM su righe datate in un mese già chiuso (per presenze e
+assegnazioni conta la data dell'allenamento o dell'attività, per una serie
+il suo intervallo). Le scritture in blocco, di cui non si conoscono le date,
+incrementano ``<gruppo>:*``. La chiave di un periodo chiuso usa le versioni
+dei suoi mesi, ``<gruppo>:*`` e le versioni intere dei gruppi senza data
+(categorie, utenti).
+
+Con ``RESULT_CACHE_DB`` i risultati dei periodi chiusi sono copiati anche in
+un file SQLite condiviso fra i worker e persistente fra i riavvii
+(``utils.cache.ResultCache``). Le versioni stanno nel database, quindi una
+voce su disco resta valida finché i dati del periodo non cambiano. Hit e miss
+sono esposti su ``/metrics`` come per le altre cache.
+"""
+from __future__ import annotations
+
+import os
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Delete, Insert, Update, event, inspect, select
+from sqlalchemy.orm import Session
+
+import models
+from services import cache_versions
+from services.cache_versions import ENTITY_TABLES, versioned_key
+from utils.cache import ResultCache
+
+_results = ResultCache(
+    "stats_results",
+    maxsize=int(os.environ.get("RESULT_CACHE_SIZE", "512")),
+    path=os.environ.get("RESULT_CACHE_DB") or None,
+)
+
+TRAININGS = ("allenamenti", "presenze", "categorie", "utenti")
+TURNI = ("turni", "utenti")
+ACTIVITIES = ("attivita", "utenti")
+
+# gruppi con una versione per mese chiuso
+DATED = ("allenamenti", "presenze", "turni", "attivita")
+
+# modello -> (gruppo, attributo con la data)
+_DATE_ATTRS = {
+    models.Allenamento: ("allenamenti", "data"),
+    models.TrainingSeriesException: ("allenamenti", "data"),
+    models.Turno: ("turni", "data"),
+    models.Activity: ("attivita", "date"),
+}
+# righe datate dal padre: modello -> (gruppo, chiave esterna, id e data del padre)
+_PARENT_DATES = {
+    models.Attendance: ("presenze", "training_id", models.Allenamento.id, models.Allenamento.data),
+    models.ActivityAssignment: ("attivita", "activity_id", models.Activity.id, models.Activity.date),
+}
+# tabelle che le statistiche non leggono: le scritture in blocco non toccano i periodi chiusi
+_UNREAD_TABLES = {"attendance_change_logs", "trainer_availabilities"}
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted({_normalize(v) for v in value}))
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def normalize_params(params: Mapping[str, Any]) -> Tuple:
+    """Parametri in forma canonica: ordinati, senza ``None``, liste ordinate e senza duplicati."""
+    return tuple(sorted((k, _normalize(v)) for k, v in params.items() if v is not None and v != []))
+
+
+def is_closed(period_end: Optional[date], today: Optional[date] = None) -> bool:
+    """Vero se il periodo è finito prima dell'inizio del mese corrente."""
+    if period_end is None:
+        return False
+    return period_end < (today or date.today()).replace(day=1)
+
+
+def _month(day: date) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def _months(start: date, end: date) -> List[str]:
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def closed_entities(entities: Sequence[str], start: date, end: date) -> List[str]:
+    """Versioni da cui dipende un periodo chiuso: i mesi dei gruppi con data, gli altri gruppi interi."""
+    months = _months(start, end)
+    result = []
+    for entity in entities:
+        if entity in DATED:
+            result += [f"{entity}:*", *(f"{entity}:{m}" for m in months)]
+        else:
+            result.append(entity)
+    return result
+
+
+def cached_result(
+    endpoint: str,
+    params: Mapping[str, Any],
+    period: Optional[Tuple[date, date]],
+    entities: Sequence[str],
+    compute: Callable[[], Any],
+) -> Any:
+    """Risultato di ``compute`` per ``endpoint`` e ``params``, dalla cache se possibile.
+
+    ``period`` è l'intervallo (primo, ultimo giorno) coperto dal risultato,
+    ``None`` se il periodo è aperto: solo i periodi chiusi hanno versioni per
+    mese e vanno anche su disco. Il valore restituito deve essere
+    serializzabile in JSON.
+    """
+    key = (endpoint, normalize_params(params))
+    if period is None or not is_closed(period[1]):
+        return _results.get_or_set(versioned_key(key, *entities), compute)
+    key = versioned_key((*key, "closed"), *closed_entities(entities, *period))
+    return _results.get_or_set(key, compute, persist=True)
+
+
+def _values(obj, attr: str) -> Set:
+    """Valori di ``attr`` prima e dopo il flush."""
+    history = inspect(obj).attrs[attr].history
+    return {v for v in (*history.unchanged, *history.added, *history.deleted) if v is not None}
+
+
+@event.listens_for(Session, "after_flush")
+def _record_closed_months(session: Session, flush_context) -> None:
+    changed = [*session.new, *session.deleted]
+    changed += [obj for obj in session.dirty if session.is_modified(obj)]
+    first_open = date.today().replace(day=1)
+    touched: Set[str] = set()
+    parent_ids: Dict[type, Set[int]] = {}
+    for obj in changed:
+        cls = type(obj)
+        if cls in _DATE_ATTRS:
+            group, attr = _DATE_ATTRS[cls]
+            values = _values(obj, attr)
+            touched.update(f"{group}:{_month(d)}" for d in values)
+        elif cls in _PARENT_DATES:
+            group, attr = _PARENT_DATES[cls][:2]
+            values = _values(obj, attr)
+            parent_ids.setdefault(cls, set()).update(values)
+        elif cls is models.TrainingSeries:
+            group = "allenamenti"
+            starts, ends = _values(obj, "start_date"), _values(obj, "until")
+            values = starts and ends
+            if values and min(starts) < first_open:
+                last_closed = min(max(ends), first_open - timedelta(days=1))
+                touched.update(f"{group}:{m}" for m in _months(min(starts), last_closed))
+        else:
+            continue
+        if not values:
+            # attributo non caricato: date sconosciute
+            touched.add(f"{group}:*")
+    for cls, ids in parent_ids.items():
+        group, _, id_column, date_column = _PARENT_DATES[cls]
+        if ids:
+            days = session.execute(select(date_column).where(id_column.in_(ids))).scalars()
+            touched.update(f"{group}:{_month(d)}" for d in days)
+    current = _month(first_open)
+    closed = {entity for entity in touched if entity.endswith("*") or entity.rsplit(":", 1)[1] < current}
+    if closed:
+        cache_versions.record(session, closed)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_statement(state) -> None:
+    statement = state.statement
+    if isinstance(statement, (Insert, Update, Delete)):
+        name = getattr(statement.table, "name", None)
+        group = ENTITY_TABLES.get(name)
+        if group in DATED and name not in _UNREAD_TABLES:
+            cache_versions.record(state.session, {f"{group}:*"})
+
+
+def invalidate() -> None:
+    """Svuota la cache, anche su disco."""
+    _results.invalidate()
+
+
+def stats() -> dict:
+    return _results.stats()
@@ -0,0 +1,237 @@
+"""Statistiche di forza per categoria: classifiche, percentili e progressi.
+
+Per tutte le ``ALLOWED_PESI_CATEGORIES`` insieme si leggono con una query
+ciascuno le schede pesi, l'ultimo peso corporeo di ogni atleta e lo storico
+dei massimali; i valori vengono disposti in matrici atleti × esercizi e
+classifiche, percentili, forza relativa (kg / peso corporeo) e delta di
+stagione sono calcolati con NumPy su tutta la categoria.
+
+Il risultato resta in cache finché non cambia una scheda, un esercizio, una
+misurazione o un atleta (versioni ``pesi``, ``misurazioni``, ``utenti`` e
+``categorie`` di ``services.cache_versions``).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from services.cache_versions import versioned_key
+from services.users import ALLOWED_PESI_CATEGORIES, atleti_per_categoria
+from utils.cache import KeyedCache
+from utils.dates import season_bounds
+
+# solo per le annotazioni: NumPy si carica alla prima statistica calcolata
+if TYPE_CHECKING:
+    import numpy as np
+
+CACHE_ENTITIES = ("pesi", "misurazioni", "utenti", "categorie")
+
+_stats_cache = KeyedCache("strength_stats", maxsize=4)
+
+
+def _cell(value: float, digits: int = 2) -> Optional[float]:
+    import numpy as np
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def rank_columns(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Posizione in classifica e percentile di ogni cella, colonna per colonna.
+
+    La classifica è decrescente con pari merito (``1, 2, 2, 4``); il
+    percentile è ``(inferiori + 0,5 · uguali) / n · 100``. I ``NaN`` sono
+    esclusi dal confronto e restano ``NaN``.
+    """
+    import numpy as np
+    values = np.asarray(values, dtype=float)
+    below = (values[None, :, :] < values[:, None, :]).sum(axis=1)
+    above = (values[None, :, :] > values[:, None, :]).sum(axis=1)
+    equal = (values[None, :, :] == values[:, None, :]).sum(axis=1)
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percentili = (below + 0.5 * equal) / n * 100.0
+    ranks = np.where(valid, above + 1.0, np.nan)
+    return ranks, np.where(valid, percentili, np.nan)
+
+
+@dataclass
+class CategoryStats:
+    categoria: str
+    stagione: Tuple[date, date]
+    # (id, nome): il risultato sopravvive alla sessione che lo ha calcolato
+    esercizi: List[Tuple[int, str]]
+    atleti: List[Tuple[int, str]]
+    # vettore (atleti,) e matrici (atleti, esercizi); NaN dove manca il valore
+    pesi_corporei: np.ndarray
+    massimali: np.ndarray
+    ranks: np.ndarray
+    percentili: np.ndarray
+    relativi: np.ndarray
+    delta: np.ndarray
+
+    def summary(self) -> List[dict]:
+        import numpy as np
+        result = []
+        for j, (esercizio_id, nome) in enumerate(self.esercizi):
+            column = self.massimali[:, j]
+            column = column[~np.isnan(column)]
+            entry = {"id": esercizio_id, "nome": nome, "n": int(column.size)}
+            if column.size:
+                p25, median, p75 = np.percentile(column, (25, 50, 75))
+                entry.update(
+                    media=_cell(column.mean()),
+                    mediana=_cell(median),
+                    p25=_cell(p25),
+                    p75=_cell(p75),
+                    max=_cell(column.max()),
+                )
+            else:
+                entry.update(media=None, mediana=None, p25=None, p75=None, max=None)
+            result.append(entry)
+        return result
+
+    def to_dict(self, atleta_id: Optional[int] = None) -> dict:
+        """Dati per il client; con ``atleta_id`` solo la riga di quell'atleta."""
+        atleti = []
+        for i, (id_, nome) in enumerate(self.atleti):
+            if atleta_id is not None and id_ != atleta_id:
+                continue
+            atleti.append(
+                {
+                    "id": id_,
+                    "nome": nome,
+                    "peso_corporeo": _cell(self.pesi_corporei[i]),
+                    "valori": [
+                        {
+                            "massimale": _cell(self.massimali[i, j]),
+                            "posizione": _cell(self.ranks[i, j], 0),
+                            "percentile": _cell(self.percentili[i, j], 1),
+                            "relativo": _cell(self.relativi[i, j]),
+                            "delta_stagione": _cell(self.delta[i, j]),
+                        }
+                        for j in range(len(self.esercizi))
+                    ],
+                }
+            )
+        return {
+            "categoria": self.categoria,
+            "stagione": {"inizio": self.stagione[0].isoformat(), "fine": self.stagione[1].isoformat()},
+            "esercizi": self.summary(),
+            "atleti": atleti,
+        }
+
+    def index_of(self, atleta_id: int) -> Optional[int]:
+        return next((i for i, (id_, _) in enumerate(self.atleti) if id_ == atleta_id), None)
+
+
+def _latest_body_weights(db: Session, atleta_ids: List[int]) -> Dict[int, float]:
+    rows = (
+        db.query(models.AthleteMeasurement.athlete_id, models.AthleteMeasurement.weight_kg)
+        .filter(
+            models.AthleteMeasurement.athlete_id.in_(atleta_ids),
+            models.AthleteMeasurement.weight_kg.isnot(None),
+        )
+        .order_by(models.AthleteMeasurement.measured_at, models.AthleteMeasurement.created_at)
+    )
+    # in ordine cronologico: l'ultima misurazione sovrascrive le precedenti
+    return {athlete_id: weight for athlete_id, weight in rows}
+
+
+def _season_baselines(
+    db: Session, atleta_ids: List[int], season_start: date
+) -> Dict[Tuple[int, int], float]:
+    """Massimale di partenza della stagione per ``(atleta, esercizio)``.
+
+    È l'ultimo valore registrato prima dell'inizio della stagione oppure, se
+    manca, il primo registrato durante la stagione.
+    """
+    storico = models.MassimaleStorico
+    rows = (
+        db.query(storico.atleta_id, storico.esercizio_id, storico.massimale, storico.recorded_at)
+        .filter(storico.atleta_id.in_(atleta_ids))
+        .order_by(storico.recorded_at)
+    )
+    before: Dict[Tuple[int, int], float] = {}
+    first_in_season: Dict[Tuple[int, int], float] = {}
+    for atleta_id, esercizio_id, massimale, recorded_at in rows:
+        key = (atleta_id, esercizio_id)
+        if recorded_at < season_start:
+            before[key] = massimale
+        else:
+            first_in_season.setdefault(key, massimale)
+    return {**first_in_season, **before}
+
+
+def compute_all(db: Session, today: Optional[date] = None) -> Dict[str, CategoryStats]:
+    """Statistiche di tutte le categorie pesi (cinque query in tutto)."""
+    import numpy as np
+    stagione = season_bounds(today or date.today())
+    esercizi = db.query(models.EsercizioPesi).order_by(models.EsercizioPesi.ordine).all()
+    gruppi = atleti_per_categoria(db, ALLOWED_PESI_CATEGORIES)
+    atleta_ids = [a.id for gruppo in gruppi.values() for a in gruppo]
+    cols = {e.id: j for j, e in enumerate(esercizi)}
+
+    massimali: Dict[int, np.ndarray] = {i: np.full(len(esercizi), np.nan) for i in atleta_ids}
+    baselines = np.full((len(atleta_ids), len(esercizi)), np.nan)
+    pesi: Dict[int, float] = {}
+    if atleta_ids and esercizi:
+        schede = (
+            db.query(models.SchedaPesi.atleta_id, models.SchedaPesi.esercizio_id, models.SchedaPesi.massimale)
+            .filter(models.SchedaPesi.atleta_id.in_(atleta_ids), models.SchedaPesi.massimale.isnot(None))
+        )
+        for atleta_id, esercizio_id, massimale in schede:
+            j = cols.get(esercizio_id)
+            if j is not None:
+                massimali[atleta_id][j] = massimale
+        row_of = {a: i for i, a in enumerate(atleta_ids)}
+        for (atleta_id, esercizio_id), massimale in _season_baselines(db, atleta_ids, stagione[0]).items():
+            j = cols.get(esercizio_id)
+            if j is not None:
+                baselines[row_of[atleta_id], j] = massimale
+        pesi = _latest_body_weights(db, atleta_ids)
+
+    result: Dict[str, CategoryStats] = {}
+    offset = 0
+    for categoria, atleti in gruppi.items():
+        matrix = np.array([massimali[a.id] for a in atleti]).reshape(len(atleti), len(esercizi))
+        body = np.array([pesi.get(a.id, np.nan) for a in atleti], dtype=float)
+        ranks, percentili = rank_columns(matrix)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relativi = np.where(body[:, None] > 0, matrix / body[:, None], np.nan)
+        delta = matrix - baselines[offset:offset + len(atleti)]
+        offset += len(atleti)
+        result[categoria] = CategoryStats(
+            categoria,
+            stagione,
+            [(e.id, e.nome) for e in esercizi],
+            [(a.id, f"{a.first_name} {a.last_name}") for a in atleti],
+            body,
+            matrix,
+            ranks,
+            percentili,
+            relativi,
+            delta,
+        )
+    return result
+
+
+def all_strength_stats(db: Session) -> Dict[str, CategoryStats]:
+    key = versioned_key(date.today(), *CACHE_ENTITIES)
+    return _stats_cache.get_or_set(key, lambda: compute_all(db))
+
+
+def strength_stats(db: Session, categoria: str) -> Optional[CategoryStats]:
+    """Statistiche di ``categoria`` (``None`` se non è una categoria pesi)."""
+    return all_strength_stats(db).get(categoria)
+
+
+def stats_for_athlete(db: Session, atleta_id: int) -> Optional[CategoryStats]:
+    """Statistiche della categoria pesi a cui appartiene ``atleta_id``."""
+    return next(
+        (s for s in all_strength_stats(db).values() if s.index_of(atleta_id) is not None),
+        None,
+    )
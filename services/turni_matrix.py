@@ -0,0 +1,165 @@
+"""Matrice allenatori × turni compatta per la pianificazione mensile.
+
+La matrice si costruisce con query di sole colonne: ``turni`` (id, data,
+fascia, assegnatario) e ``trainer_availabilities`` (allenatore, turno) del
+periodo, più l'elenco degli allenatori. Per ogni allenatore disponibilità e
+assegnazioni sono bitset: il bit ``i`` (byte ``i // 8``, bit ``i % 8``)
+corrisponde al turno in posizione ``i`` di ``turni``, codificati in base64.
+Con 40 allenatori e 60 turni ogni bitset occupa 8 byte.
+
+Il salvataggio riceve solo le celle modificate e tocca solo quelle righe.
+"""
+from __future__ import annotations
+
+import base64
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+
+
+def pack_bits(indexes: Iterable[int], size: int) -> str:
+    """Bitset base64 di ``size`` bit con impostati gli ``indexes``."""
+    buf = bytearray((size + 7) // 8)
+    for i in indexes:
+        buf[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(buf)).decode("ascii")
+
+
+def unpack_bits(encoded: str, size: int) -> List[int]:
+    """Indici dei bit impostati in un bitset prodotto da ``pack_bits``."""
+    buf = base64.b64decode(encoded)
+    return [i for i in range(size) if buf[i >> 3] >> (i & 7) & 1]
+
+
+def coach_rows(db: Session) -> List[Tuple[int, str, str]]:
+    return (
+        db.query(models.User.id, models.User.first_name, models.User.last_name)
+        .join(models.User.roles)
+        .filter(models.Role.name == "allenatore")
+        .order_by(models.User.first_name, models.User.last_name, models.User.id)
+        .all()
+    )
+
+
+def build_matrix(db: Session, start: date, end: date) -> dict:
+    """Turni del periodo ``[start, end]`` e bitset per allenatore."""
+    turni = (
+        db.query(models.Turno.id, models.Turno.data, models.Turno.fascia_oraria, models.Turno.user_id)
+        .filter(models.Turno.data.between(start, end))
+        .order_by(models.Turno.data, models.Turno.fascia_oraria, models.Turno.id)
+        .all()
+    )
+    position = {turno_id: i for i, (turno_id, _, _, _) in enumerate(turni)}
+    available: Dict[int, List[int]] = {}
+    rows = (
+        db.query(models.TrainerAvailability.user_id, models.TrainerAvailability.turno_id)
+        .join(models.Turno, models.Turno.id == models.TrainerAvailability.turno_id)
+        .filter(
+            models.Turno.data.between(start, end),
+            models.TrainerAvailability.available.is_(True),
+        )
+    )
+    for user_id, turno_id in rows:
+        available.setdefault(user_id, []).append(position[turno_id])
+    assigned: Dict[int, List[int]] = {}
+    for i, (_, _, _, user_id) in enumerate(turni):
+        if user_id is not None:
+            assigned.setdefault(user_id, []).append(i)
+
+    coaches = coach_rows(db)
+    size = len(turni)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "turni": [t[0] for t in turni],
+        "date": [t[1].isoformat() for t in turni],
+        "fasce": [t[2] for t in turni],
+        "coaches": [c[0] for c in coaches],
+        "names": [f"{first} {last}" for _, first, last in coaches],
+        "available": [pack_bits(available.get(c[0], ()), size) for c in coaches],
+        "assigned": [pack_bits(assigned.get(c[0], ()), size) for c in coaches],
+    }
+
+
+def set_availability(db: Session, user_id: int, turno_ids: Set[int], scope: Iterable[int]) -> Tuple[int, int]:
+    """Porta le disponibilità di ``user_id`` sui turni ``scope`` a ``turno_ids``.
+
+    Inserisce e cancella solo le differenze; restituisce (aggiunte, rimosse).
+    """
+    scope = set(scope)
+    current = {
+        tid
+        for (tid,) in db.query(models.TrainerAvailability.turno_id).filter(
+            models.TrainerAvailability.user_id == user_id,
+            models.TrainerAvailability.turno_id.in_(scope),
+            # le righe con available=False vanno riattivate da apply_changes
+            models.TrainerAvailability.available.is_(True),
+        )
+    }
+    wanted = turno_ids & scope
+    return apply_changes(
+        db,
+        [(user_id, tid, True) for tid in wanted - current]
+        + [(user_id, tid, False) for tid in current - wanted],
+    )
+
+
+def apply_changes(db: Session, changes: Iterable[Tuple[int, int, bool]]) -> Tuple[int, int]:
+    """Applica le celle ``(allenatore, turno, disponibile)`` modificate.
+
+    Le celle già nello stato richiesto vengono ignorate; restituisce
+    (righe inserite, righe cancellate).
+    """
+    changes = list(changes)
+    if not changes:
+        return 0, 0
+    table = models.TrainerAvailability.__table__
+    turno_ids = {turno_id for _, turno_id, _ in changes}
+    existing = {
+        (user_id, turno_id): available
+        for user_id, turno_id, available in db.query(
+            models.TrainerAvailability.user_id,
+            models.TrainerAvailability.turno_id,
+            models.TrainerAvailability.available,
+        ).filter(models.TrainerAvailability.turno_id.in_(turno_ids))
+    }
+    inserts, deletes, reactivate = [], [], []
+    for user_id, turno_id, available in changes:
+        key = (user_id, turno_id)
+        if available and key not in existing:
+            inserts.append({"user_id": user_id, "turno_id": turno_id, "available": True})
+            existing[key] = True
+        elif available and not existing[key]:
+            reactivate.append(key)
+            existing[key] = True
+        elif not available and key in existing:
+            deletes.append(key)
+            del existing[key]
+    if inserts:
+        db.execute(table.insert(), inserts)
+    for user_id, turno_id in reactivate:
+        db.execute(
+            table.update()
+            .where(table.c.user_id == user_id, table.c.turno_id == turno_id)
+            .values(available=True)
+        )
+    for user_id, turno_id in deletes:
+        db.execute(table.delete().where(table.c.user_id == user_id, table.c.turno_id == turno_id))
+    return len(inserts) + len(reactivate), len(deletes)
+
+
+def apply_assignments(db: Session, assignments: Iterable[Tuple[int, Optional[int]]]) -> int:
+    """Assegna (o libera, con ``None``) i turni indicati; restituisce i turni cambiati."""
+    table = models.Turno.__table__
+    changed = 0
+    for turno_id, user_id in assignments:
+        result = db.execute(
+            table.update()
+            .where(table.c.id == turno_id, table.c.user_id.is_distinct_from(user_id))
+            .values(user_id=user_id)
+        )
+        changed += result.rowcount
+    return changed
@@ -1,6 +1,7 @@
 from __future__ import annotations
-from typing import List, Optional, Tuple
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session, selectinload
 import models
 
 ALLOWED_PESI_CATEGORIES = [
@@ -30,3 +31,56 @@ def get_atleti_e_categorie(
     else:
         categorie = sorted({a.category for a in atleti if a.category != "N/D"})
     return atleti, categorie
+
+
+def atleti_per_categoria(
+    db: Session, categorie: Optional[List[str]] = None
+) -> Dict[str, List[models.User]]:
+    """Group athletes by category with two queries in total.
+
+    Mirrors ``User.category`` (a valid ``manual_category`` wins, otherwise the
+    solar age picks the first matching category by ``ordine``) without the
+    per-athlete ``Categoria`` lookups of the property.
+    """
+    all_categories = db.query(models.Categoria).order_by(models.Categoria.ordine).all()
+    names = {c.nome for c in all_categories}
+    atleti = (
+        db.query(models.User)
+        .join(models.User.roles)
+        .filter(models.Role.name == "atleta")
+        .options(selectinload(models.User.roles))
+        .order_by(models.User.last_name, models.User.first_name)
+        .all()
+    )
+    year = date.today().year
+    groups: Dict[str, List[models.User]] = {c: [] for c in (categorie or sorted(names))}
+    for atleta in atleti:
+        if atleta.manual_category in names:
+            nome = atleta.manual_category
+        elif atleta.date_of_birth:
+            age = year - atleta.date_of_birth.year
+            nome = next((c.nome for c in all_categories if c.eta_min <= age <= c.eta_max), None)
+        else:
+            nome = None
+        if nome in groups:
+            groups[nome].append(atleta)
+    return groups
+
+
+def atleti_pesi(
+    db: Session, categoria: Optional[str] = None
+) -> Tuple[List[models.User], List[str]]:
+    """Athletes of ``ALLOWED_PESI_CATEGORIES`` (only ``categoria`` if given).
+
+    Same result as filtering ``get_atleti_e_categorie`` on ``User.category``
+    but with two queries instead of one ``Categoria`` lookup per athlete.
+    """
+    gruppi = atleti_per_categoria(db, ALLOWED_PESI_CATEGORIES)
+    if categoria:
+        atleti = gruppi.get(categoria, [])
+    else:
+        atleti = sorted(
+            (a for gruppo in gruppi.values() for a in gruppo),
+            key=lambda a: (a.last_name or "", a.first_name or ""),
+        )
+    return atleti, ALLOWED_PESI_CATEGORIES
@@ -0,0 +1,161 @@
+"""Schede pesi: tabelle dei carichi per ripetizioni e salvataggio in blocco.
+
+I carichi a 5/7/10/20 ripetizioni si ricavano dal massimale (1RM) con la
+formula di Epley (``1RM = w * (1 + r / 30)``) o di Brzycki
+(``1RM = w * 36 / (37 - r)``), calcolate su array NumPy per tutti gli atleti
+ed esercizi insieme e arrotondate a 0,5 kg. Il salvataggio di una categoria
+intera è un unico ``INSERT ... ON CONFLICT DO UPDATE`` su ``schede_pesi``;
+i massimali salvati finiscono anche in ``massimali_storico`` (uno per giorno).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from services.users import atleti_per_categoria
+from utils.db import upsert
+
+# solo per i tipi; a runtime NumPy è importato dalle funzioni che lo usano
+if TYPE_CHECKING:
+    import numpy as np
+
+REPS = (5, 7, 10, 20)
+LOAD_COLUMNS = tuple(f"carico_{r}_rep" for r in REPS)
+FORMULAS = ("epley", "brzycki")
+LOAD_STEP = 0.5
+
+
+def rep_loads(massimali, formula: str = "epley", step: float = LOAD_STEP) -> np.ndarray:
+    """Carichi per ``REPS`` ripetizioni; aggiunge un ultimo asse di lunghezza ``len(REPS)``.
+
+    I massimali mancanti (``NaN``) restano ``NaN``.
+    """
+    import numpy as np
+    one_rm = np.asarray(massimali, dtype=float)
+    reps = np.asarray(REPS, dtype=float)
+    if formula == "epley":
+        factors = 1.0 / (1.0 + reps / 30.0)
+    elif formula == "brzycki":
+        factors = (37.0 - reps) / 36.0
+    else:
+        raise ValueError(f"Formula sconosciuta: {formula}")
+    return np.round(one_rm[..., None] * factors / step) * step
+
+
+@dataclass
+class ProgramGrid:
+    categoria: str
+    esercizi: List[models.EsercizioPesi]
+    atleti: List[models.User]
+    # (atleti, esercizi) e (atleti, esercizi, len(REPS)); NaN dove manca il valore
+    massimali: np.ndarray
+    carichi: np.ndarray
+
+    def to_dict(self) -> dict:
+        import numpy as np
+
+        def cell(v: float) -> Optional[float]:
+            return None if np.isnan(v) else float(v)
+
+        return {
+            "categoria": self.categoria,
+            "reps": list(REPS),
+            "esercizi": [{"id": e.id, "nome": e.nome} for e in self.esercizi],
+            "atleti": [
+                {
+                    "id": a.id,
+                    "nome": f"{a.first_name} {a.last_name}",
+                    "massimali": [cell(v) for v in self.massimali[i]],
+                    "carichi": [[cell(v) for v in row] for row in self.carichi[i]],
+                }
+                for i, a in enumerate(self.atleti)
+            ],
+        }
+
+
+def category_athletes(db: Session, categoria: str) -> List[models.User]:
+    return atleti_per_categoria(db, [categoria])[categoria]
+
+
+def load_grid(db: Session, categoria: str) -> ProgramGrid:
+    """Schede salvate di tutti gli atleti di ``categoria`` (tre query)."""
+    import numpy as np
+    esercizi = db.query(models.EsercizioPesi).order_by(models.EsercizioPesi.ordine).all()
+    atleti = category_athletes(db, categoria)
+    rows = {a.id: i for i, a in enumerate(atleti)}
+    cols = {e.id: j for j, e in enumerate(esercizi)}
+    massimali = np.full((len(atleti), len(esercizi)), np.nan)
+    carichi = np.full((len(atleti), len(esercizi), len(REPS)), np.nan)
+    if atleti and esercizi:
+        schede = db.query(models.SchedaPesi).filter(models.SchedaPesi.atleta_id.in_(rows))
+        for s in schede:
+            j = cols.get(s.esercizio_id)
+            if j is None:
+                continue
+            i = rows[s.atleta_id]
+            massimali[i, j] = np.nan if s.massimale is None else s.massimale
+            carichi[i, j] = [np.nan if v is None else v for v in (getattr(s, c) for c in LOAD_COLUMNS)]
+    return ProgramGrid(categoria, esercizi, atleti, massimali, carichi)
+
+
+def _to_db(value: float) -> Optional[float]:
+    import numpy as np
+    return None if np.isnan(value) else float(value)
+
+
+def save_program(
+    db: Session,
+    entries: Iterable[Tuple[int, int, Optional[float]]],
+    formula: str = "epley",
+    manual_loads: Optional[Dict[Tuple[int, int], Sequence[Optional[float]]]] = None,
+) -> int:
+    """Salva i massimali ``(atleta_id, esercizio_id, massimale)`` ricalcolando i carichi.
+
+    ``manual_loads`` permette di mantenere carichi inseriti a mano per alcune
+    coppie (i valori ``None`` vengono calcolati). Tutte le righe sono scritte
+    con un solo statement; restituisce quante. Il commit resta al chiamante.
+    """
+    import numpy as np
+    entries = list(entries)
+    if not entries:
+        return 0
+    massimali = np.array([np.nan if m is None else m for _, _, m in entries], dtype=float)
+    if np.any(massimali < 0):
+        raise ValueError("I massimali non possono essere negativi")
+    carichi = rep_loads(massimali, formula)
+    rows = []
+    for (atleta_id, esercizio_id, _), massimale, loads in zip(entries, massimali, carichi):
+        manual = (manual_loads or {}).get((atleta_id, esercizio_id)) or (None,) * len(REPS)
+        row = {"atleta_id": atleta_id, "esercizio_id": esercizio_id, "massimale": _to_db(massimale)}
+        for column, computed, value in zip(LOAD_COLUMNS, loads, manual):
+            row[column] = value if value is not None else _to_db(computed)
+        rows.append(row)
+    upsert(
+        db,
+        models.SchedaPesi.__table__,
+        rows,
+        index_elements=("atleta_id", "esercizio_id"),
+        update_columns=("massimale",) + LOAD_COLUMNS,
+    )
+    today = date.today()
+    upsert(
+        db,
+        models.MassimaleStorico.__table__,
+        [
+            {
+                "atleta_id": r["atleta_id"],
+                "esercizio_id": r["esercizio_id"],
+                "massimale": r["massimale"],
+                "recorded_at": today,
+            }
+            for r in rows
+            if r["massimale"] is not None
+        ],
+        index_elements=("atleta_id", "esercizio_id", "recorded_at"),
+        update_columns=("massimale",),
+    )
+    return len(rows)
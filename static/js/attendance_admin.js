@@ -1,9 +1,34 @@
+// Senza rete le modifiche finiscono nella coda offline (attendance_queue.js)
+// e vengono sincronizzate in seguito; il chiamante riceve { queued: true }.
+async function queueAttendance(trainingId, items, reason) {
+  await AttendanceQueue.enqueue(items.map(i => ({ training_id: trainingId, athlete_id: i.athlete_id, status: i.status, reason })));
+  AttendanceQueue.requestSync();
+  return { queued: true };
+}
+
+async function postOrQueue(url, payload, trainingId, items, reason) {
+  const canQueue = typeof AttendanceQueue !== 'undefined';
+  if (canQueue && !navigator.onLine) return { queued: queueAttendance(trainingId, items, reason) };
+  try {
+    return {
+      res: await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(payload)
+      })
+    };
+  } catch (err) {
+    if (canQueue && err instanceof TypeError) return { queued: queueAttendance(trainingId, items, reason) };
+    throw err;
+  }
+}
+
 async function setAttendance(trainingId, athleteId, status, reason) {
-  const res = await fetch(`/trainings/${trainingId}/attendance/${athleteId}`, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ status, reason })
-  });
+  const { res, queued } = await postOrQueue(
+    `/trainings/${trainingId}/attendance/${athleteId}`, { status, reason },
+    trainingId, [{ athlete_id: athleteId, status }], reason
+  );
+  if (queued) return queued;
   if (!res.ok) {
     const data = await res.json().catch(() => ({}));
     throw new Error(data.detail || 'Errore');
@@ -12,11 +37,10 @@ async function setAttendance(trainingId, athleteId, status, reason) {
 }
 
 async function bulkAttendance(trainingId, items, reason) {
-  const res = await fetch(`/trainings/${trainingId}/attendance/bulk`, {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ items, reason })
-  });
+  const { res, queued } = await postOrQueue(
+    `/trainings/${trainingId}/attendance/bulk`, { items, reason }, trainingId, items, reason
+  );
+  if (queued) return queued;
   if (!res.ok) {
     const data = await res.json().catch(() => ({}));
     throw new Error(data.detail || 'Errore');
@@ -0,0 +1,107 @@
+// Coda offline delle presenze.
+// Le modifiche fatte senza rete vengono salvate in IndexedDB e inviate in blocco a
+// /attendance/sync: dal service worker con Background Sync, oppure dalla pagina
+// quando torna la connessione. Lo script è caricato sia dalle pagine sia da sw.js.
+(function (scope) {
+  const DB_NAME = 'canottieri-offline';
+  const STORE = 'attendance-queue';
+  const SYNC_TAG = 'attendance-sync';
+  const ENDPOINT = '/attendance/sync';
+  const BATCH_SIZE = 500;
+
+  function openDb() {
+    return new Promise((resolve, reject) => {
+      const req = scope.indexedDB.open(DB_NAME, 1);
+      req.onupgradeneeded = () => req.result.createObjectStore(STORE, { keyPath: 'key' });
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+
+  async function withStore(mode, fn) {
+    const db = await openDb();
+    return new Promise((resolve, reject) => {
+      const tx = db.transaction(STORE, mode);
+      const result = fn(tx.objectStore(STORE));
+      tx.oncomplete = () => { db.close(); resolve(result && 'result' in result ? result.result : undefined); };
+      tx.onerror = () => { db.close(); reject(tx.error); };
+    });
+  }
+
+  function newKey() {
+    if (scope.crypto && scope.crypto.randomUUID) return scope.crypto.randomUUID();
+    return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+  }
+
+  async function enqueue(changes) {
+    const changedAt = new Date().toISOString();
+    const records = changes.map((c) => ({
+      key: newKey(),
+      training_id: String(c.training_id),
+      athlete_id: c.athlete_id,
+      status: c.status,
+      reason: c.reason || null,
+      changed_at: changedAt,
+    }));
+    await withStore('readwrite', (store) => { records.forEach((r) => store.put(r)); });
+    return records;
+  }
+
+  function pending() {
+    return withStore('readonly', (store) => store.getAll());
+  }
+
+  function remove(keys) {
+    return withStore('readwrite', (store) => { keys.forEach((k) => store.delete(k)); });
+  }
+
+  let flushing = null;
+
+  async function flushOnce() {
+    const results = [];
+    let items = await pending();
+    while (items.length) {
+      const batch = items.slice(0, BATCH_SIZE);
+      const res = await fetch(ENDPOINT, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ changes: batch }),
+      });
+      if (!res.ok) throw new Error(`Sincronizzazione presenze fallita (${res.status})`);
+      const data = await res.json();
+      // anche gli errori definitivi (allenamento cancellato) escono dalla coda
+      await remove(data.results.map((r) => r.key));
+      results.push(...data.results);
+      items = items.slice(BATCH_SIZE);
+    }
+    return results;
+  }
+
+  function flush() {
+    if (!flushing) flushing = flushOnce().finally(() => { flushing = null; });
+    return flushing;
+  }
+
+  async function requestSync() {
+    if (scope.navigator && scope.navigator.serviceWorker && 'SyncManager' in scope) {
+      try {
+        const reg = await scope.navigator.serviceWorker.ready;
+        await reg.sync.register(SYNC_TAG);
+        return;
+      } catch (err) {
+        // Background Sync non disponibile: si ritenta al ritorno della rete
+      }
+    }
+    if (scope.navigator && scope.navigator.onLine) flush().catch(() => undefined);
+  }
+
+  scope.AttendanceQueue = { SYNC_TAG, enqueue, pending, flush, requestSync };
+
+  if (typeof scope.document !== 'undefined') {
+    scope.addEventListener('online', () => flush().catch(() => undefined));
+    scope.addEventListener('load', () => {
+      if (scope.navigator.onLine) flush().catch(() => undefined);
+    });
+  }
+})(self);
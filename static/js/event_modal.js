@@ -48,6 +48,21 @@
     }
     if (addAthleteSelect) loadAthleteOptions();
 
+    // Le occorrenze delle serie ricorrenti (id "s<serie>-<data>") vengono
+    // salvate sul server solo alla prima modifica.
+    // Offline il riferimento resta quello dell'occorrenza: la coda delle presenze
+    // lo accetta e il server la materializza durante la sincronizzazione.
+    async function ensureTrainingId() {
+      if (currentTrainingId && !/^\d+$/.test(String(currentTrainingId))) {
+        if (!navigator.onLine) return currentTrainingId;
+        const res = await fetch(`/api/allenamenti/occurrences/${currentTrainingId}/materialize`, { method: 'POST' });
+        if (!res.ok) throw new Error('Allenamento non trovato');
+        currentTrainingId = String((await res.json()).id);
+        if (currentEventEl) currentEventEl.dataset.id = currentTrainingId;
+      }
+      return currentTrainingId;
+    }
+
     function updateButtons(status) {
       btnPresent.classList.remove('btn-success','btn-outline-success','active');
       btnAbsent.classList.remove('btn-danger','btn-outline-danger','active');
@@ -65,7 +80,7 @@
 
     btnPresent.addEventListener('click', async () => {
       try {
-        await toggleAttendance(currentTrainingId, 'present');
+        await toggleAttendance(await ensureTrainingId(), 'present');
         updateButtons('present');
         if (currentEventEl) currentEventEl.dataset.status = 'present';
       } catch (err) {
@@ -74,7 +89,7 @@
     });
     btnAbsent.addEventListener('click', async () => {
       try {
-        await toggleAttendance(currentTrainingId, 'absent');
+        await toggleAttendance(await ensureTrainingId(), 'absent');
         updateButtons('absent');
         if (currentEventEl) currentEventEl.dataset.status = 'absent';
       } catch (err) {
@@ -106,14 +121,33 @@
       }
     }
 
+    // aggiorna le righe in locale per le modifiche in attesa di sincronizzazione
+    function markQueued(items) {
+      items.forEach(item => {
+        const tr = attendanceTable.querySelector(`tbody tr[data-athlete-id="${item.athlete_id}"]`);
+        if (!tr) return;
+        tr.classList.remove('table-success', 'table-danger');
+        if (item.status === 'present') tr.classList.add('table-success');
+        if (item.status === 'absent') tr.classList.add('table-danger');
+        tr.querySelector('input.attSel').checked = false;
+        const badge = tr.querySelector('.badge');
+        badge.className = 'badge bg-warning text-dark';
+        badge.textContent = `${STATUS_LABELS[item.status] || item.status} (da sincronizzare)`;
+      });
+    }
+
     async function bulkUpdate(status) {
       if (!attendanceTable) return;
       const selected = [...attendanceTable.querySelectorAll('tbody input.attSel:checked')]
         .map(cb => ({ athlete_id: parseInt(cb.closest('tr').dataset.athleteId), status }));
       if (!selected.length) return;
       try {
-        await bulkAttendance(currentTrainingId, selected, null);
+        const result = await bulkAttendance(await ensureTrainingId(), selected, null);
         if (selectAll) selectAll.checked = false;
+        if (result.queued) {
+          markQueued(selected);
+          return;
+        }
         await loadAttendance(currentTrainingId);
       } catch (err) {
         alert(err.message);
@@ -182,10 +216,10 @@
         const id = parseInt(addAthleteSelect.value);
         if (!id) return;
         try {
-          await setAttendance(currentTrainingId, id, 'maybe');
+          const result = await setAttendance(await ensureTrainingId(), id, 'maybe');
           addAthleteSelect.value = '';
           if (selectAll) selectAll.checked = false;
-          await loadAttendance(currentTrainingId);
+          if (!result.queued) await loadAttendance(currentTrainingId);
         } catch (err) {
           alert(err.message);
         }
@@ -198,8 +232,9 @@
         const toAdd = selectedCategories.filter(c => !originalCategories.includes(c));
         const toRemove = originalCategories.filter(c => !selectedCategories.includes(c));
         try {
+          const trainingId = await ensureTrainingId();
           for (const c of [...toAdd, ...toRemove]) {
-            await toggleTrainingCategory(currentTrainingId, c);
+            await toggleTrainingCategory(trainingId, c);
           }
           originalCategories = [...selectedCategories];
           modalCategories.textContent = selectedCategories.join(', ') || '-';
@@ -1,15 +1,131 @@
-self.addEventListener('install', function(event) {
+// Service worker dell'app.
+// SW_VERSION e PRECACHE_URLS vengono anteposti dal server (vedi /sw.js in main.py):
+// la versione cambia ad ogni deploy che modifica gli asset statici.
+
+const STATIC_CACHE = `static-${SW_VERSION}`;
+const PAGES_CACHE = `pages-${SW_VERSION}`;
+const API_CACHE = `api-${SW_VERSION}`;
+const CURRENT_CACHES = [STATIC_CACHE, PAGES_CACHE, API_CACHE];
+
+// dati mostrati subito dalla cache e aggiornati in background
+const SWR_PATHS = ['/api/allenamenti', '/api/turni', '/api/agenda', '/api/training/types', '/api/all-categories', '/api/categories'];
+const API_MAX_AGE_MS = 24 * 60 * 60 * 1000;
+const API_MAX_ENTRIES = 60;
+const PAGES_MAX_ENTRIES = 30;
+const CACHED_AT_HEADER = 'sw-cached-at';
+
+importScripts('/static/js/attendance_queue.js');
+
+self.addEventListener('install', (event) => {
   event.waitUntil(
-    caches.open('app-cache').then(function(cache) {
-      return cache.addAll(['/']);
-    })
+    caches.open(STATIC_CACHE)
+      .then((cache) => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
   );
 });
 
-self.addEventListener('fetch', function(event) {
-  event.respondWith(
-    caches.match(event.request).then(function(response) {
-      return response || fetch(event.request);
-    })
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((keys) => Promise.all(keys.filter((key) => !CURRENT_CACHES.includes(key)).map((key) => caches.delete(key))))
+      .then(() => self.clients.claim())
   );
 });
+
+async function trimCache(cacheName, maxEntries) {
+  const cache = await caches.open(cacheName);
+  const keys = await cache.keys();
+  await Promise.all(keys.slice(0, Math.max(keys.length - maxEntries, 0)).map((key) => cache.delete(key)));
+}
+
+async function putWithTimestamp(cacheName, request, response) {
+  const headers = new Headers(response.headers);
+  headers.set(CACHED_AT_HEADER, String(Date.now()));
+  const body = await response.blob();
+  const cache = await caches.open(cacheName);
+  await cache.put(request, new Response(body, { status: response.status, statusText: response.statusText, headers }));
+}
+
+function isFresh(response) {
+  const cachedAt = Number(response.headers.get(CACHED_AT_HEADER) || 0);
+  return Date.now() - cachedAt < API_MAX_AGE_MS;
+}
+
+// Asset statici: cache-first (i nomi con hash non cambiano mai contenuto)
+async function cacheFirst(request) {
+  const cached = await caches.match(request);
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(STATIC_CACHE);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+// Pagine HTML: network-first, la cache serve solo senza rete
+async function networkFirst(request) {
+  try {
+    const response = await fetch(request);
+    if (response.ok && !response.redirected) {
+      const cache = await caches.open(PAGES_CACHE);
+      await cache.put(request, response.clone());
+      trimCache(PAGES_CACHE, PAGES_MAX_ENTRIES);
+    }
+    return response;
+  } catch (err) {
+    const cached = (await caches.match(request)) || (await caches.match('/'));
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+// Dati API: stale-while-revalidate con scadenza
+async function staleWhileRevalidate(event) {
+  const request = event.request;
+  const cached = await caches.match(request);
+  const network = fetch(request).then(async (response) => {
+    if (response.ok) {
+      await putWithTimestamp(API_CACHE, request, response.clone());
+      await trimCache(API_CACHE, API_MAX_ENTRIES);
+    }
+    return response;
+  });
+  if (cached && isFresh(cached)) {
+    event.waitUntil(network.catch(() => undefined));
+    return cached;
+  }
+  try {
+    return await network;
+  } catch (err) {
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+// presenze registrate offline (vedi attendance_queue.js)
+self.addEventListener('sync', (event) => {
+  if (event.tag === AttendanceQueue.SYNC_TAG) {
+    event.waitUntil(AttendanceQueue.flush());
+  }
+});
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname === '/logout') {
+    // i dati in cache appartengono all'utente che esce
+    event.waitUntil(Promise.all([caches.delete(API_CACHE), caches.delete(PAGES_CACHE)]));
+    return;
+  }
+  if (url.pathname.startsWith('/static/')) {
+    event.respondWith(cacheFirst(request));
+  } else if (SWR_PATHS.includes(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(event));
+  } else if (request.mode === 'navigate') {
+    event.respondWith(networkFirst(request));
+  }
+});
@@ -11,6 +11,9 @@ os.environ.setdefault("SECRET_KEY", "test-secret")
 
 from database import Base, get_db, engine, SessionLocal
 from main import app
+from routers.authentication import login_ip_limiter, login_user_limiter
+from services.cache_versions import versions as cache_versions
+from utils.cache import all_caches
 
 
 @pytest.fixture(autouse=True)
@@ -27,6 +30,12 @@ def override_dependencies():
             db.close()
 
     app.dependency_overrides[get_db] = _get_db
+    login_ip_limiter.reset()
+    login_user_limiter.reset()
+    # il database viene ricreato: le versioni ripartono da zero
+    for cache in all_caches().values():
+        cache.invalidate()
+    cache_versions.mark_stale()
     yield
     app.dependency_overrides.clear()
     Base.metadata.drop_all(bind=engine)
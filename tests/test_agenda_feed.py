@@ -0,0 +1,97 @@
+import json
+from datetime import date, time
+
+import pytest
+
+import models
+from tests import factories
+
+
+def _seed(db):
+    db.add_all(
+        [
+            models.Allenamento(tipo="Barca", data=date(2025, 5, 5), orario="17:00-18:30"),
+            models.Allenamento(tipo="Pesi", data=date(2025, 5, 6), orario="07:00-08:00"),
+            # fuori finestra: end è escluso
+            models.Allenamento(tipo="Barca", data=date(2025, 5, 12), orario="09:00-10:00"),
+            models.Turno(data=date(2025, 5, 5), fascia_oraria="Mattina"),
+            models.Turno(data=date(2025, 5, 6), fascia_oraria="Sera"),
+        ]
+    )
+    kind = models.ActivityType(name="Scuola")
+    db.add(kind)
+    db.flush()
+    db.add(
+        models.Activity(
+            title="Gita",
+            type_id=kind.id,
+            date=date(2025, 5, 5),
+            start_time=time(10),
+            end_time=time(12),
+            customer_name="Scuola Media",
+        )
+    )
+    db.commit()
+
+
+async def _login_admin(client, db):
+    factories.create_admin_user(db)
+    await client.post("/login", data={"username": "admin", "password": "password"})
+
+
+@pytest.mark.anyio
+async def test_feed_merges_sources_in_time_order(client, db_session):
+    _seed(db_session)
+    await _login_admin(client, db_session)
+    params = {"start": "2025-05-05", "end": "2025-05-12", "sources": ["allenamenti", "turni", "attivita"]}
+
+    res = await client.get("/api/agenda/feed", params=params)
+    assert res.status_code == 200
+    events = res.json()
+    assert [(e["source"], e["start"][:19]) for e in events] == [
+        ("turni", "2025-05-05T08:00:00"),
+        ("attivita", "2025-05-05T10:00:00"),
+        ("allenamenti", "2025-05-05T17:00:00"),
+        ("allenamenti", "2025-05-06T07:00:00"),
+        ("turni", "2025-05-06T17:00:00"),
+    ]
+
+    res = await client.get("/api/agenda/feed", params={**params, "format": "ndjson"})
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["start"] for line in res.text.splitlines()] == [e["start"] for e in events]
+
+    page = await client.get("/agenda")
+    assert "/api/agenda/feed?sources=allenamenti&sources=turni&sources=attivita" in page.text
+
+
+@pytest.mark.anyio
+async def test_feed_revalidates_per_source(client, db_session):
+    _seed(db_session)
+    await _login_admin(client, db_session)
+    params = {"start": "2025-05-01", "end": "2025-06-01", "sources": ["allenamenti", "turni"]}
+
+    res = await client.get("/api/agenda/feed", params=params)
+    tags = dict(part.split("=", 1) for part in res.headers["x-agenda-etags"].split(", "))
+    assert (await client.get("/api/agenda/feed", params=params, headers={"If-None-Match": res.headers["etag"]})).status_code == 304
+
+    db_session.add(models.Turno(data=date(2025, 5, 20), fascia_oraria="Sera"))
+    db_session.commit()
+    res = await client.get("/api/agenda/feed", params=params, headers={"If-None-Match": ", ".join(tags.values())})
+    assert res.status_code == 200
+    assert res.headers["x-agenda-unchanged"] == "allenamenti"
+    assert {e["source"] for e in res.json()} == {"turni"}
+    assert len(res.json()) == 3
+
+
+@pytest.mark.anyio
+async def test_feed_rejects_unbounded_or_forbidden_requests(client, db_session):
+    role = factories.create_role(db_session, "atleta")
+    factories.create_user(db_session, username="atleta", roles=[role])
+    await client.post("/login", data={"username": "atleta", "password": "password"})
+
+    assert (await client.get("/api/agenda/feed", params={"start": "2025-05-01"})).status_code == 422
+    assert (await client.get("/api/agenda/feed", params={"start": "2025-05-01", "end": "2027-05-01"})).status_code == 400
+    res = await client.get("/api/agenda/feed", params={"start": "2025-05-01", "end": "2025-06-01", "sources": "turni"})
+    assert res.status_code == 403
+    res = await client.get("/api/agenda/feed", params={"start": "2025-05-01", "end": "2025-06-01"})
+    assert res.status_code == 200
@@ -237,3 +237,88 @@ async def test_update_training_categories(client, db_session):
     assert training.tipo == "Updated"
     assert training.data == new_date
     assert cat2 in training.categories
+
+
+@pytest.mark.anyio
+async def test_attendance_sync_batch_is_idempotent_and_last_writer_wins(client, db_session):
+    from services.recurrence import create_series
+
+    atleta_role = factories.create_role(db_session, "atleta")
+    coach_role = factories.create_role(db_session, "allenatore")
+    factories.create_user(db_session, username="coach", roles=[coach_role])
+    a1 = factories.create_user(db_session, username="a1", roles=[atleta_role])
+    a2 = factories.create_user(db_session, username="a2", roles=[atleta_role])
+    training = models.Allenamento(tipo="Barca", data=date(2025, 9, 1), orario="08:00-10:00")
+    series = create_series(
+        db_session, tipo="Barca", descrizione=None, orario="08:00-10:00",
+        weekdays=[2], start_date=date(2025, 9, 3), count=4,
+    )
+    db_session.add(training)
+    db_session.add(models.Attendance(
+        training=training, athlete_id=a2.id, status=models.AttendanceStatus.present,
+        last_changed_at=datetime(2025, 9, 1, 9, 0),
+    ))
+    db_session.commit()
+
+    await client.post("/login", data={"username": "coach", "password": "password"})
+    changes = [
+        {"key": "k1", "training_id": str(training.id), "athlete_id": a1.id, "status": "present",
+         "changed_at": "2025-09-01T08:05:00Z"},
+        {"key": "k2", "training_id": str(training.id), "athlete_id": a1.id, "status": "absent",
+         "changed_at": "2025-09-01T08:10:00Z"},
+        {"key": "k3", "training_id": str(training.id), "athlete_id": a2.id, "status": "absent",
+         "changed_at": "2025-09-01T08:00:00Z"},
+        {"key": "k4", "training_id": f"s{series.id}-2025-09-10", "athlete_id": a1.id, "status": "present",
+         "changed_at": "2025-09-10T08:00:00+02:00"},
+        {"key": "k5", "training_id": "999", "athlete_id": a1.id, "status": "present",
+         "changed_at": "2025-09-01T08:00:00Z"},
+    ]
+    res = await client.post("/attendance/sync", json={"changes": changes})
+    assert res.status_code == 200
+    results = {r["key"]: r for r in res.json()["results"]}
+    assert [results[k]["result"] for k in ("k1", "k2", "k3", "k4", "k5")] == [
+        "applied", "applied", "stale", "applied", "error",
+    ]
+
+    db_session.expire_all()
+    assert compute_status_for_athlete(db_session, training.id, a1.id) == models.AttendanceStatus.absent
+    assert compute_status_for_athlete(db_session, training.id, a2.id) == models.AttendanceStatus.present
+    override_id = results["k4"]["training_id"]
+    assert db_session.get(models.Allenamento, override_id).series_id == series.id
+    assert db_session.query(models.AttendanceChangeLog).count() == 3
+
+    res = await client.post("/attendance/sync", json={"changes": changes[:2]})
+    assert [r["result"] for r in res.json()["results"]] == ["duplicate", "duplicate"]
+    assert db_session.query(models.AttendanceChangeLog).count() == 3
+
+
+@pytest.mark.anyio
+async def test_attendance_sync_concurrent_replay_reports_duplicate(client, db_session, monkeypatch):
+    from services import attendance_service
+
+    coach_role = factories.create_role(db_session, "allenatore")
+    factories.create_user(db_session, username="coach", roles=[coach_role])
+    athlete = factories.create_user(db_session, username="a1", roles=[factories.create_role(db_session, "atleta")])
+    training = models.Allenamento(tipo="Barca", data=date(2025, 9, 1), orario="08:00-10:00")
+    db_session.add(training)
+    db_session.commit()
+    await client.post("/login", data={"username": "coach", "password": "password"})
+    changes = [{"key": "k1", "training_id": str(training.id), "athlete_id": athlete.id, "status": "absent",
+                "changed_at": "2025-09-01T08:05:00Z"}]
+    assert (await client.post("/attendance/sync", json={"changes": changes})).status_code == 200
+
+    # il replay concorrente non vede ancora la chiave al primo controllo
+    real_seen = attendance_service._seen_keys
+    calls = []
+
+    def racing_seen(db, keys):
+        calls.append(keys)
+        return set() if len(calls) == 1 else real_seen(db, keys)
+
+    monkeypatch.setattr(attendance_service, "_seen_keys", racing_seen)
+    res = await client.post("/attendance/sync", json={"changes": changes})
+    assert res.status_code == 200
+    assert [r["result"] for r in res.json()["results"]] == ["duplicate"]
+    assert len(calls) == 2
+    db_session.expire_all()
+    assert db_session.query(models.AttendanceChangeLog).count() == 1
@@ -46,3 +46,33 @@ async def test_account_lockout_after_failed_attempts(client, db_session):
 
     res = await client.post("/login", data={"username": "test", "password": "new"})
     assert res.status_code == 303
+
+
+def test_token_bucket_refills_over_time():
+    from utils.rate_limit import TokenBucketLimiter
+
+    now = [0.0]
+    limiter = TokenBucketLimiter(capacity=2, refill_rate=0.5, clock=lambda: now[0])
+    assert limiter.acquire("ip") == 0
+    assert limiter.acquire("ip") == 0
+    assert limiter.acquire("ip") == pytest.approx(2.0)
+    assert limiter.acquire("other") == 0
+    now[0] = 2.0
+    assert limiter.acquire("ip") == 0
+    assert limiter.acquire("ip") > 0
+
+
+@pytest.mark.anyio
+async def test_login_is_throttled_per_username(client, db_session):
+    from routers.authentication import login_user_limiter
+
+    for _ in range(int(login_user_limiter.capacity)):
+        res = await client.post("/login", data={"username": "ghost", "password": "x"})
+        assert res.status_code == 401
+    res = await client.post("/login", data={"username": "Ghost", "password": "x"})
+    assert res.status_code == 429
+    assert int(res.headers["retry-after"]) >= 1
+    assert "Troppi tentativi" in res.text
+    # un altro username dallo stesso IP non è bloccato
+    res = await client.post("/login", data={"username": "other", "password": "x"})
+    assert res.status_code == 401
@@ -34,6 +34,37 @@ async def test_export_turni(client, db_session):
     assert title.replace(" ", "%20") in r_xlsx.headers["content-disposition"]
 
 
+@pytest.mark.anyio
+async def test_export_turni_date_range(client, db_session):
+    from io import BytesIO
+    from openpyxl import load_workbook
+
+    role = factories.create_role(db_session, "allenatore")
+    coach = factories.create_user(db_session, roles=[role], first_name="Mario", last_name="Rossi")
+    db_session.add_all(
+        [
+            models.Turno(data=date(2023, 11, 5), fascia_oraria="Mattina", user_id=coach.id),
+            models.Turno(data=date(2024, 2, 10), fascia_oraria="Sera"),
+            models.Turno(data=date(2024, 6, 1), fascia_oraria="Sera"),
+        ]
+    )
+    db_session.commit()
+    app.dependency_overrides[get_current_admin_or_coach_user] = lambda: coach
+    params = {"start": "2023-10-01", "end": "2024-03-31"}
+    r_csv = await client.get("/turni/export/csv", params=params)
+    assert r_csv.status_code == 200
+    lines = r_csv.text.splitlines()
+    assert lines[0] == "Turni aperture Canottieri 2023-10-01 - 2024-03-31"
+    assert len(lines) == 4
+    assert "Mario Rossi" in lines[2]
+    r_xlsx = await client.get("/turni/export/excel", params=params)
+    ws = load_workbook(BytesIO(r_xlsx.content)).active
+    rows = list(ws.iter_rows(values_only=True))
+    assert [r[1] for r in rows[2:]] == ["2023-11-05", "2024-02-10"]
+    r_bad = await client.get("/turni/export/csv", params={"start": "2024-03-01", "end": "2024-01-01"})
+    assert r_bad.status_code == 400
+
+
 @pytest.mark.anyio
 async def test_availability_overwrite_and_api(client, db_session):
     coach_role = factories.create_role(db_session, "allenatore")
@@ -76,3 +107,78 @@ async def test_availability_overwrite_and_api(client, db_session):
     data = events.json()
     event = next(e for e in data if e["id"] == t2.id)
     assert coach.id in event["extendedProps"]["available_ids"]
+
+
+def test_bitset_roundtrip():
+    from services.turni_matrix import pack_bits, unpack_bits
+
+    encoded = pack_bits([0, 9, 59], 60)
+    assert len(encoded) == 12  # 8 byte
+    assert unpack_bits(encoded, 60) == [0, 9, 59]
+
+
+@pytest.mark.anyio
+async def test_availability_matrix_and_diff_save(client, db_session):
+    from dependencies import get_current_admin_user
+    from services.turni_matrix import unpack_bits
+
+    coach_role = factories.create_role(db_session, "allenatore")
+    anna = factories.create_user(db_session, username="anna", roles=[coach_role], first_name="Anna")
+    luca = factories.create_user(db_session, username="luca", roles=[coach_role], first_name="Luca")
+    turni = [
+        models.Turno(data=date(2025, 3, day), fascia_oraria=fascia)
+        for day in (1, 2)
+        for fascia in ("Mattina", "Sera")
+    ]
+    db_session.add_all(turni + [models.Turno(data=date(2025, 4, 1), fascia_oraria="Sera")])
+    db_session.flush()
+    turni[3].user_id = luca.id
+    db_session.add(models.TrainerAvailability(user_id=anna.id, turno_id=turni[1].id, available=True))
+    db_session.commit()
+    app.dependency_overrides[get_current_admin_user] = lambda: anna
+
+    res = await client.get("/api/turni/matrice", params={"year": 2025, "month": 3})
+    matrix = res.json()
+    assert matrix["turni"] == [t.id for t in turni]
+    assert matrix["coaches"] == [anna.id, luca.id]
+    assert unpack_bits(matrix["available"][0], 4) == [1]
+    assert unpack_bits(matrix["assigned"][1], 4) == [3]
+
+    res = await client.post(
+        "/api/turni/matrice",
+        json={
+            "availability": [
+                {"coach_id": anna.id, "turno_id": turni[1].id, "available": True},
+                {"coach_id": anna.id, "turno_id": turni[2].id, "available": True},
+                {"coach_id": luca.id, "turno_id": turni[0].id, "available": False},
+            ],
+            "assignments": [{"turno_id": turni[3].id, "coach_id": None}, {"turno_id": turni[0].id, "coach_id": anna.id}],
+        },
+    )
+    assert res.json() == {"added": 1, "removed": 0, "assigned": 2}
+    matrix = (await client.get("/api/turni/matrice", params={"year": 2025, "month": 3})).json()
+    assert unpack_bits(matrix["available"][0], 4) == [1, 2]
+    assert unpack_bits(matrix["assigned"][0], 4) == [0]
+    assert unpack_bits(matrix["assigned"][1], 4) == []
+
+    res = await client.post(
+        "/api/turni/matrice",
+        json={"availability": [{"coach_id": 999, "turno_id": turni[0].id, "available": True}]},
+    )
+    assert res.status_code == 400
+
+
+def test_set_availability_reactivates_false_rows(db_session):
+    from services.turni_matrix import set_availability
+
+    coach = factories.create_user(db_session, username="coach", roles=[factories.create_role(db_session, "allenatore")])
+    turni = [models.Turno(data=date(2025, 6, d), fascia_oraria="Mattina") for d in (2, 3)]
+    db_session.add_all(turni)
+    db_session.flush()
+    db_session.add(models.TrainerAvailability(user_id=coach.id, turno_id=turni[0].id, available=False))
+    db_session.commit()
+
+    assert set_availability(db_session, coach.id, {turni[0].id}, [t.id for t in turni]) == (1, 0)
+    db_session.commit()
+    rows = db_session.query(models.TrainerAvailability.turno_id, models.TrainerAvailability.available).all()
+    assert rows == [(turni[0].id, True)]
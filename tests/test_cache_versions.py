@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import delete, select
+
+import models
+from database import engine
+from services.cache_versions import CacheVersions
+from tests.factories import create_categoria
+
+
+def _version(db, entity):
+    row = db.get(models.CacheVersion, entity)
+    return row.version if row else 0
+
+
+def test_writes_bump_versions_after_commit(db_session):
+    other_worker = CacheVersions(engine, poll_interval=3600)
+    assert other_worker.get("categorie") == 0
+
+    create_categoria(db_session, "Junior", 17, 18, 1)
+    assert _version(db_session, "categorie") == 1
+
+    categoria = db_session.query(models.Categoria).one()
+    categoria.nome = "Senior"
+    db_session.rollback()
+    assert _version(db_session, "categorie") == 1
+
+    db_session.execute(delete(models.Allenamento).where(models.Allenamento.id == -1))
+    db_session.commit()
+    assert _version(db_session, "allenamenti") == 1
+
+    # un altro worker vede la modifica solo alla scadenza del polling
+    assert other_worker.get("categorie") == 0
+    other_worker.poll_interval = 0
+    assert other_worker.get("categorie") == 1
+
+
+def test_bump_does_not_lock_inside_write_transaction(db_session):
+    create_categoria(db_session, "Junior", 17, 18, 1)
+    categoria = db_session.query(models.Categoria).one()
+    categoria.nome = "Senior"
+    db_session.flush()
+    # la transazione di scrittura non ha toccato cache_versions
+    with engine.connect() as conn:
+        version = conn.execute(
+            select(models.CacheVersion.version).where(models.CacheVersion.entity == "categorie")
+        ).scalar_one()
+    assert version == 1
+    db_session.commit()
+    assert _version(db_session, "categorie") == 2
+
+
+def test_unchanged_objects_do_not_bump(db_session):
+    create_categoria(db_session, "Junior", 17, 18, 1)
+    categoria = db_session.query(models.Categoria).one()
+    categoria.nome = "Junior"
+    db_session.commit()
+    assert _version(db_session, "categorie") == 1
+
+
+@pytest.mark.anyio
+async def test_cached_categories_follow_writes(client, db_session):
+    create_categoria(db_session, "Junior", 17, 18, 1)
+    res = await client.get("/api/all-categories")
+    assert [c["name"] for c in res.json()] == ["Junior"]
+
+    create_categoria(db_session, "Senior", 24, 27, 2)
+    res = await client.get("/api/all-categories")
+    assert [c["name"] for c in res.json()] == ["Junior", "Senior"]
@@ -0,0 +1,74 @@
+import pytest
+
+import models
+from services import athletes_service
+from tests import factories
+
+
+def _boat_with_athletes(db, n=4):
+    role = factories.create_role(db, "atleta")
+    atleti = [
+        factories.create_user(db, username=f"a{i}", roles=[role], last_name=f"L{i}") for i in range(n)
+    ]
+    barca = models.Barca(nome="Aurora", tipo="2x", atleti_assegnati=atleti)
+    db.add(barca)
+    db.commit()
+    return barca, atleti
+
+
+def test_seat_accessors_write_crew_seats(db_session):
+    barca, (a, b, c, _) = _boat_with_athletes(db_session)
+    equipaggio = athletes_service.create_equipaggio(
+        db_session, {"nome": "E1", "barca_id": barca.id, "capovoga_id": a.id, "prodiere_id": b.id}
+    )
+    seats = {(s.posto, s.user_id) for s in db_session.query(models.CrewSeat)}
+    assert seats == {("capovoga", a.id), ("prodiere", b.id)}
+    assert equipaggio.capovoga.id == a.id and equipaggio.secondo_id is None
+
+    athletes_service.update_equipaggio(db_session, equipaggio.id, {"prodiere_id": c.id})
+    assert equipaggio.prodiere.id == c.id
+    assert db_session.query(models.CrewSeat).count() == 2
+    assert [e.id for e in athletes_service.get_equipaggi_by_atleta(db_session, c.id)] == [equipaggio.id]
+    assert athletes_service.get_equipaggi_by_atleta(db_session, b.id) == []
+
+    athletes_service.delete_equipaggio(db_session, equipaggio.id)
+    assert db_session.query(models.CrewSeat).count() == 0
+
+
+def test_available_athletes_for_all_seats(db_session):
+    barca, (a, b, c, d) = _boat_with_athletes(db_session)
+    d.is_suspended = True
+    db_session.commit()
+    e1 = athletes_service.create_equipaggio(
+        db_session, {"nome": "E1", "barca_id": barca.id, "capovoga_id": a.id, "prodiere_id": b.id}
+    )
+    posti = barca.get_posti_richiesti()
+
+    disponibili = athletes_service.get_atleti_disponibili_per_posti(db_session, barca.id, posti)
+    assert {p: [u.id for u in us] for p, us in disponibili.items()} == {
+        "capovoga": [b.id, c.id],
+        "prodiere": [a.id, c.id],
+    }
+    # modificando E1 i suoi posti tornano liberi
+    disponibili = athletes_service.get_atleti_disponibili_per_posti(db_session, barca.id, posti, e1.id)
+    assert [u.id for u in disponibili["capovoga"]] == [a.id, b.id, c.id]
+    assert [u.id for u in athletes_service.get_atleti_disponibili_for_posto(db_session, barca.id, "prodiere")] == [
+        a.id,
+        c.id,
+    ]
+
+
+@pytest.mark.anyio
+async def test_crew_form_renders(client, db_session):
+    barca, (a, *_rest) = _boat_with_athletes(db_session)
+    factories.create_admin_user(db_session)
+    await client.post("/login", data={"username": "admin", "password": "password"})
+    res = await client.post(
+        f"/risorse/barche/{barca.id}/equipaggi/nuovo", data={"nome": "E1", "capovoga_id": a.id}
+    )
+    assert res.status_code == 303
+    equipaggio = db_session.query(models.Equipaggio).one()
+    res = await client.get(f"/risorse/equipaggi/{equipaggio.id}/modifica")
+    assert res.status_code == 200
+    res = await client.get(f"/risorse/barche/{barca.id}/equipaggi")
+    assert res.status_code == 200
@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+
+import pytest
+
+import models
+from services.deadlines import deadline_digest, deadlines_between
+from tests import factories
+
+
+def _populate(db, today):
+    user = factories.create_user(db, username="mario", first_name="Mario", last_name="Rossi")
+    user.certificate_expiration = today + timedelta(days=10)
+    qualifica = models.QualificationType(name="Patente nautica")
+    db.add_all(
+        [
+            models.Furgone(
+                marca="Ford", modello="Transit", targa="AB123CD", anno=2019,
+                scadenza_bollo=today - timedelta(days=5), scadenza_rca=today + timedelta(days=60),
+                scadenza_revisione=today + timedelta(days=400),
+            ),
+            models.Gommone(nome="Zodiac", scadenza_manutenzione=today + timedelta(days=30)),
+            qualifica,
+        ]
+    )
+    db.flush()
+    db.add(models.UserQualification(user_id=user.id, qualification_type_id=qualifica.id,
+                                    expiry_date=today + timedelta(days=20)))
+    db.commit()
+    return user
+
+
+def test_deadlines_between_unions_all_sources(db_session):
+    today = date.today()
+    _populate(db_session, today)
+    scadenze = deadlines_between(db_session, today, today + timedelta(days=90))
+    assert [(s.tipo, s.voce, (s.data - today).days) for s in scadenze] == [
+        ("certificato", "Certificato medico", 10),
+        ("qualifica", "Patente nautica", 20),
+        ("gommone", "Manutenzione", 30),
+        ("furgone", "RCA", 60),
+    ]
+    assert scadenze[3].nome == "Ford Transit (AB123CD)"
+    assert scadenze[0].nome == "Mario Rossi"
+    assert deadlines_between(db_session, today, today - timedelta(days=1)) == []
+
+
+def test_digest_is_cached_until_a_write(db_session):
+    today = date.today()
+    user = _populate(db_session, today)
+    digest = deadline_digest(db_session)
+    assert [s.voce for s in digest["scadute"]["items"]] == ["Bollo"]
+    assert [s.tipo for s in digest["entro_30"]["items"]] == ["certificato", "qualifica", "gommone"]
+    assert [s.voce for s in digest["entro_90"]["items"]] == ["RCA"]
+    assert deadline_digest(db_session) is digest
+
+    user.certificate_expiration = today + timedelta(days=200)
+    db_session.commit()
+    digest = deadline_digest(db_session)
+    assert [s.tipo for s in digest["entro_30"]["items"]] == ["qualifica", "gommone"]
+
+
+@pytest.mark.anyio
+async def test_admin_dashboard_and_range_endpoint(client, db_session):
+    today = date.today()
+    _populate(db_session, today)
+    factories.create_admin_user(db_session)
+    await client.post("/login", data={"username": "admin", "password": "password"})
+
+    res = await client.get("/dashboard")
+    assert res.status_code == 200
+    assert "Ford Transit (AB123CD) &middot; Bollo" in res.text
+
+    res = await client.get(
+        "/mezzi/scadenze", params={"dal": today.isoformat(), "al": (today + timedelta(days=25)).isoformat()}
+    )
+    assert [s["tipo"] for s in res.json()] == ["certificato", "qualifica"]
+    assert res.json()[1]["url"] == f"/admin/users/{res.json()[1]['ref_id']}"
+    res = await client.get("/mezzi/scadenze", params={"dal": today.isoformat(), "al": "2000-01-01"})
+    assert res.status_code == 422
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+import pytest
+
+import models
+from services import engine_hours
+from tests import factories
+
+
+def _log(db, gommone, coach, day, hours):
+    db.add(models.GommoneOre(gommone_id=gommone.id, allenatore_id=coach.id, data_utilizzo=day, ore_utilizzo=hours))
+
+
+def _setup(db):
+    role = factories.create_role(db, "allenatore")
+    anna = factories.create_user(db, username="anna", roles=[role], first_name="Anna", last_name="Bianchi")
+    luca = factories.create_user(db, username="luca", roles=[role], first_name="Luca", last_name="Verdi")
+    gommone = models.Gommone(nome="Selva", motore="Selva 20CV")
+    db.add(gommone)
+    db.flush()
+    return gommone, anna, luca
+
+
+def test_forecast_uses_recent_rate():
+    today = date(2025, 10, 1)
+    assert engine_hours.forecast(95.0, 9.0, today) == (100.0, 5.0, date(2025, 11, 20))
+    assert engine_hours.forecast(100.0, 0.0, today) == (200.0, 100.0, None)
+
+
+def test_aggregates_and_running_totals(db_session):
+    gommone, anna, luca = _setup(db_session)
+    _log(db_session, gommone, anna, date(2025, 1, 10), 2.0)
+    _log(db_session, gommone, luca, date(2025, 1, 20), 1.5)
+    _log(db_session, gommone, anna, date(2025, 3, 5), 3.0)
+    db_session.commit()
+
+    assert engine_hours.hours_by_coach(db_session, gommone.id) == [
+        {"allenatore": "Anna Bianchi", "ore": 5.0, "utilizzi": 2},
+        {"allenatore": "Luca Verdi", "ore": 1.5, "utilizzi": 1},
+    ]
+    assert engine_hours.hours_by_month(db_session, gommone.id) == [
+        {"mese": "2025-01", "ore": 3.5, "utilizzi": 2, "progressivo": 3.5},
+        {"mese": "2025-03", "ore": 3.0, "utilizzi": 1, "progressivo": 6.5},
+    ]
+    usage = engine_hours.usage_for(db_session, gommone.id, today=date(2025, 4, 15))
+    assert (usage.ore_totali, usage.utilizzi, usage.ultimo_utilizzo) == (6.5, 3, date(2025, 3, 5))
+    # ultimi 90 giorni: 1.5 + 3.0 ore
+    assert usage.ore_recenti == 4.5
+    assert usage.tagliando_previsto == date(2025, 4, 15) + timedelta(days=1870)
+
+
+@pytest.mark.anyio
+async def test_new_log_entry_refreshes_cached_totals(client, db_session):
+    gommone, anna, _ = _setup(db_session)
+    _log(db_session, gommone, anna, date.today(), 2.0)
+    db_session.commit()
+    factories.create_admin_user(db_session)
+    await client.post("/login", data={"username": "admin", "password": "password"})
+
+    res = await client.get(f"/mezzi/gommone/{gommone.id}/ore/report")
+    assert res.json()["ore_totali"] == 2.0
+    res = await client.post(
+        f"/mezzi/gommone/{gommone.id}/ore",
+        data={"data_utilizzo": date.today().isoformat(), "ore_utilizzo": "1.5"},
+    )
+    assert res.status_code == 303
+    report = (await client.get(f"/mezzi/gommone/{gommone.id}/ore/report")).json()
+    assert (report["ore_totali"], report["utilizzi"]) == (3.5, 2)
+    assert [c["ore"] for c in report["per_allenatore"]] == [2.0, 1.5]
+
+    for url in (f"/mezzi/gommone/{gommone.id}", f"/mezzi/gommone/{gommone.id}/ore", "/mezzi/?tipo_filter=gommoni"):
+        res = await client.get(url)
+        assert res.status_code == 200, url
+    assert "Ore motore: 3.5" in res.text
@@ -1,3 +1,5 @@
+import re
+
 import pytest
 
 
@@ -9,3 +11,38 @@ async def test_health_endpoints(client):
 
     res_head = await client.head("/health")
     assert res_head.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_health_ready_pings_database(client, monkeypatch):
+    res = await client.get("/health/ready")
+    assert res.status_code == 200
+    assert res.json() == {"status": "ok", "database": "ok"}
+
+    import main
+
+    def _down():
+        raise RuntimeError("connection refused")
+
+    monkeypatch.setattr(main, "_ping_database", _down)
+    res = await client.get("/health/ready")
+    assert res.status_code == 503
+    assert res.json()["database"] == "unavailable"
+
+
+@pytest.mark.anyio
+async def test_metrics_exposes_latency_pool_and_caches(client):
+    await client.get("/api/all-categories")
+    res = await client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = res.text
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/api/all-categories",status="200"}'
+        in body
+    )
+    assert 'le="+Inf"' in body
+    assert "http_requests_in_flight 1" in body
+    assert "db_pool_checked_out" in body
+    assert 'cache_hit_ratio{cache="measurement_bands"}' in body
+    assert int(re.search(r"^db_queries_total (\d+)$", body, re.M).group(1)) > 0
@@ -0,0 +1,130 @@
+import gzip
+import os
+from datetime import date, datetime, time
+
+import pytest
+
+import models
+from services import log_archive
+from tests import factories
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_archive, "ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _seed(db):
+    role = factories.create_role(db, "atleta")
+    athlete = factories.create_user(db, username="atleta", roles=[role])
+    training = models.Allenamento(tipo="Barca", data=date(2024, 1, 10), orario="17:00-18:00")
+    db.add(training)
+    db.flush()
+    attendance = models.Attendance(training_id=training.id, athlete_id=athlete.id)
+    db.add(attendance)
+    db.flush()
+    for when, status in [
+        (datetime(2024, 1, 5, 10), models.AttendanceStatus.present),
+        (datetime(2024, 1, 9, 18), models.AttendanceStatus.absent),
+        (datetime(2024, 3, 2, 9), models.AttendanceStatus.present),
+        (datetime(2025, 2, 1, 9), models.AttendanceStatus.absent),
+    ]:
+        db.add(
+            models.AttendanceChangeLog(
+                attendance_id=attendance.id,
+                new_status=status,
+                source=models.AttendanceSource.coach,
+                created_at=when,
+            )
+        )
+    kind = models.ActivityType(name="Scuola")
+    db.add(kind)
+    db.flush()
+    activity = models.Activity(
+        title="Gita", type_id=kind.id, date=date(2024, 1, 20),
+        start_time=time(10), end_time=time(12), customer_name="Scuola",
+    )
+    db.add(activity)
+    db.flush()
+    db.add(models.ActivityAudit(activity_id=activity.id, user_id=athlete.id, action="create", timestamp=datetime(2024, 1, 15)))
+    db.commit()
+    return training, athlete, activity
+
+
+def test_dry_run_counts_without_moving(db_session, archive_dir):
+    _seed(db_session)
+    results = log_archive.archive(db_session, months=12, dry_run=True, today=date(2025, 4, 15))
+    assert [(r.kind, r.month, r.rows) for r in results] == [
+        ("attendance_changes", "2024-01", 2),
+        ("attendance_changes", "2024-03", 1),
+        ("activity_audits", "2024-01", 1),
+    ]
+    assert db_session.query(models.AttendanceChangeLog).count() == 4
+    assert not os.listdir(archive_dir)
+
+
+def test_archive_moves_rows_and_history_reads_them(db_session, archive_dir):
+    training, athlete, activity = _seed(db_session)
+    results = log_archive.archive(db_session, months=12, today=date(2025, 4, 15))
+    assert sum(r.rows for r in results) == 4
+    assert db_session.query(models.AttendanceChangeLog).count() == 1
+    assert db_session.query(models.ActivityAudit).count() == 0
+    assert log_archive.verify(db_session) == []
+
+    hot = log_archive.attendance_history(db_session, training.id, athlete.id)
+    assert [c["new_status"] for c in hot] == ["absent"]
+    full = log_archive.attendance_history(db_session, training.id, athlete.id, include_archived=True)
+    assert [c["created_at"][:10] for c in full] == ["2024-01-05", "2024-01-09", "2024-03-02", "2025-02-01"]
+    assert [a["action"] for a in log_archive.activity_audit_history(db_session, activity.id, True)] == ["create"]
+
+    # un log tardivo dello stesso mese viene fuso nell'archivio esistente
+    db_session.add(
+        models.AttendanceChangeLog(
+            attendance_id=db_session.query(models.Attendance.id).scalar(),
+            new_status=models.AttendanceStatus.maybe,
+            source=models.AttendanceSource.system,
+            created_at=datetime(2024, 1, 31, 23),
+        )
+    )
+    db_session.commit()
+    log_archive.archive(db_session, months=12, today=date(2025, 4, 15))
+    entry = db_session.query(models.LogArchive).filter_by(kind="attendance_changes", month="2024-01").one()
+    assert entry.rows == 3
+    assert len(os.listdir(archive_dir / "attendance_changes")) == 2
+    assert log_archive.verify(db_session) == []
+
+    path = archive_dir / entry.path
+    path.write_bytes(gzip.compress(b'{"id":1}\n'))
+    assert log_archive.verify(db_session) == [f"attendance_changes 2024-01: Checksum non valido per {entry.path}"]
+
+
+@pytest.mark.anyio
+async def test_history_endpoint_includes_archived_months_on_request(client, db_session, archive_dir):
+    training, athlete, _ = _seed(db_session)
+    log_archive.archive(db_session, months=12, today=date(2025, 4, 15))
+    factories.create_admin_user(db_session)
+    await client.post("/login", data={"username": "admin", "password": "password"})
+
+    url = f"/trainings/{training.id}/attendance/{athlete.id}/history"
+    assert len((await client.get(url)).json()["changes"]) == 1
+    changes = (await client.get(url, params={"include_archived": "true"})).json()["changes"]
+    assert [c.get("archived", False) for c in changes] == [True, True, True, False]
+
+
+def test_orphaned_logs_are_archived(db_session, archive_dir):
+    # log rimasto dopo la cancellazione della sua presenza (SQLite non applica le foreign key)
+    db_session.execute(models.AttendanceChangeLog.__table__.insert().values(
+        attendance_id=9999,
+        new_status=models.AttendanceStatus.present,
+        source=models.AttendanceSource.coach,
+        created_at=datetime(2024, 2, 3, 8),
+    ))
+    db_session.commit()
+
+    results = log_archive.archive(db_session, months=12, today=date(2025, 4, 15))
+    assert [(r.kind, r.month, r.rows) for r in results] == [("attendance_changes", "2024-02", 1)]
+    assert db_session.query(models.AttendanceChangeLog).count() == 0
+    entry = db_session.query(models.LogArchive).one()
+    [record] = log_archive.read_month(entry)
+    assert (record["attendance_id"], record["training_id"], record["athlete_id"]) == (9999, None, None)
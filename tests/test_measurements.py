@@ -27,3 +27,62 @@ async def test_measurements_insert_and_series(client, db_session):
     data = r.json()
     assert data["data"] == [70, 71]
     assert data["labels"][0] <= data["labels"][1]
+
+
+@pytest.mark.anyio
+async def test_measurements_columnar_downsample_and_bands(client, db_session):
+    coach_role = factories.create_role(db_session, "allenatore")
+    atleta_role = factories.create_role(db_session, "atleta")
+    factories.create_user(db_session, username="coach", roles=[coach_role])
+    athlete = factories.create_user(
+        db_session, username="athlete", roles=[atleta_role], date_of_birth=date(2008, 6, 1)
+    )
+    categoria = factories.create_categoria(db_session, nome="Junior", eta_min=15, eta_max=18)
+
+    await client.post("/login", data={"username": "coach", "password": "password"}, follow_redirects=True)
+    for day, weight, height in [(2, 60, 170), (3, 62, None), (20, 64, 172)]:
+        await client.post(
+            f"/risorse/athletes/{athlete.id}/measurements",
+            json={"measured_at": date(2024, 1, day).isoformat(), "weight_kg": weight, "height_cm": height},
+        )
+
+    r = await client.get(
+        f"/api/athletes/{athlete.id}/measurements",
+        params=[("fields", "weight"), ("fields", "height")],
+    )
+    data = r.json()
+    assert data["series"]["weight"] == [60, 62, 64]
+    assert data["series"]["height"] == [170, None, 172]
+
+    r = await client.get(
+        f"/api/athletes/{athlete.id}/measurements",
+        params={"fields": "weight", "downsample": "month"},
+    )
+    assert r.json() == {"labels": ["2024-01-01"], "series": {"weight": [62.0]}}
+
+    r = await client.get(f"/api/categories/{categoria.id}/measurement_bands")
+    bands = r.json()
+    assert bands["ages"] == [16]
+    assert bands["counts"] == [3]
+    assert bands["bands"]["weight"]["p50"] == [62.0]
+
+    # la data di nascita sposta l'atleta fuori dalla fascia: la cache segue la versione di "utenti"
+    athlete.date_of_birth = date(2000, 6, 1)
+    db_session.commit()
+    r = await client.get(f"/api/categories/{categoria.id}/measurement_bands")
+    assert r.json()["ages"] == []
+
+
+def test_downsample_lttb_respects_total_budget():
+    import numpy as np
+
+    from services.measurements_service import downsample_lttb
+
+    dates = [date.fromordinal(date(2024, 1, 1).toordinal() + i) for i in range(200)]
+    rng = np.random.default_rng(0)
+    values = {m: rng.normal(size=200) for m in ("weight", "height", "wingspan")}
+    for points in (4, 30, 90):
+        kept, series = downsample_lttb(dates, values, points)
+        assert len(kept) <= points
+        assert kept[0] == dates[0] and kept[-1] == dates[-1]
+        assert all(len(v) == len(kept) for v in series.values())
@@ -0,0 +1,46 @@
+import pytest
+
+import models
+import security
+from tests import factories
+
+
+CSV_CONTENT = (
+    "username;password;nome;cognome;data_nascita;email;ruoli;categoria\n"
+    "mrossi;segreta1;Mario;Rossi;01/02/2008;mario@example.com;;junior\n"
+    "lbianchi;segreta2;Luca;Bianchi;2007-05-03;;atleta,allenatore;\n"
+    "admin;x;Dup;User;2000-01-01;;;\n"
+    "nodate;x;No;Date;31/02/2001;;;\n"
+    "mrossi;x;Mario;Doppio;2008-01-01;;pilota;\n"
+)
+
+
+@pytest.mark.anyio
+async def test_bulk_import_members(client, db_session):
+    factories.create_admin_user(db_session)
+    factories.create_role(db_session, "atleta")
+    factories.create_role(db_session, "allenatore")
+    factories.create_categoria(db_session, nome="Junior")
+    await client.post("/login", data={"username": "admin", "password": "password"}, follow_redirects=True)
+
+    files = {"file": ("tesserati.csv", CSV_CONTENT.encode(), "text/csv")}
+    r = await client.post(
+        "/admin/users/import", files=files, data={"dry_run": "true"}, headers={"accept": "application/json"}
+    )
+    report = r.json()
+    assert report["created"] == 0
+    assert [e["row"] for e in report["errors"]] == [4, 5, 6]
+    assert db_session.query(models.User).count() == 1
+
+    r = await client.post("/admin/users/import", files=files, headers={"accept": "application/json"})
+    report = r.json()
+    assert report["created"] == 2
+    assert "username già in uso: admin" in report["errors"][0]["errors"]
+    assert any("ruoli sconosciuti" in e for e in report["errors"][2]["errors"])
+
+    mario = db_session.query(models.User).filter_by(username="mrossi").one()
+    assert mario.manual_category == "Junior"
+    assert [r.name for r in mario.roles] == ["atleta"]
+    assert security.verify_password("segreta1", mario.hashed_password)
+    luca = db_session.query(models.User).filter_by(username="lbianchi").one()
+    assert sorted(r.name for r in luca.roles) == ["allenatore", "atleta"]
@@ -1,6 +1,10 @@
 import pytest
+from sqlalchemy import event
+
 import models
 import security
+from database import engine
+from services import barche as barche_service
 
 
 async def _login(client, db_session):
@@ -36,3 +40,38 @@ async def test_pesi_categoria_filter(client, db_session):
     await _login(client, db_session)
     r = await client.get("/risorse/pesi?categoria=test")
     assert r.status_code == 200
+
+
+def _barca(nome, **flags):
+    return models.Barca(nome=nome, tipo=flags.pop("tipo", "1x"), **flags)
+
+
+def test_barche_status_case_filter_and_sort(db_session):
+    db_session.add_all(
+        [
+            _barca("Alfa"),
+            _barca("Beta", in_manutenzione=True, fuori_uso=True),
+            _barca("Gamma", in_manutenzione=True, tipo="4x"),
+            _barca("Delta", in_trasferta=True),
+        ]
+    )
+    db_session.commit()
+    db_session.expunge_all()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        barche, tipi = barche_service.list_barche(db_session, sort_by="status")
+        assert [b.nome for b in barche] == ["Beta", "Gamma", "Delta", "Alfa"]
+        assert all(b.equipaggi == [] for b in barche)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # barche, atleti assegnati, equipaggi, versioni di cache e tipi
+    assert len(statements) == 5
+    assert tipi == ["1x", "4x"]
+
+    barche, _ = barche_service.list_barche(db_session, status_filter="in_manutenzione")
+    assert [b.nome for b in barche] == ["Gamma"]
+    barche, _ = barche_service.list_barche(db_session, sort_by="status", sort_dir="desc")
+    assert [b.nome for b in barche] == ["Alfa", "Delta", "Gamma", "Beta"]
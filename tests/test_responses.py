@@ -0,0 +1,93 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from utils.responses import CompressionMiddleware, FastJSONResponse
+
+
+async def big_json(request):
+    return FastJSONResponse([{"id": i, "title": "Allenamento barca"} for i in range(200)])
+
+
+async def small_json(request):
+    return FastJSONResponse({"ok": True})
+
+
+async def csv_stream(request):
+    async def rows():
+        yield "id;nome\n"
+        for i in range(500):
+            yield f"{i};Atleta {i}\n"
+
+    return StreamingResponse(rows(), media_type="text/csv")
+
+
+async def png(request):
+    return Response(b"\x89PNG" + b"\x00" * 4096, media_type="image/png")
+
+
+async def ics(request):
+    return PlainTextResponse("BEGIN:VEVENT\r\nEND:VEVENT\r\n" * 100, media_type="text/calendar")
+
+
+@pytest.fixture
+async def compressed_client():
+    app = Starlette(
+        routes=[
+            Route("/big", big_json),
+            Route("/small", small_json),
+            Route("/export.csv", csv_stream),
+            Route("/logo.png", png),
+            Route("/calendar.ics", ics),
+        ]
+    )
+    app.add_middleware(CompressionMiddleware)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        yield client
+
+
+@pytest.mark.anyio
+async def test_large_json_and_ics_are_gzipped(compressed_client):
+    res = await compressed_client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert int(res.headers["content-length"]) < len(res.content)
+    assert res.json()[199] == {"id": 199, "title": "Allenamento barca"}
+
+    res = await compressed_client.get("/calendar.ics", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.text.startswith("BEGIN:VEVENT")
+
+
+@pytest.mark.anyio
+async def test_small_binary_or_unaccepted_responses_pass_through(compressed_client):
+    res = await compressed_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+    assert res.json() == {"ok": True}
+
+    res = await compressed_client.get("/logo.png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+
+    res = await compressed_client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert len(res.json()) == 200
+
+
+@pytest.mark.anyio
+async def test_streaming_export_is_compressed(compressed_client):
+    res = await compressed_client.get("/export.csv", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "content-length" not in res.headers
+    lines = res.text.splitlines()
+    assert lines[0] == "id;nome" and lines[-1] == "499;Atleta 499"
+
+
+@pytest.mark.anyio
+async def test_api_feed_is_compressed(client):
+    res = await client.get("/api/allenamenti", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.json() == []
+    res = await client.get("/sw.js", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
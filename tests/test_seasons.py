@@ -0,0 +1,168 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+
+import models
+from database import engine
+from models.storico import history_metadata, storico_attendance_change_logs
+from services import log_archive, seasons
+from services.recurrence import create_series, split_series, trainings_in_window
+from tests import factories
+
+
+@pytest.fixture(autouse=True)
+def clean_history():
+    # il database storico è un file separato e sopravvive al drop di conftest
+    history_metadata.drop_all(bind=engine)
+    yield
+    history_metadata.drop_all(bind=engine)
+
+
+def _seed(db):
+    cat = factories.create_categoria(db, nome="Junior", eta_min=0, eta_max=30)
+    atleta = factories.create_user(
+        db, username="ath", roles=[factories.create_role(db, "atleta")], date_of_birth=date(2005, 1, 1)
+    )
+    coach = factories.create_user(db, username="coach", roles=[factories.create_role(db, "allenatore")])
+    old = models.Allenamento(tipo="Barca", data=date(2024, 2, 10), orario="08:00-10:00", categories=[cat], coaches=[coach])
+    current = models.Allenamento(tipo="Barca", data=date(2024, 10, 5), orario="08:00-09:00", categories=[cat])
+    db.add_all([old, current])
+    db.flush()
+    attendance = models.Attendance(training_id=old.id, athlete_id=atleta.id, status=models.AttendanceStatus.absent)
+    db.add(attendance)
+    db.flush()
+    db.add(models.AttendanceChangeLog(
+        attendance_id=attendance.id, new_status=models.AttendanceStatus.absent, source=models.AttendanceSource.coach,
+    ))
+    db.commit()
+    return atleta, coach, old, current
+
+
+def test_close_season_moves_rows(db_session):
+    _, _, old, current = _seed(db_session)
+    old_id = old.id
+
+    preview = seasons.close_season(db_session, 2023, today=date(2024, 9, 15), dry_run=True)
+    assert (preview.trainings, preview.attendances) == (1, 1)
+    assert db_session.query(models.ClosedSeason).count() == 0
+
+    closed = seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+    assert (closed.start_date, closed.end_date) == (date(2023, 9, 1), date(2024, 8, 31))
+    assert [t.id for t in db_session.query(models.Allenamento)] == [current.id]
+    assert db_session.query(models.Attendance).count() == 0
+    assert db_session.query(models.AttendanceChangeLog).count() == 0
+
+    historic = db_session.query(models.StoricoAllenamento).one()
+    assert historic.id == old_id
+    assert [c.nome for c in historic.categories] == ["Junior"]
+    assert [c.username for c in historic.coaches] == ["coach"]
+    assert db_session.query(models.StoricoAttendance).one().training_date == date(2024, 2, 10)
+    assert db_session.scalar(select(func.count()).select_from(storico_attendance_change_logs)) == 1
+
+
+def test_attendance_history_reads_closed_season(db_session):
+    atleta, _, old, _ = _seed(db_session)
+    old_id = old.id
+    seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+
+    history = log_archive.attendance_history(db_session, old_id, atleta.id)
+    assert [(h["training_id"], h["athlete_id"], h["new_status"]) for h in history] == [
+        (old_id, atleta.id, "absent")
+    ]
+    assert log_archive.attendance_history(db_session, old_id, atleta.id + 100) == []
+
+
+def test_close_season_refuses_open_or_closed(db_session):
+    with pytest.raises(ValueError):
+        seasons.close_season(db_session, 2024, today=date(2025, 3, 1))
+    seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+    with pytest.raises(ValueError):
+        seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+
+
+def test_trainings_in_window_routes_by_season(db_session):
+    _, _, old, current = _seed(db_session)
+    seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+
+    assert seasons.historic_trainings(db_session, date(2024, 10, 1), date(2024, 10, 31)) == []
+    window = trainings_in_window(db_session, date(2024, 1, 1), date(2024, 12, 31))
+    assert [t.data for t in window] == [date(2024, 2, 10), date(2024, 10, 5)]
+    assert isinstance(window[0], models.StoricoAllenamento)
+
+    filtered = trainings_in_window(
+        db_session, date(2024, 1, 1), date(2024, 12, 31),
+        lambda q, model: q.join(model.coaches).filter(models.User.username == "coach"),
+    )
+    assert [t.data for t in filtered] == [date(2024, 2, 10)]
+
+
+@pytest.mark.anyio
+async def test_stats_read_closed_season(client, db_session):
+    atleta, coach, _, _ = _seed(db_session)
+    seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+    await client.post("/login", data={"username": coach.username, "password": "password"}, follow_redirects=True)
+
+    resp = await client.get("/api/trainings/stats", params={"year": 2024})
+    assert resp.status_code == 200
+    kpi = resp.json()["kpi"]
+    assert (kpi["trainings"], kpi["absent"], kpi["present"]) == (2, 1, 1)
+
+    resp = await client.get(f"/api/athletes/{atleta.id}/attendance_stats", params={"year": 2024, "month": 2})
+    assert resp.status_code == 200
+    kpi = resp.json()["kpi"]
+    assert (kpi["sessions"], kpi["present"], kpi["absent"]) == (1, 0, 1)
+
+
+def test_ensure_open_rejects_closed_season(db_session):
+    seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+    seasons.ensure_open(db_session, date(2024, 9, 1))
+    with pytest.raises(seasons.SeasonClosedError):
+        seasons.ensure_open(db_session, date(2024, 8, 31))
+    with pytest.raises(seasons.SeasonClosedError):
+        seasons.ensure_open(db_session, date(2023, 5, 1), date.max)
+
+
+@pytest.mark.anyio
+async def test_writes_on_closed_season_conflict(client, db_session):
+    _, coach, _, _ = _seed(db_session)
+    admin = factories.create_admin_user(db_session)
+    series = create_series(
+        db_session, tipo="Barca", descrizione=None, orario="08:00-09:00",
+        weekdays=[1], start_date=date(2024, 6, 4), count=20,
+    )
+    db_session.commit()
+    seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+    await client.post("/login", data={"username": admin.username, "password": "password"})
+
+    r = await client.post("/trainings", data={"tipo": "Barca", "date": "2024-03-01", "time_start": "09:00", "time_end": "10:00"})
+    assert r.status_code == 409
+    r = await client.post(f"/api/allenamenti/occurrences/s{series.id}-2024-06-11/materialize")
+    assert r.status_code == 409
+    r = await client.post(f"/api/allenamenti/occurrences/s{series.id}-2024-09-03/materialize")
+    assert r.status_code == 200
+    with pytest.raises(seasons.SeasonClosedError):
+        split_series(db_session, series, date(2024, 7, 2))
+    db_session.rollback()
+
+    r = await client.post("/attendance/sync", json={"changes": [{
+        "key": "k1", "training_id": f"s{series.id}-2024-06-18", "athlete_id": coach.id,
+        "status": "present", "changed_at": "2024-06-18T08:00:00Z",
+    }]})
+    assert r.status_code == 200
+    assert r.json()["results"][0]["result"] == "error"
+    assert db_session.query(models.Allenamento).filter_by(series_id=series.id).count() == 1
+
+
+@pytest.mark.anyio
+async def test_calendar_coach_filter_includes_closed_season(client, db_session):
+    _, coach, old, _ = _seed(db_session)
+    old.coaches = []
+    old.coach_id = coach.id
+    db_session.commit()
+    old_id = old.id
+    seasons.close_season(db_session, 2023, today=date(2024, 9, 15))
+
+    r = await client.get("/trainings/calendar", params={"week": "2024-W06", "coach_id": coach.id})
+    assert r.status_code == 200
+    assert f'data-edit="{old_id}"' in r.text
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import models
+from services import startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_seed_runs_once_behind_version_marker(db_session):
+    assert startup.seed_base_data(db_session) is True
+    assert startup.get_seed_version(db_session) == startup.SEED_VERSION
+    roles = {r.name for r in db_session.query(models.Role)}
+    assert set(startup.DEFAULT_ROLES) <= roles
+    categories = db_session.query(models.Categoria).count()
+    assert categories > 0
+
+    assert startup.seed_base_data(db_session) is False
+    assert db_session.query(models.Role).count() == len(roles)
+    assert db_session.query(models.Categoria).count() == categories
+
+
+def test_fast_mode_checks_alembic_revision(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'boot.db'}")
+    with pytest.raises(startup.SchemaOutdatedError):
+        startup.check_schema_revision(engine)
+
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    head = ScriptDirectory.from_config(Config(startup.ALEMBIC_INI)).get_current_head()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+        conn.execute(text("INSERT INTO alembic_version VALUES (:v)"), {"v": head})
+    assert startup.check_schema_revision(engine) == head
+
+    monkeypatch.setenv("STARTUP_MODE", "fast")
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE alembic_version SET version_num = 'old'"))
+    with pytest.raises(startup.SchemaOutdatedError):
+        startup.prepare_database(lambda: None, engine)
+
+
+def test_app_import_does_not_load_heavy_modules():
+    code = "import sys, main; print(sorted(m for m in ('numpy', 'openpyxl') if m in sys.modules))"
+    env = {**os.environ, "SECRET_KEY": "test-secret"}
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
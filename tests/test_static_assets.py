@@ -0,0 +1,55 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from utils.static_assets import AssetStaticFiles, IMMUTABLE_CACHE_CONTROL, build_assets, reset_manifest
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "app.css").write_text("body { color: #123456; }\n" * 40)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + b"\x00" * 64)
+    yield tmp_path
+    reset_manifest()
+
+
+@pytest.mark.anyio
+async def test_hashed_assets_are_precompressed_and_immutable(static_dir):
+    manifest = build_assets(str(static_dir))
+    hashed = manifest["css/app.css"]
+    assert hashed.startswith("build/css/app.") and hashed != "build/css/app.css"
+    assert (static_dir / (hashed + ".gz")).exists()
+    assert not (static_dir / (manifest["logo.png"] + ".gz")).exists()
+
+    app = Starlette(routes=[Mount("/static", AssetStaticFiles(directory=str(static_dir)), name="static")])
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        res = await client.get(f"/static/{hashed}", headers={"Accept-Encoding": "gzip"})
+        assert res.status_code == 200
+        assert res.headers["content-encoding"] == "gzip"
+        assert res.headers["content-type"].startswith("text/css")
+        assert res.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+        assert res.text == (static_dir / "css" / "app.css").read_text()
+
+        res = await client.get("/static/css/app.css", headers={"Accept-Encoding": "identity"})
+        assert res.status_code == 200
+        assert "content-encoding" not in res.headers
+        assert "cache-control" not in res.headers
+
+
+@pytest.mark.anyio
+async def test_templates_use_static_url(client):
+    res = await client.get("/login")
+    assert res.status_code == 200
+    assert "/static/css/app.css" in res.text or "/static/build/css/app." in res.text
+
+
+@pytest.mark.anyio
+async def test_service_worker_is_versioned(client):
+    res = await client.get("/sw.js")
+    assert res.status_code == 200
+    assert res.headers["cache-control"] == "no-cache"
+    assert res.text.startswith("const SW_VERSION = ")
+    assert "/static/css/app.css" in res.text or "/static/build/css/app." in res.text
+    assert "/static/sw.js" not in res.text
@@ -0,0 +1,113 @@
+from datetime import date
+
+import pytest
+
+import models
+from services import stats_cache
+from tests import factories
+from utils import cache as cache_module
+from utils.cache import ResultCache
+
+
+def _seed(db, training_date):
+    cat = factories.create_categoria(db, nome="Junior", eta_min=0, eta_max=30)
+    athlete = factories.create_user(
+        db, username="ath", roles=[factories.create_role(db, "atleta")], date_of_birth=date(2005, 1, 1)
+    )
+    coach = factories.create_user(db, username="coach", roles=[factories.create_role(db, "allenatore")])
+    training = models.Allenamento(tipo="Barca", data=training_date, orario="08:00-10:00", categories=[cat])
+    db.add(training)
+    db.commit()
+    return athlete, coach, training
+
+
+async def _login(client, user):
+    await client.post("/login", data={"username": user.username, "password": "password"}, follow_redirects=True)
+
+
+def test_normalize_params():
+    assert stats_cache.normalize_params({"year": 2025, "month": None, "tipo": ["b", "a", "b"]}) == (
+        ("tipo", ("a", "b")),
+        ("year", 2025),
+    )
+    assert stats_cache.is_closed(date(2025, 2, 28), today=date(2025, 3, 1))
+    assert not stats_cache.is_closed(date(2025, 3, 31), today=date(2025, 3, 1))
+    assert not stats_cache.is_closed(None)
+    assert stats_cache.closed_entities(("presenze", "utenti"), date(2024, 12, 1), date(2025, 1, 31)) == [
+        "presenze:*", "presenze:2024-12", "presenze:2025-01", "utenti",
+    ]
+
+
+@pytest.mark.anyio
+async def test_current_month_follows_attendance_writes(client, db_session):
+    athlete, coach, training = _seed(db_session, date.today())
+    await _login(client, coach)
+    params = {"year": date.today().year, "month": date.today().month}
+
+    first = (await client.get("/api/trainings/stats", params=params)).json()
+    hits = stats_cache.stats()["hits"]
+    assert (await client.get("/api/trainings/stats", params=params)).json() == first
+    assert stats_cache.stats()["hits"] == hits + 1
+
+    db_session.add(models.Attendance(training_id=training.id, athlete_id=athlete.id, status=models.AttendanceStatus.absent))
+    db_session.commit()
+    updated = (await client.get("/api/trainings/stats", params=params)).json()
+    assert (first["kpi"]["absent"], updated["kpi"]["absent"]) == (0, 1)
+
+
+@pytest.mark.anyio
+async def test_closed_period_follows_late_corrections(client, db_session):
+    athlete, coach, training = _seed(db_session, date(2024, 3, 5))
+    await _login(client, coach)
+    url = f"/api/athletes/{athlete.id}/attendance_stats"
+    params = {"year": 2024, "month": 3}
+
+    first = (await client.get(url, params=params)).json()
+    hits = stats_cache.stats()["hits"]
+    assert (await client.get(url, params=params)).json() == first
+    assert stats_cache.stats()["hits"] == hits + 1
+
+    # una scrittura nel mese corrente non tocca il mese chiuso
+    current = models.Allenamento(tipo="Barca", data=date.today(), orario="08:00-10:00", categories=list(training.categories))
+    db_session.add(current)
+    db_session.flush()
+    db_session.add(models.Attendance(training_id=current.id, athlete_id=athlete.id, status=models.AttendanceStatus.present))
+    db_session.commit()
+    assert (await client.get(url, params=params)).json() == first
+    assert stats_cache.stats()["hits"] == hits + 2
+
+    db_session.add(models.Attendance(training_id=training.id, athlete_id=athlete.id, status=models.AttendanceStatus.present))
+    db_session.commit()
+    corrected = (await client.get(url, params=params)).json()
+    assert (first["kpi"]["present"], corrected["kpi"]["present"]) == (0, 1)
+
+
+@pytest.fixture
+def disk_cache(tmp_path):
+    path = str(tmp_path / "results.db")
+    yield lambda: ResultCache("test_results", maxsize=4, path=path)
+    cache_module._REGISTRY.pop("test_results", None)
+
+
+def test_result_cache_reads_back_from_disk(disk_cache):
+    writer = disk_cache()
+    assert writer.get_or_set(("k", 1), lambda: {"a": [1, 2]}, persist=True) == {"a": [1, 2]}
+    writer.get_or_set(("k", 2), lambda: {"b": 1})
+
+    reader = disk_cache()
+    assert reader.get_or_set(("k", 1), lambda: pytest.fail("dovrebbe leggere dal disco")) == {"a": [1, 2]}
+    assert reader.stats()["disk_hits"] == 1
+    assert reader.get(("k", 2)) is None
+
+    reader.invalidate()
+    assert disk_cache().get(("k", 1)) is None
+
+
+def test_result_cache_prunes_disk(tmp_path):
+    cache = ResultCache("test_results", maxsize=1, path=str(tmp_path / "results.db"), disk_maxsize=2)
+    try:
+        for i in range(4):
+            cache.get_or_set(("k", i), lambda: i, persist=True)
+        assert cache._disk().execute("SELECT COUNT(*) FROM results").fetchone()[0] == 2
+    finally:
+        cache_module._REGISTRY.pop("test_results", None)
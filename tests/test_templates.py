@@ -6,3 +6,13 @@ async def test_base_template_without_user(client):
     res = await client.get("/login")
     assert res.status_code == 200
     assert "id=\"adminMenu\"" not in res.text
+
+
+def test_routers_share_template_environment():
+    from routers import athletes, trainings
+    from utils.render import precompile_templates, templates
+
+    assert trainings.templates is templates
+    assert athletes.templates is templates
+    assert "get_color_for_type" in templates.env.globals
+    assert precompile_templates() > 0
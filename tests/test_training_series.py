@@ -0,0 +1,251 @@
+import pytest
+from datetime import date
+
+import models
+from services.recurrence import (
+    VirtualTraining, create_series, delete_recurrence, materialize_occurrence, trainings_in_window, truncate_series
+)
+from tests.factories import create_admin_user, create_categoria, create_role, create_user
+from utils.dates import weekly_dates
+
+
+def test_weekly_dates_window_inside_long_series():
+    dates = weekly_dates(date(2024, 1, 1), date(2026, 12, 31), [0, 2], (date(2025, 3, 1), date(2025, 3, 14)))
+    assert dates == [date(2025, 3, 3), date(2025, 3, 5), date(2025, 3, 10), date(2025, 3, 12)]
+
+
+def test_trainings_in_window_expands_series(db_session):
+    cat = create_categoria(db_session, nome="Junior")
+    series = create_series(
+        db_session,
+        tipo="Barca",
+        descrizione="Serie",
+        orario="08:00-10:00",
+        weekdays=[1],
+        start_date=date(2025, 9, 2),
+        count=4,
+        categories=[cat],
+    )
+    db_session.commit()
+    assert series.until == date(2025, 9, 23)
+    trainings = trainings_in_window(db_session, date(2025, 9, 10), date(2025, 9, 30))
+    assert [t.data for t in trainings] == [date(2025, 9, 16), date(2025, 9, 23)]
+    assert trainings[0].occurrence_ref == f"s{series.id}-2025-09-16"
+    assert db_session.query(models.Allenamento).count() == 0
+
+
+@pytest.mark.anyio
+async def test_recurring_training_creates_single_series(client, db_session):
+    cat = create_categoria(db_session, nome="Junior")
+    admin = create_admin_user(db_session)
+    await client.post("/login", data={"username": admin.username, "password": "password"})
+    res = await client.post(
+        "/allenamenti/nuovo",
+        data={
+            "tipo": "Barca",
+            "data": "2025-09-01",
+            "orario": "08:00-10:00",
+            "is_recurring": "true",
+            "giorni": ["MO", "WE"],
+            "recurrence_count": 6,
+            "category_names": [cat.nome],
+        },
+        follow_redirects=False,
+    )
+    assert res.status_code == 303
+    assert db_session.query(models.TrainingSeries).count() == 1
+    assert db_session.query(models.Allenamento).count() == 0
+
+    events = (await client.get("/api/allenamenti?start=2025-09-01&end=2025-09-30")).json()
+    assert len(events) == 6
+    refs = [e["id"] for e in events]
+    assert refs[0].startswith("s") and refs[0].endswith("2025-09-01")
+
+    res = await client.post(f"/api/allenamenti/occurrences/{refs[1]}/materialize")
+    assert res.status_code == 200
+    override_id = res.json()["id"]
+    events = (await client.get("/api/allenamenti?start=2025-09-01&end=2025-09-30")).json()
+    assert len(events) == 6
+    assert str(override_id) in [e["id"] for e in events]
+
+    await client.post("/allenamenti/delete", data={"allenamento_id": refs[0], "deletion_type": "single"})
+    await client.post("/allenamenti/delete", data={"allenamento_id": refs[4], "deletion_type": "future"})
+    events = (await client.get("/api/allenamenti?start=2025-09-01&end=2025-09-30")).json()
+    assert [e["start"][:10] for e in events] == ["2025-09-03", "2025-09-08", "2025-09-10"]
+    db_session.expire_all()
+    assert db_session.query(models.TrainingSeries).one().until == date(2025, 9, 14)
+
+
+@pytest.mark.anyio
+async def test_edit_following_splits_series_and_keeps_attendance(client, db_session):
+    junior = create_categoria(db_session, nome="Junior")
+    senior = create_categoria(db_session, nome="Senior", eta_min=19, eta_max=99)
+    admin = create_admin_user(db_session)
+    coach_role = create_role(db_session, "allenatore")
+    old_coach = create_user(db_session, username="coach1", roles=[coach_role])
+    new_coach = create_user(db_session, username="coach2", roles=[coach_role])
+    athlete = create_user(db_session, username="atleta1")
+    series = create_series(
+        db_session,
+        tipo="Barca",
+        descrizione="Serie",
+        orario="08:00-10:00",
+        weekdays=[0],
+        start_date=date(2025, 9, 1),
+        count=40,
+        categories=[junior],
+        coaches=[old_coach],
+    )
+    db_session.commit()
+    await client.post("/login", data={"username": admin.username, "password": "password"})
+    override_id = (await client.post(f"/api/allenamenti/occurrences/s{series.id}-2025-11-17/materialize")).json()["id"]
+    db_session.add(models.Attendance(training_id=override_id, athlete_id=athlete.id))
+    db_session.commit()
+
+    res = await client.post(
+        f"/allenamenti/s{series.id}-2025-11-03/modifica",
+        data={
+            "tipo": "Pesi",
+            "data": "2025-11-03",
+            "orario": "17:30-19:30",
+            "category_names": [senior.nome],
+            "coach_ids": [new_coach.id],
+            "edit_scope": "following",
+        },
+        follow_redirects=False,
+    )
+    assert res.status_code == 303
+    db_session.expire_all()
+    head, tail = db_session.query(models.TrainingSeries).order_by(models.TrainingSeries.start_date).all()
+    assert head.until == date(2025, 11, 2)
+    assert tail.start_date == date(2025, 11, 3) and tail.tipo == "Pesi"
+    assert [c.id for c in tail.coaches] == [new_coach.id]
+    assert [c.nome for c in head.categories] == ["Junior"]
+
+    override = db_session.get(models.Allenamento, override_id)
+    assert override.series_id == tail.id and override.orario == "17:30-19:30"
+    assert [c.nome for c in override.categories] == ["Senior"]
+    assert [c.id for c in override.coaches] == [new_coach.id]
+    assert db_session.query(models.Attendance).filter_by(training_id=override_id).count() == 1
+
+    trainings = trainings_in_window(db_session, date(2025, 10, 27), date(2025, 11, 10))
+    assert [(t.data, t.tipo) for t in trainings] == [
+        (date(2025, 10, 27), "Barca"),
+        (date(2025, 11, 3), "Pesi"),
+        (date(2025, 11, 10), "Pesi"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_edit_following_drops_attendance_outside_new_categories(client, db_session):
+    junior = create_categoria(db_session, nome="Junior", eta_min=10, eta_max=18)
+    senior = create_categoria(db_session, nome="Senior", eta_min=19, eta_max=99)
+    admin = create_admin_user(db_session)
+    young = create_user(db_session, username="giovane", date_of_birth=date(2010, 5, 1))
+    # compie 19 anni il giorno dopo il primo allenamento modificato
+    adult = create_user(db_session, username="adulto", date_of_birth=date(2006, 11, 4))
+    series = create_series(
+        db_session, tipo="Barca", descrizione="Serie", orario="08:00-10:00",
+        weekdays=[0], start_date=date(2025, 9, 1), count=20, categories=[junior, senior],
+    )
+    db_session.commit()
+    await client.post("/login", data={"username": admin.username, "password": "password"})
+    override_ids = []
+    for day in ("2025-10-27", "2025-11-03", "2025-11-10"):
+        res = await client.post(f"/api/allenamenti/occurrences/s{series.id}-{day}/materialize")
+        override_ids.append(res.json()["id"])
+    for training_id in override_ids:
+        for athlete in (young, adult):
+            attendance = models.Attendance(training_id=training_id, athlete_id=athlete.id)
+            db_session.add(attendance)
+            db_session.flush()
+            db_session.add(models.AttendanceChangeLog(
+                attendance_id=attendance.id, new_status=models.AttendanceStatus.present,
+                source=models.AttendanceSource.athlete,
+            ))
+    db_session.commit()
+
+    res = await client.post(
+        f"/allenamenti/s{series.id}-2025-11-03/modifica",
+        data={
+            "tipo": "Barca",
+            "data": "2025-11-03",
+            "orario": "08:00-10:00",
+            "category_names": [senior.nome],
+            "edit_scope": "following",
+        },
+        follow_redirects=False,
+    )
+    assert res.status_code == 303
+    db_session.expire_all()
+    kept = {
+        (a.training_id, a.athlete_id)
+        for a in db_session.query(models.Attendance)
+    }
+    first, second, third = override_ids
+    # prima della divisione nulla cambia; dopo restano solo gli atleti della categoria Senior
+    assert kept == {(first, young.id), (first, adult.id), (third, adult.id)}
+    assert db_session.query(models.AttendanceChangeLog).count() == 3
+
+
+def _override_with_attendance(db, series, day):
+    athlete = create_user(db, username=f"atleta-{day.isoformat()}")
+    override = materialize_occurrence(db, VirtualTraining(series, day))
+    db.flush()
+    attendance = models.Attendance(training_id=override.id, athlete_id=athlete.id)
+    db.add(attendance)
+    db.flush()
+    db.add(models.AttendanceChangeLog(
+        attendance_id=attendance.id, new_status=models.AttendanceStatus.absent, source=models.AttendanceSource.coach,
+    ))
+    db.commit()
+    return override
+
+
+def test_truncate_series_removes_override_attendances(db_session):
+    series = create_series(
+        db_session, tipo="Barca", descrizione=None, orario="08:00-10:00",
+        weekdays=[0], start_date=date(2025, 9, 1), count=4,
+    )
+    db_session.commit()
+    _override_with_attendance(db_session, series, date(2025, 9, 8))
+    _override_with_attendance(db_session, series, date(2025, 9, 15))
+
+    truncate_series(db_session, series, date(2025, 9, 15))
+    db_session.commit()
+    assert [a.data for a in db_session.query(models.Allenamento)] == [date(2025, 9, 8)]
+    assert db_session.query(models.Attendance).count() == 1
+    assert db_session.query(models.AttendanceChangeLog).count() == 1
+
+    truncate_series(db_session, series, series.start_date)
+    db_session.commit()
+    assert db_session.query(models.Attendance).count() == 0
+    assert db_session.query(models.AttendanceChangeLog).count() == 0
+
+
+def test_delete_recurrence_removes_attendances(db_session):
+    athlete = create_user(db_session, username="atleta")
+    days = [date(2024, 5, 6), date(2024, 5, 13), date(2024, 5, 20)]
+    trainings = [models.Allenamento(tipo="Barca", data=d, recurrence_id="legacy-1") for d in days]
+    db_session.add_all(trainings)
+    db_session.flush()
+    for training in trainings:
+        attendance = models.Attendance(training_id=training.id, athlete_id=athlete.id)
+        db_session.add(attendance)
+        db_session.flush()
+        db_session.add(models.AttendanceChangeLog(
+            attendance_id=attendance.id, new_status=models.AttendanceStatus.present, source=models.AttendanceSource.athlete,
+        ))
+    db_session.commit()
+
+    delete_recurrence(db_session, "legacy-1", date(2024, 5, 13))
+    db_session.commit()
+    assert [t.data for t in db_session.query(models.Allenamento)] == [date(2024, 5, 6)]
+    assert [a.training_id for a in db_session.query(models.Attendance)] == [trainings[0].id]
+    assert db_session.query(models.AttendanceChangeLog).count() == 1
+
+    delete_recurrence(db_session, "legacy-1")
+    db_session.commit()
+    assert db_session.query(models.Allenamento).count() == 0
+    assert db_session.query(models.Attendance).count() == 0
+    assert db_session.query(models.AttendanceChangeLog).count() == 0
@@ -22,3 +22,39 @@ async def test_create_training_ok(client):
 async def test_calendar_filter_by_coach(client):
     r = await client.get("/trainings/calendar?coach_id=999")
     assert r.status_code == 200
+
+@pytest.mark.anyio
+async def test_create_training_conflicts_with_series_occurrence(client, db_session):
+    from datetime import date
+
+    from services.recurrence import create_series
+    from tests.factories import create_role, create_user
+
+    coach = create_user(db_session, username="coach", roles=[create_role(db_session, "allenatore")])
+    create_series(
+        db_session,
+        tipo="barca",
+        descrizione="Serie",
+        orario="08:00-10:00",
+        weekdays=[1],
+        start_date=date(2025, 9, 2),
+        count=6,
+        coaches=[coach],
+    )
+    db_session.commit()
+    payload = {
+        "tipo": "barca",
+        "date": "2025-09-23",
+        "time_start": "09:00",
+        "time_end": "11:00",
+        "coach_id": str(coach.id),
+    }
+    r = await client.post("/trainings", data=payload, follow_redirects=False)
+    assert r.status_code == 409
+    # una serie settimanale che incrocia la serie esistente solo più avanti
+    payload.update(date="2025-08-26", recurrence="weekly", repeat_until="2025-09-30")
+    r = await client.post("/trainings", data=payload, follow_redirects=False)
+    assert r.status_code == 409
+    payload.update(time_start="10:00", time_end="11:00")
+    r = await client.post("/trainings", data=payload, follow_redirects=False)
+    assert r.status_code in (303, 307)
@@ -0,0 +1,158 @@
+import math
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import models
+from services import weights_service
+from services.strength_stats import rank_columns
+from services.weights_service import rep_loads
+from utils.dates import season_bounds
+from tests import factories
+
+
+def test_rep_loads_formulas():
+    loads = rep_loads([100.0, np.nan])
+    assert loads.shape == (2, 4)
+    assert list(loads[0]) == [85.5, 81.0, 75.0, 60.0]
+    assert all(math.isnan(v) for v in loads[1])
+    assert list(rep_loads([100.0], "brzycki")[0]) == [89.0, 83.5, 75.0, 47.0]
+    with pytest.raises(ValueError):
+        rep_loads([100.0], "lander")
+
+
+def _setup(db):
+    coach_role = factories.create_role(db, "allenatore")
+    atleta_role = factories.create_role(db, "atleta")
+    factories.create_user(db, username="coach", roles=[coach_role])
+    year = date.today().year
+    factories.create_categoria(db, nome="Junior", eta_min=17, eta_max=18, ordine=7)
+    factories.create_categoria(db, nome="Senior", eta_min=24, eta_max=27, ordine=9)
+    juniors = [
+        factories.create_user(
+            db, username=f"j{i}", roles=[atleta_role], date_of_birth=date(year - 17, 3, 1), last_name=f"J{i}"
+        )
+        for i in range(2)
+    ]
+    senior = factories.create_user(db, username="s", roles=[atleta_role], date_of_birth=date(year - 25, 3, 1))
+    esercizi = [models.EsercizioPesi(nome="Panca", ordine=1), models.EsercizioPesi(nome="Squat", ordine=2)]
+    db.add_all(esercizi)
+    db.commit()
+    return juniors, senior, esercizi
+
+
+@pytest.mark.anyio
+async def test_category_grid_bulk_upsert(client, db_session):
+    juniors, senior, esercizi = _setup(db_session)
+    await client.post("/login", data={"username": "coach", "password": "password"})
+
+    entries = [
+        {"atleta_id": a.id, "esercizio_id": e.id, "massimale": 100 + 10 * i}
+        for i, a in enumerate(juniors)
+        for e in esercizi
+    ]
+    res = await client.put("/risorse/pesi/categoria/Junior/grid", json={"entries": entries})
+    assert res.status_code == 200
+    grid = res.json()
+    assert [a["id"] for a in grid["atleti"]] == [a.id for a in juniors]
+    assert grid["atleti"][0]["carichi"][0] == [85.5, 81.0, 75.0, 60.0]
+
+    entries[0]["massimale"] = 120
+    res = await client.put(
+        "/risorse/pesi/categoria/Junior/grid", json={"formula": "brzycki", "entries": entries}
+    )
+    assert res.json()["atleti"][0]["massimali"][0] == 120
+    assert db_session.query(models.SchedaPesi).count() == 4
+
+    res = await client.put(
+        "/risorse/pesi/categoria/Junior/grid",
+        json={"entries": [{"atleta_id": senior.id, "esercizio_id": esercizi[0].id, "massimale": 90}]},
+    )
+    assert res.status_code == 422
+    res = await client.get("/risorse/pesi/categoria/Allievo A/grid")
+    assert res.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_single_sheet_keeps_manual_loads(client, db_session):
+    juniors, _, esercizi = _setup(db_session)
+    await client.post("/login", data={"username": "coach", "password": "password"})
+    atleta = juniors[0]
+    res = await client.post(
+        "/risorse/pesi/update",
+        data={"atleta_id": atleta.id, f"massimale_{esercizi[0].id}": "100", f"5rep_{esercizi[0].id}": "80"},
+    )
+    assert res.status_code == 303
+    scheda = db_session.query(models.SchedaPesi).filter_by(atleta_id=atleta.id).one()
+    assert (scheda.carico_5_rep, scheda.carico_7_rep, scheda.carico_20_rep) == (80, 81, 60)
+
+    res = await client.get("/risorse/pesi/categoria/Junior")
+    assert res.status_code == 200
+    assert f'name="m_{atleta.id}_{esercizi[0].id}" value="100.0"' in res.text
+
+
+def test_rank_columns_ties_and_missing():
+    ranks, percentili = rank_columns(np.array([[100.0], [90.0], [90.0], [np.nan], [80.0]]))
+    assert list(ranks[[0, 1, 2, 4], 0]) == [1, 2, 2, 4]
+    assert list(percentili[[0, 1, 2, 4], 0]) == [87.5, 50.0, 50.0, 12.5]
+    assert math.isnan(ranks[3, 0]) and math.isnan(percentili[3, 0])
+
+
+@pytest.mark.anyio
+async def test_category_strength_stats(client, db_session):
+    juniors, _, esercizi = _setup(db_session)
+    season_start, _ = season_bounds(date.today())
+    db_session.add_all(
+        [
+            models.MassimaleStorico(
+                atleta_id=juniors[0].id, esercizio_id=esercizi[0].id, massimale=90,
+                recorded_at=season_start - timedelta(days=10),
+            ),
+            models.AthleteMeasurement(athlete_id=juniors[0].id, measured_at=date.today(), weight_kg=80),
+        ]
+    )
+    db_session.commit()
+    await client.post("/login", data={"username": "coach", "password": "password"})
+    entries = [
+        {"atleta_id": juniors[0].id, "esercizio_id": esercizi[0].id, "massimale": 100},
+        {"atleta_id": juniors[1].id, "esercizio_id": esercizi[0].id, "massimale": 110},
+    ]
+    await client.put("/risorse/pesi/categoria/Junior/grid", json={"entries": entries})
+
+    res = await client.get("/risorse/pesi/statistiche/data", params={"categoria": "Junior"})
+    assert res.status_code == 200
+    stats = res.json()
+    panca = stats["esercizi"][0]
+    assert (panca["n"], panca["media"], panca["max"]) == (2, 105.0, 110.0)
+    assert stats["esercizi"][1]["n"] == 0
+    first = stats["atleti"][0]["valori"][0]
+    assert (first["posizione"], first["percentile"], first["relativo"]) == (2, 25.0, 1.25)
+    assert first["delta_stagione"] == 10
+    # il secondo atleta ha solo la registrazione di oggi
+    assert stats["atleti"][1]["valori"][0]["delta_stagione"] == 0
+
+    # una nuova misurazione invalida la cache
+    db_session.add(models.AthleteMeasurement(athlete_id=juniors[0].id, measured_at=date.today(), weight_kg=100))
+    db_session.commit()
+    res = await client.get("/risorse/pesi/statistiche/data", params={"categoria": "Junior"})
+    assert res.json()["atleti"][0]["valori"][0]["relativo"] == 1.0
+    assert (await client.get("/risorse/pesi/statistiche/data")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_athlete_sees_only_own_strength_row(client, db_session):
+    juniors, _, esercizi = _setup(db_session)
+    weights_service.save_program(
+        db_session, [(juniors[0].id, esercizi[0].id, 100.0), (juniors[1].id, esercizi[0].id, 120.0)]
+    )
+    db_session.commit()
+    await client.post("/login", data={"username": juniors[0].username, "password": "password"})
+    res = await client.get("/risorse/pesi/statistiche/data", params={"categoria": "Senior"})
+    stats = res.json()
+    assert stats["categoria"] == "Junior"
+    assert [a["id"] for a in stats["atleti"]] == [juniors[0].id]
+    assert stats["atleti"][0]["valori"][0]["posizione"] == 2
+    assert stats["esercizi"][0]["n"] == 2
+    res = await client.get("/risorse/pesi/statistiche")
+    assert res.status_code == 200
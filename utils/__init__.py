@@ -2,19 +2,14 @@
 # Descrizione: Contiene funzioni di utilità generiche riutilizzate in diverse parti dell'applicazione.
 
 from datetime import date, datetime, time, timedelta, timezone
-from typing import Optional, Tuple, List
-import csv
-import tempfile
-from fastapi.responses import FileResponse
-
-try:
-    from openpyxl import Workbook
-except ImportError:  # pragma: no cover - openpyxl is an optional dep at runtime
-    Workbook = None
+from typing import Iterable, Iterator, Optional, Tuple, List
+from fastapi.responses import StreamingResponse
+
 from dateutil.rrule import MO, TU, WE, TH, FR, SA, SU
 
-# Import della funzione render
-from .render import render
+# Import della funzione render e dei template condivisi
+from .render import render, templates
+from .export import streaming_export
 
 
 MONTH_NAMES = {
@@ -47,11 +42,21 @@ def get_color_for_type(training_type: Optional[str]) -> str:
     return colors.get(training_type, "#6c757d")
 
 
+# disponibile in tutti i template dell'ambiente condiviso
+templates.env.globals["get_color_for_type"] = get_color_for_type
+
+
 DAY_MAP_DATETIL = {
     "Lunedì": MO, "Martedì": TU, "Mercoledì": WE, "Giovedì": TH,
     "Venerdì": FR, "Sabato": SA, "Domenica": SU
 }
 
+# indice del giorno (0 = lunedì) per nome italiano o codice iCalendar (MO, TU, ...)
+WEEKDAY_INDEX = {
+    **{name: wd.weekday for name, wd in DAY_MAP_DATETIL.items()},
+    **{str(wd): wd.weekday for wd in DAY_MAP_DATETIL.values()},
+}
+
 
 def parse_time_string(time_str: str) -> time:
     """
@@ -102,52 +107,43 @@ def parse_orario(base_date: date, orario_str: str) -> Tuple[datetime, datetime]:
                 datetime.combine(base_date, time.max, timezone.utc))
 
 
-def _build_title(month_start: date) -> str:
-    month_name = MONTH_NAMES.get(month_start.month, str(month_start.month))
-    return f"Turni aperture Canottieri {month_name} {month_start.year}"
-
-
-def export_turni_csv(turni: List["models.Turno"], month_start: date) -> FileResponse:
-    """Generate a CSV report for ``turni`` of ``month_start`` and return it."""
-    title = _build_title(month_start)
-    filename = f"{title}.csv"
-    with tempfile.NamedTemporaryFile("w", delete=False, newline="", suffix=".csv") as tmp:
-        writer = csv.writer(tmp)
-        writer.writerow([title])
-        writer.writerow(["ID", "Data", "Fascia Oraria", "Allenatore"])
-        for t in turni:
-            coach = f"{t.user.first_name} {t.user.last_name}" if t.user else ""
-            writer.writerow([t.id, t.data.isoformat(), t.fascia_oraria, coach])
-        tmp_path = tmp.name
-    return FileResponse(tmp_path, media_type="text/csv", filename=filename)
-
-
-def export_turni_excel(turni: List["models.Turno"], month_start: date) -> FileResponse:
-    """Generate an Excel (or CSV fallback) report for ``turni`` of ``month_start``."""
-    title = _build_title(month_start)
-    filename = f"{title}.xlsx"
-    if Workbook is None:
-        with tempfile.NamedTemporaryFile("w", delete=False, newline="", suffix=".xlsx") as tmp:
-            writer = csv.writer(tmp)
-            writer.writerow([title])
-            writer.writerow(["ID", "Data", "Fascia Oraria", "Allenatore"])
-            for t in turni:
-                coach = f"{t.user.first_name} {t.user.last_name}" if t.user else ""
-                writer.writerow([t.id, t.data.isoformat(), t.fascia_oraria, coach])
-            tmp_path = tmp.name
-        return FileResponse(tmp_path, media_type="application/vnd.ms-excel", filename=filename)
-    with tempfile.NamedTemporaryFile("wb", delete=False, suffix=".xlsx") as tmp:
-        wb = Workbook()
-        ws = wb.active
-        ws.append([title])
-        ws.append(["ID", "Data", "Fascia Oraria", "Allenatore"])
-        for t in turni:
-            coach = f"{t.user.first_name} {t.user.last_name}" if t.user else ""
-            ws.append([t.id, t.data.isoformat(), t.fascia_oraria, coach])
-        wb.save(tmp.name)
-        tmp_path = tmp.name
-    return FileResponse(
-        tmp_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=filename,
+def _build_title(start: date, end: Optional[date] = None) -> str:
+    """Titolo dell'export: il nome del mese se l'intervallo è un mese intero."""
+    if end is None or (
+        start.day == 1
+        and end.year == start.year
+        and end.month == start.month
+        and (end + timedelta(days=1)).day == 1
+    ):
+        month_name = MONTH_NAMES.get(start.month, str(start.month))
+        return f"Turni aperture Canottieri {month_name} {start.year}"
+    return f"Turni aperture Canottieri {start.isoformat()} - {end.isoformat()}"
+
+
+TURNI_EXPORT_HEADER = ["ID", "Data", "Fascia Oraria", "Allenatore"]
+
+
+def _turni_rows(turni: Iterable["models.Turno"]) -> Iterator[list]:
+    for t in turni:
+        coach = f"{t.user.first_name} {t.user.last_name}" if t.user else ""
+        yield [t.id, t.data.isoformat(), t.fascia_oraria, coach]
+
+
+def export_turni_csv(
+    turni: Iterable["models.Turno"], start: date, end: Optional[date] = None
+) -> StreamingResponse:
+    """Stream a CSV report for ``turni`` between ``start`` and ``end``."""
+    title = _build_title(start, end)
+    return streaming_export(
+        _turni_rows(turni), title, "csv", header=TURNI_EXPORT_HEADER, preamble=[[title]]
+    )
+
+
+def export_turni_excel(
+    turni: Iterable["models.Turno"], start: date, end: Optional[date] = None
+) -> StreamingResponse:
+    """Stream an Excel (or CSV fallback) report for ``turni`` between ``start`` and ``end``."""
+    title = _build_title(start, end)
+    return streaming_export(
+        _turni_rows(turni), title, "xlsx", header=TURNI_EXPORT_HEADER, preamble=[[title]]
     )
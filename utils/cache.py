@@ -0,0 +1,163 @@
+"""Cache in memoria per processo con invalidazione esplicita.
+
+Ogni cache registrata espone contatori di hit/miss, così da poterne
+misurare l'efficacia. Le cache sono per-worker: chi scrive sul database è
+responsabile di chiamare ``invalidate`` sulle chiavi interessate.
+``ResultCache`` aggiunge un secondo livello opzionale su file SQLite,
+condiviso fra i worker e persistente fra i riavvii.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+_REGISTRY: Dict[str, "KeyedCache"] = {}
+
+
+class KeyedCache:
+    """Cache LRU thread-safe con contatori di hit/miss."""
+
+    def __init__(self, name: str, maxsize: int = 128):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = RLock()
+        _REGISTRY[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key`` computing it with ``factory`` on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Remove ``key`` from the cache, or every entry when ``key`` is ``None``."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class ResultCache(KeyedCache):
+    """``KeyedCache`` con copia su disco (SQLite) delle voci ``persist``.
+
+    I valori salvati su disco devono essere serializzabili in JSON e
+    vengono riletti come tali. Senza ``path`` si comporta come ``KeyedCache``.
+    """
+
+    def __init__(self, name: str, maxsize: int = 128, path: Optional[str] = None, disk_maxsize: int = 4096):
+        super().__init__(name, maxsize)
+        self.path = path
+        self.disk_maxsize = disk_maxsize
+        self.disk_hits = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _disk(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    @staticmethod
+    def _disk_key(key: Hashable) -> str:
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = super().get(key, _MISSING)
+        if value is not _MISSING or not self.path:
+            return default if value is _MISSING else value
+        with self._lock:
+            row = self._disk().execute("SELECT value FROM results WHERE key = ?", (self._disk_key(key),)).fetchone()
+            if row is None:
+                return default
+            value = json.loads(row[0])
+            # trovata su disco: conta come hit e torna in memoria
+            self.misses -= 1
+            self.hits += 1
+            self.disk_hits += 1
+            super().set(key, value)
+            return value
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any], persist: bool = False) -> Any:
+        """Come ``KeyedCache.get_or_set``; con ``persist`` il valore calcolato va anche su disco."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+            if persist and self.path:
+                with self._lock:
+                    disk = self._disk()
+                    disk.execute(
+                        "INSERT OR REPLACE INTO results (key, value, stored_at) VALUES (?, ?, ?)",
+                        (self._disk_key(key), json.dumps(value, separators=(",", ":")), time.time()),
+                    )
+                    # le voci con versioni superate non vengono più lette: tiene solo le più recenti
+                    disk.execute(
+                        "DELETE FROM results WHERE key NOT IN "
+                        "(SELECT key FROM results ORDER BY stored_at DESC LIMIT ?)",
+                        (self.disk_maxsize,),
+                    )
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        super().invalidate(key)
+        if not self.path:
+            return
+        with self._lock:
+            if key is None:
+                self._disk().execute("DELETE FROM results")
+            else:
+                self._disk().execute("DELETE FROM results WHERE key = ?", (self._disk_key(key),))
+
+    def stats(self) -> dict:
+        return {**super().stats(), "disk_hits": self.disk_hits}
+
+
+def all_caches() -> Dict[str, KeyedCache]:
+    """Return every cache registered in this process, keyed by name."""
+    return dict(_REGISTRY)
@@ -1,13 +1,13 @@
 from __future__ import annotations
 from datetime import date, time, timedelta
-from typing import TypedDict, Optional
+from typing import Container, Iterable, TypedDict, Optional
 
 class Occurrence(TypedDict, total=False):
     date: date
     time_start: time
     time_end: time
     is_override: bool
-    source_id: int
+    source_id: str
     coach_id: Optional[int]
     coach_name: Optional[str]
 
@@ -17,32 +17,46 @@ def week_bounds(year: int, isoweek: int) -> tuple[date, date]:
     sunday = monday + timedelta(days=6)
     return monday, sunday
 
-def expand_occurrences(master, week_range: tuple[date, date]) -> list[Occurrence]:
-    """Espande una ricorrenza weekly in memoria (non scrive su DB)."""
-    start, end = week_range
-    out: list[Occurrence] = []
-    if not master.data or not master.time_start or not master.time_end:
+def month_window(year: int, month: Optional[int] = None) -> tuple[date, date]:
+    """Primo e ultimo giorno del mese, o dell'anno se ``month`` è ``None``."""
+    if not month:
+        return date(year, 1, 1), date(year, 12, 31)
+    first = date(year, month, 1)
+    last = (date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)) - timedelta(days=1)
+    return first, last
+
+
+def weekly_dates(
+    start: date,
+    until: date,
+    weekdays: Iterable[int],
+    window: tuple[Optional[date], Optional[date]] = (None, None),
+    skip: Container[date] = (),
+) -> list[date]:
+    """Date di una ricorrenza settimanale comprese nella finestra (estremi inclusi).
+
+    Il costo è proporzionale alle occorrenze nella finestra: per ogni giorno
+    della settimana si calcola la prima data utile e si avanza di 7 giorni.
+    """
+    lo = max(start, window[0]) if window[0] else start
+    hi = min(until, window[1]) if window[1] else until
+    out: list[date] = []
+    if lo > hi:
         return out
-    if start <= master.data <= end:
-        out.append({
-            "date": master.data,
-            "time_start": master.time_start,
-            "time_end": master.time_end,
-            "is_override": False,
-            "source_id": master.id,
-        })
-    if master.recurrence == "weekly" and master.repeat_until:
-        d = master.data
-        while d <= master.repeat_until:
-            d = d + timedelta(days=7)
-            if d > master.repeat_until:
-                break
-            if start <= d <= end:
-                out.append({
-                    "date": d,
-                    "time_start": master.time_start,
-                    "time_end": master.time_end,
-                    "is_override": False,
-                    "source_id": master.id,
-                })
+    for wd in set(weekdays):
+        d = lo + timedelta(days=(wd - lo.weekday()) % 7)
+        while d <= hi:
+            if d not in skip:
+                out.append(d)
+            d += timedelta(days=7)
+    out.sort()
     return out
+
+
+SEASON_START_MONTH = 9
+
+
+def season_bounds(day: date) -> tuple[date, date]:
+    """Primo e ultimo giorno della stagione sportiva (1 settembre - 31 agosto) che contiene ``day``."""
+    year = day.year if day.month >= SEASON_START_MONTH else day.year - 1
+    return date(year, SEASON_START_MONTH, 1), date(year + 1, SEASON_START_MONTH, 1) - timedelta(days=1)
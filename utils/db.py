@@ -0,0 +1,44 @@
+"""Helper SQL comuni a più servizi."""
+from __future__ import annotations
+
+from typing import Iterable, List, Sequence
+
+from sqlalchemy import Table, and_, select, update
+from sqlalchemy.orm import Session
+
+
+def upsert(
+    db: Session,
+    table: Table,
+    rows: List[dict],
+    index_elements: Sequence[str],
+    update_columns: Iterable[str],
+) -> None:
+    """Inserisce ``rows`` aggiornando quelle che violano ``index_elements``.
+
+    Su PostgreSQL e SQLite è un solo ``INSERT ... ON CONFLICT DO UPDATE``;
+    con altri database ricade su un ``UPDATE``/``INSERT`` per riga.
+    ``index_elements`` deve corrispondere a un vincolo di unicità.
+    """
+    if not rows:
+        return
+    update_columns = list(update_columns)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_={c: stmt.excluded[c] for c in update_columns},
+        )
+        db.execute(stmt)
+        return
+    for row in rows:  # pragma: no cover - other backends
+        match = and_(*(table.c[k] == row[k] for k in index_elements))
+        if db.execute(select(table.c[index_elements[0]]).where(match)).first():
+            db.execute(update(table).where(match).values({c: row[c] for c in update_columns}))
+        else:
+            db.execute(table.insert().values(row))
@@ -0,0 +1,131 @@
+"""Esportazioni CSV/XLSX in streaming.
+
+Le righe vengono consumate da un iteratore (tipicamente una query con
+``yield_per``, che su PostgreSQL usa un cursore lato server) e inviate al
+client a blocchi tramite ``StreamingResponse``: la memoria resta costante
+anche per esportazioni che coprono più stagioni e non restano file
+temporanei su disco.
+"""
+from __future__ import annotations
+
+import csv
+import tempfile
+from importlib.util import find_spec
+from io import StringIO
+from typing import Any, Iterable, Iterator, Optional, Sequence
+from urllib.parse import quote
+
+from fastapi.responses import StreamingResponse
+
+# openpyxl (e numpy che si porta dietro) si importa solo al primo export XLSX
+HAS_OPENPYXL = find_spec("openpyxl") is not None
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLS_FALLBACK_MEDIA_TYPE = "application/vnd.ms-excel"
+
+CHUNK_ROWS = 500
+CHUNK_BYTES = 64 * 1024
+
+Row = Sequence[Any]
+
+
+def iter_query(query, batch_size: int = CHUNK_ROWS) -> Iterator[Any]:
+    """Itera ``query`` a lotti e chiude la sessione al termine.
+
+    Lo streaming avviene dopo che la dipendenza ``get_db`` ha già chiuso la
+    sessione della richiesta: la sessione viene riaperta per la durata
+    dell'iterazione e chiusa di nuovo qui, anche se il client si disconnette.
+    """
+    try:
+        yield from query.yield_per(batch_size)
+    finally:
+        query.session.close()
+
+
+def iter_csv(
+    rows: Iterable[Row],
+    header: Optional[Row] = None,
+    preamble: Iterable[Row] = (),
+) -> Iterator[bytes]:
+    """Serializza ``rows`` in CSV restituendo blocchi di ``CHUNK_ROWS`` righe."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for line in preamble:
+        writer.writerow(line)
+    if header:
+        writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode("utf-8")
+
+
+def iter_xlsx(
+    rows: Iterable[Row],
+    header: Optional[Row] = None,
+    preamble: Iterable[Row] = (),
+    sheet_title: Optional[str] = None,
+) -> Iterator[bytes]:
+    """Serializza ``rows`` in XLSX usando la modalità write-only di openpyxl.
+
+    Il file zip viene assemblato in un ``TemporaryFile`` anonimo, rimosso
+    automaticamente alla chiusura, e poi inviato a blocchi.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title[:31] if sheet_title else None)
+    for line in preamble:
+        ws.append(list(line))
+    if header:
+        ws.append(list(header))
+    for row in rows:
+        ws.append(list(row))
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(CHUNK_BYTES):
+            yield chunk
+
+
+def content_disposition(filename: str) -> str:
+    """Intestazione ``Content-Disposition`` compatibile con ``FileResponse``."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def streaming_export(
+    rows: Iterable[Row],
+    filename: str,
+    fmt: str = "csv",
+    header: Optional[Row] = None,
+    preamble: Iterable[Row] = (),
+) -> StreamingResponse:
+    """Restituisce una ``StreamingResponse`` CSV o XLSX per ``rows``.
+
+    ``filename`` è senza estensione. Se openpyxl non è installato l'export
+    XLSX ricade su un CSV servito come ``application/vnd.ms-excel``.
+    """
+    if fmt == "xlsx":
+        if HAS_OPENPYXL:
+            body = iter_xlsx(rows, header, preamble, sheet_title=filename)
+            media_type = XLSX_MEDIA_TYPE
+        else:
+            body = iter_csv(rows, header, preamble)
+            media_type = XLS_FALLBACK_MEDIA_TYPE
+        filename = f"{filename}.xlsx"
+    else:
+        body = iter_csv(rows, header, preamble)
+        media_type = CSV_MEDIA_TYPE
+        filename = f"{filename}.csv"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": content_disposition(filename)},
+    )
@@ -0,0 +1,181 @@
+"""Metriche in formato testo Prometheus, senza dipendenze esterne.
+
+``MetricsMiddleware`` misura la latenza di ogni richiesta per route (il
+template del percorso, es. ``/api/attivita/{activity_id}``, non l'URL) e il
+numero di richieste in corso; ``instrument_engine`` conta le query eseguite.
+``render_metrics`` aggiunge al momento dello scrape lo stato del pool di
+connessioni e i contatori delle cache registrate in ``utils.cache``.
+
+I valori sono per processo: con più worker gunicorn ognuno espone i propri.
+"""
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.cache import ResultCache, all_caches
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = Lock()
+# (method, route, status) -> [conteggi per bucket..., +Inf], somma
+_histograms: Dict[Tuple[str, str, str], List[int]] = {}
+_sums: Dict[Tuple[str, str, str], float] = defaultdict(float)
+_in_flight = 0
+_queries = 0
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    key = (method, route, str(status))
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1)
+        counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        _sums[key] += seconds
+
+
+def _route_label(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    # le Mount (es. /static) non impostano "route" ma il root_path
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    """Registra durata e richieste in corso per ogni chiamata HTTP."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global _in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with _lock:
+            _in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            with _lock:
+                _in_flight -= 1
+            observe_request(scope["method"], _route_label(scope), status, time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Conta le query eseguite su ``engine``."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        global _queries
+        with _lock:
+            _queries += 1
+
+
+def _labels(**labels: str) -> str:
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items()
+    )
+    return "{" + body + "}"
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}"
+
+
+def _pool_lines(engine: Engine) -> List[str]:
+    pool = engine.pool
+    lines = []
+    for name, attr, help_text in (
+        ("db_pool_size", "size", "Dimensione configurata del pool"),
+        ("db_pool_checked_out", "checkedout", "Connessioni attualmente in uso"),
+        ("db_pool_overflow", "overflow", "Connessioni oltre la dimensione del pool"),
+        ("db_pool_checked_in", "checkedin", "Connessioni libere nel pool"),
+    ):
+        getter = getattr(pool, attr, None)
+        if getter is None:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {getter()}"]
+    return lines
+
+
+def render_metrics(engine: Engine) -> str:
+    """Testo dell'endpoint ``/metrics``."""
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        sums = dict(_sums)
+        in_flight = _in_flight
+        queries = _queries
+
+    lines = [
+        "# HELP http_request_duration_seconds Durata delle richieste HTTP per route",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route, status), counts in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_float(bound)
+            lines.append(
+                "http_request_duration_seconds_bucket"
+                f"{_labels(method=method, route=route, status=status, le=le)} {cumulative}"
+            )
+        labels = _labels(method=method, route=route, status=status)
+        lines.append(f"http_request_duration_seconds_sum{labels} {sums[(method, route, status)]:.6f}")
+        lines.append(f"http_request_duration_seconds_count{labels} {cumulative}")
+
+    lines += [
+        "# HELP http_requests_in_flight Richieste HTTP in corso",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {in_flight}",
+        "# HELP db_queries_total Query SQL eseguite",
+        "# TYPE db_queries_total counter",
+        f"db_queries_total {queries}",
+    ]
+    lines += _pool_lines(engine)
+
+    caches = sorted(all_caches().items())
+    if caches:
+        for name, kind, help_text in (
+            ("cache_hits_total", "counter", "Letture trovate in cache"),
+            ("cache_misses_total", "counter", "Letture non trovate in cache"),
+            ("cache_entries", "gauge", "Voci presenti in cache"),
+            ("cache_hit_ratio", "gauge", "Rapporto hit / (hit + miss)"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for cache_name, cache in caches:
+                stats = cache.stats()
+                value = {
+                    "cache_hits_total": stats["hits"],
+                    "cache_misses_total": stats["misses"],
+                    "cache_entries": stats["size"],
+                    "cache_hit_ratio": stats["hit_ratio"],
+                }[name]
+                lines.append(f"{name}{_labels(cache=cache_name)} {_format_float(value)}")
+        persistent = [(n, c.stats()) for n, c in caches if isinstance(c, ResultCache)]
+        if persistent:
+            lines += [
+                "# HELP cache_disk_hits_total Letture trovate nella copia su disco",
+                "# TYPE cache_disk_hits_total counter",
+            ]
+            lines += [f"cache_disk_hits_total{_labels(cache=n)} {stats['disk_hits']}" for n, stats in persistent]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,69 @@
+"""Limitatore token-bucket in memoria per processo.
+
+Ogni chiave (IP, username, ...) ha un secchio di ``capacity`` gettoni che si
+ricarica di ``refill_rate`` gettoni al secondo; ogni richiesta ne consuma
+uno. Le chiavi sono tenute in un LRU limitato a ``maxsize`` voci, così un
+flood con chiavi sempre diverse non fa crescere la memoria.
+"""
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Callable, Hashable, Tuple
+
+
+class TokenBucketLimiter:
+    """Token bucket thread-safe con una voce per chiave."""
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_rate: float,
+        maxsize: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.maxsize = maxsize
+        self._clock = clock
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = RLock()
+
+    def _level(self, key: Hashable, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.refill_rate)
+
+    def acquire(self, key: Hashable) -> float:
+        """Consuma un gettone per ``key``.
+
+        Restituisce ``0`` se la richiesta è ammessa, altrimenti i secondi da
+        attendere prima del prossimo gettone disponibile.
+        """
+        with self._lock:
+            now = self._clock()
+            tokens = self._level(key, now)
+            if tokens < 1:
+                return (1 - tokens) / self.refill_rate
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+    def refund(self, key: Hashable) -> None:
+        """Restituisce un gettone a ``key`` (es. dopo un login riuscito)."""
+        with self._lock:
+            if key in self._buckets:
+                now = self._clock()
+                self._buckets[key] = (min(self.capacity, self._level(key, now) + 1), now)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+def retry_after(seconds: float) -> str:
+    """Valore dell'header ``Retry-After`` (secondi interi, almeno 1)."""
+    return str(max(1, math.ceil(seconds)))
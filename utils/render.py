@@ -1,10 +1,78 @@
-"""Utility per il rendering dei template Jinja2."""
+"""Utility per il rendering dei template Jinja2.
 
+Tutta l'applicazione usa un'unica istanza ``templates``: i layout vengono
+compilati una sola volta per worker e il bytecode viene salvato su disco
+(``FileSystemBytecodeCache``), così dopo un riavvio i template non vanno
+ricompilati da zero.
+
+Variabili d'ambiente:
+
+* ``JINJA_CACHE_DIR``: directory del bytecode cache (default: directory
+  temporanea di Jinja); ``none`` lo disabilita.
+* ``TEMPLATES_AUTO_RELOAD``: ``1``/``0``; di default è disattivato quando
+  ``ENV=production``.
+* ``TEMPLATES_PRECOMPILE``: ``1`` per compilare tutti i template all'avvio.
+"""
+
+import logging
+import os
+
+import jinja2
 from fastapi import Request
 from fastapi.templating import Jinja2Templates
 
-# Importa i templates da main.py
-templates = Jinja2Templates(directory="templates")
+from utils.static_assets import static_url
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = "templates"
+
+
+def _bytecode_cache() -> jinja2.BytecodeCache | None:
+    directory = os.environ.get("JINJA_CACHE_DIR")
+    if directory and directory.lower() == "none":
+        return None
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(directory)
+
+
+def _auto_reload() -> bool:
+    default = "0" if os.environ.get("ENV") == "production" else "1"
+    return os.environ.get("TEMPLATES_AUTO_RELOAD", default) == "1"
+
+
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    auto_reload=_auto_reload(),
+    bytecode_cache=_bytecode_cache(),
+)
+templates = Jinja2Templates(env=env)
+env.globals["static_url"] = static_url
+
+
+def precompile_templates() -> int:
+    """Carica tutti i template nella cache dell'ambiente e restituisce quanti.
+
+    Un template con errori di sintassi viene segnalato nel log senza
+    bloccare l'avvio.
+    """
+    names = env.list_templates(extensions=["html"])
+    capacity = getattr(env.cache, "capacity", None)
+    if capacity is not None and capacity < len(names):
+        logger.warning(
+            "Cache dei template (%s) più piccola del numero di template (%s)", capacity, len(names)
+        )
+    compiled = 0
+    for name in names:
+        try:
+            env.get_template(name)
+        except jinja2.TemplateError as exc:
+            logger.warning("Template %s non compilabile: %s", name, exc)
+        else:
+            compiled += 1
+    return compiled
 
 
 def render(
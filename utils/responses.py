@@ -0,0 +1,186 @@
+"""Risposte HTTP: serializzazione JSON veloce e compressione.
+
+``FastJSONResponse`` usa orjson quando è installato (altrimenti ricade su
+``JSONResponse``); gli endpoint che costruiscono già liste/dizionari semplici
+possono restituirla direttamente per saltare ``jsonable_encoder``.
+
+``CompressionMiddleware`` comprime con Brotli (se il modulo ``brotli`` è
+disponibile e il client lo accetta) o gzip le risposte testuali sopra una
+soglia di dimensione, comprese quelle in streaming (CSV, ICS).
+"""
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional at runtime
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional at runtime
+    brotli = None
+
+FastJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+
+def json_bytes(content: Any) -> bytes:
+    """Serializza ``content`` come ``FastJSONResponse`` (per NDJSON e simili)."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+MINIMUM_SIZE = 1024
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "application/manifest+json",
+    "image/svg+xml",
+)
+
+
+class _GzipCompressor:
+    def __init__(self, level: int) -> None:
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, quality: int) -> None:
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    if brotli is not None and "br" in accept_encoding:
+        return "br"
+    if "gzip" in accept_encoding:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """Comprime le risposte testuali più grandi di ``minimum_size`` byte.
+
+    Le risposte che hanno già un ``Content-Encoding`` (asset precompressi) o
+    un tipo non testuale (immagini, XLSX) passano invariate.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = MINIMUM_SIZE,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+            if encoding:
+                compressor = (
+                    _BrotliCompressor(self.brotli_quality)
+                    if encoding == "br"
+                    else _GzipCompressor(self.gzip_level)
+                )
+                responder = _CompressionResponder(self.app, self.minimum_size, encoding, compressor)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: str, compressor) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.compressor = compressor
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _set_headers(self, length: Optional[int]) -> None:
+        headers = MutableHeaders(raw=self.initial_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        if length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+        headers.add_vary_header("Accept-Encoding")
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # la risposta parte solo quando si sa se comprimere il body
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = "content-encoding" in headers or not content_type.startswith(
+                COMPRESSIBLE_TYPES
+            )
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+        elif not self.started:
+            self.started = True
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+            elif not more_body:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                self._set_headers(len(body))
+                await self.send(self.initial_message)
+                await self.send({**message, "body": body})
+            else:
+                # streaming: ogni blocco viene inviato subito (sync flush)
+                self._set_headers(None)
+                await self.send(self.initial_message)
+                chunk = self.compressor.compress(body) + self.compressor.flush()
+                await self.send({**message, "body": chunk})
+        else:
+            chunk = self.compressor.compress(body)
+            chunk += self.compressor.flush() if more_body else self.compressor.finish()
+            await self.send({**message, "body": chunk})
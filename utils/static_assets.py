@@ -0,0 +1,190 @@
+"""Pipeline degli asset statici: fingerprint, precompressione e serving.
+
+``python build_static.py`` copia ogni file di ``static/`` in
+``static/build/`` con l'hash del contenuto nel nome (``css/app.3f2a1b9c04.css``),
+genera le varianti ``.gz`` (e ``.br`` se il modulo ``brotli`` è installato)
+per i file testuali e scrive ``static/build/manifest.json`` con la mappa
+percorso originale -> percorso hashed.
+
+Nei template ``static_url('css/app.css')`` risolve il nome hashed; senza
+manifest (sviluppo) restituisce il percorso originale. ``AssetStaticFiles``
+serve la variante compressa accettata dal client e marca i file hashed come
+``immutable``.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import anyio
+import jinja2
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional at runtime
+    brotli = None
+
+STATIC_DIR = "static"
+BUILD_DIR = "build"
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 10
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".json", ".webmanifest", ".svg", ".html", ".map", ".txt"}
+MIN_COMPRESS_SIZE = 512
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# (valore di Content-Encoding, suffisso del file) in ordine di preferenza
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+SERVICE_WORKER = "sw.js"
+
+_manifest: Optional[Dict[str, str]] = None
+_service_worker: Optional[str] = None
+
+
+def _hashed_name(path: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def _write_compressed(target: str, content: bytes) -> None:
+    with open(target + ".gz", "wb") as fh:
+        fh.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(target + ".br", "wb") as fh:
+            fh.write(brotli.compress(content, quality=11))
+
+
+def build_assets(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Genera ``static/build`` e restituisce il manifest."""
+    build_root = os.path.join(static_dir, BUILD_DIR)
+    shutil.rmtree(build_root, ignore_errors=True)
+    manifest: Dict[str, str] = {}
+    for rel in _source_paths(static_dir):
+        with open(os.path.join(static_dir, *rel.split("/")), "rb") as fh:
+            content = fh.read()
+        hashed = f"{BUILD_DIR}/{_hashed_name(rel, content)}"
+        target = os.path.join(static_dir, *hashed.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as fh:
+            fh.write(content)
+        ext = os.path.splitext(rel)[1].lower()
+        if ext in COMPRESSIBLE_EXTENSIONS and len(content) >= MIN_COMPRESS_SIZE:
+            _write_compressed(target, content)
+        manifest[rel] = hashed
+    with open(os.path.join(build_root, MANIFEST_NAME), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    reset_manifest()
+    return manifest
+
+
+def load_manifest(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Manifest degli asset (letto una volta per processo); vuoto se manca."""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(static_dir, BUILD_DIR, MANIFEST_NAME), encoding="utf-8") as fh:
+                _manifest = json.load(fh)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def reset_manifest() -> None:
+    global _manifest, _service_worker
+    _manifest = None
+    _service_worker = None
+
+
+def _source_paths(static_dir: str) -> List[str]:
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        if os.path.abspath(dirpath) == os.path.abspath(static_dir):
+            dirnames[:] = [d for d in dirnames if d != BUILD_DIR]
+        for filename in filenames:
+            rel = os.path.relpath(os.path.join(dirpath, filename), static_dir)
+            paths.append(rel.replace(os.sep, "/"))
+    return sorted(paths)
+
+
+def asset_path(path: str) -> str:
+    """Percorso (relativo a ``/static``) da usare per ``path``."""
+    path = path.lstrip("/")
+    return load_manifest().get(path, path)
+
+
+def service_worker_script(static_dir: str = STATIC_DIR) -> str:
+    """Sorgente di ``sw.js`` preceduto dalla versione e dalla lista di precache.
+
+    La versione è l'hash dei percorsi hashed (o, senza build, del contenuto
+    degli asset): cambia ad ogni deploy che modifica un asset, e con essa i
+    nomi delle cache del service worker.
+    """
+    global _service_worker
+    if _service_worker is None:
+        manifest = load_manifest(static_dir)
+        digest = hashlib.sha256()
+        urls = []
+        for rel in _source_paths(static_dir):
+            if rel == SERVICE_WORKER or os.path.basename(rel).startswith("."):
+                continue
+            if rel in manifest:
+                digest.update(manifest[rel].encode())
+            else:
+                with open(os.path.join(static_dir, *rel.split("/")), "rb") as fh:
+                    digest.update(rel.encode() + fh.read())
+            urls.append(f"/static/{manifest.get(rel, rel)}")
+        with open(os.path.join(static_dir, SERVICE_WORKER), encoding="utf-8") as fh:
+            source = fh.read()
+        version = digest.hexdigest()[:HASH_LENGTH]
+        _service_worker = (
+            f"const SW_VERSION = {json.dumps(version)};\n"
+            f"const PRECACHE_URLS = {json.dumps(urls)};\n\n{source}"
+        )
+    return _service_worker
+
+
+@jinja2.pass_context
+def static_url(context, path: str) -> str:
+    """Helper Jinja: URL dell'asset, con il nome hashed se disponibile."""
+    return str(context["request"].url_for("static", path=asset_path(path)))
+
+
+class AssetStaticFiles(StaticFiles):
+    """``StaticFiles`` che serve le varianti precompresse e cache immutabile per i file hashed."""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if isinstance(response, FileResponse):
+            request_headers = Headers(scope=scope)
+            accepted = request_headers.get("accept-encoding", "")
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result is None:
+                    continue
+                response = FileResponse(
+                    full_path,
+                    stat_result=stat_result,
+                    media_type=response.media_type,
+                    headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+                )
+                if self.is_not_modified(response.headers, request_headers):
+                    response = NotModifiedResponse(response.headers)
+                break
+        return self._cache_headers(path, response)
+
+    @staticmethod
+    def _cache_headers(path: str, response: Response) -> Response:
+        if path.startswith(BUILD_DIR + "/") and response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response